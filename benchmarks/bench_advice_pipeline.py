@@ -0,0 +1,87 @@
+"""Compare webhook latency and throughput of inline vs pipelined GPT advice.
+
+Run from the repo root: python -m benchmarks.bench_advice_pipeline
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.advice_pipeline import AdvicePipeline
+from services.fake_openai import FakeOpenAIClient
+from services.fake_twilio import FakeTwilioClient
+from services.message_queue import OutboundQueue
+
+MESSAGES = [{"role": "user", "content": "My water heater is leaking, what do I do?"}]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_inline(openai, twilio, requests, webhook_threads):
+    def webhook(i):
+        start = time.perf_counter()
+        reply = openai.chat.completions.create(model="fake", messages=MESSAGES).choices[0].message.content
+        twilio.messages.create(body=reply, from_="+15550000000", to=f"+1555{i:07d}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(webhook_threads) as pool:
+        latencies = list(pool.map(webhook, range(requests)))
+    return latencies, time.perf_counter() - start
+
+
+def run_pipeline(openai, twilio, requests, webhook_threads, businesses):
+    outbound = OutboundQueue(twilio, workers=8)
+    pipeline = AdvicePipeline(lambda: openai, outbound, max_workers=32, per_business=8)
+    done = threading.Semaphore(0)
+
+    def webhook(i):
+        start = time.perf_counter()
+        pipeline.submit(f"+1777{i % businesses:07d}", f"+1555{i:07d}", "+15550000000", MESSAGES,
+                        footer="Type STOP to end.", on_complete=lambda text: done.release())
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(webhook_threads) as pool:
+        latencies = list(pool.map(webhook, range(requests)))
+    for _ in range(requests):
+        done.acquire()
+    outbound.drain()
+    elapsed = time.perf_counter() - start
+    outbound.shutdown()
+    return latencies, elapsed
+
+
+def report(name, latencies, elapsed, requests):
+    print(f"{name:>9}: webhook p50={statistics.median(latencies) * 1000:8.2f}ms "
+          f"p99={percentile(latencies, 99) * 1000:8.2f}ms  "
+          f"completed {requests} replies in {elapsed:6.2f}s ({requests / elapsed:7.1f}/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--webhook-threads", type=int, default=8, help="simulated Flask worker threads")
+    parser.add_argument("--businesses", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake OpenAI time to first token")
+    parser.add_argument("--token-delay", type=float, default=0.002)
+    parser.add_argument("--twilio-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    openai = FakeOpenAIClient(latency=args.latency, token_delay=args.token_delay)
+    latencies, elapsed = run_inline(openai, FakeTwilioClient(latency=args.twilio_latency),
+                                    args.requests, args.webhook_threads)
+    report("inline", latencies, elapsed, args.requests)
+
+    openai = FakeOpenAIClient(latency=args.latency, token_delay=args.token_delay)
+    latencies, elapsed = run_pipeline(openai, FakeTwilioClient(latency=args.twilio_latency),
+                                      args.requests, args.webhook_threads, args.businesses)
+    report("pipeline", latencies, elapsed, args.requests)
+
+
+if __name__ == "__main__":
+    main()
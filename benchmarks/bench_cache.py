@@ -0,0 +1,78 @@
+"""Microbenchmark utils.cache.Cache against the original unlocked OrderedDict cache.
+
+Run from the repo root: python -m benchmarks.bench_cache
+"""
+import argparse
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from utils.cache import Cache
+
+
+class LegacyCache:
+    """The pre-rewrite implementation: no lock, single global TTL."""
+
+    def __init__(self, max_size=1000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache = OrderedDict()
+
+    def get(self, key):
+        if key in self.cache:
+            value, timestamp = self.cache[key]
+            if time.time() - timestamp <= self.ttl:
+                self.cache.move_to_end(key)
+                return value
+            else:
+                del self.cache[key]
+        return None
+
+    def set(self, key, value):
+        self.cache[key] = (value, time.time())
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+
+def workload(cache, keys, ops, errors):
+    rng = random.Random(len(keys))
+    try:
+        for _ in range(ops):
+            key = keys[rng.randrange(len(keys))]
+            if cache.get(key) is None:
+                cache.set(key, key)
+    except Exception as e:  # the legacy cache can raise under contention
+        errors.append(repr(e))
+
+
+def run(cache, threads, ops, key_space):
+    keys = [f"key-{i}" for i in range(key_space)]
+    errors = []
+    workers = [threading.Thread(target=workload, args=(cache, keys, ops, errors)) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    return threads * ops / elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=200000, help="operations per thread")
+    parser.add_argument("--max-size", type=int, default=4096)
+    parser.add_argument("--key-space", type=int, default=8192)
+    args = parser.parse_args()
+
+    for threads in (1, 4, 8):
+        for name, cache in (("legacy", LegacyCache(args.max_size)), ("cache", Cache(args.max_size))):
+            rate, errors = run(cache, threads, args.ops // threads, args.key_space)
+            note = f"  ERRORS: {len(errors)} ({errors[0]})" if errors else ""
+            print(f"{name:>6} threads={threads}: {rate / 1000:8.1f}k ops/s{note}")
+
+
+if __name__ == "__main__":
+    main()
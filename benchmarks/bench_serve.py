@@ -0,0 +1,122 @@
+"""Throughput and tail latency of the dev server vs. serve.py (gunicorn) over real HTTP.
+
+Starts each server in a subprocess on a free port and hammers /handle-call
+(a signed, tenant-resolved webhook answered from cached TwiML) and /health
+from `--concurrency` keep-alive clients for `--duration` seconds.
+
+Run from the repo root: python -m benchmarks.bench_serve
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from twilio.request_validator import RequestValidator
+
+from utils.stats import LatencyHistogram
+
+TOKEN = "bench-serve-token"
+FORM = {"To": "+17786535845", "From": "+15551112222", "CallSid": "CA" + "0" * 32, "CallStatus": "ringing"}
+
+DEV_SERVER = "import main; main.create_app(configure_logging=False).run(host='127.0.0.1', port={port}, threaded=True)"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start(name, port, args, env):
+    if name == "dev":
+        cmd = [sys.executable, "-c", DEV_SERVER.format(port=port)]
+    else:
+        cmd = [sys.executable, "serve.py", "--bind", f"127.0.0.1:{port}"]
+        if args.workers:
+            cmd += ["--workers", str(args.workers)]
+        if args.threads:
+            cmd += ["--threads", str(args.threads)]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/health", timeout=1)
+            return proc
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{name} server did not start on port {port}")
+
+
+def hammer(base_url, path, concurrency, duration):
+    url = base_url + path
+    signature = RequestValidator(TOKEN).compute_signature(url, FORM)
+    histogram = LatencyHistogram()
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            if path == "/health":
+                status = session.get(url, timeout=10).status_code
+            else:
+                status = session.post(url, data=FORM, headers={"X-Twilio-Signature": signature}, timeout=10).status_code
+            elapsed = time.perf_counter() - start
+            with lock:
+                histogram.observe(elapsed)
+                if status >= 400:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return histogram, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per route and server")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, help="gunicorn workers (default: serve.py's sizing)")
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--servers", default="dev,gunicorn")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-serve-")
+    env = dict(os.environ)
+    env.update({
+        "TWILIO_AUTH_TOKEN": TOKEN,
+        "TWILIO_ACCOUNT_SID": env.get("TWILIO_ACCOUNT_SID", "AC" + "0" * 32),
+        "TENANT_STORE": os.path.join(workdir, "tenants.json"),
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        # Several gunicorn workers need state they can share
+        "STATE_STORE": f"sqlite:///{os.path.join(workdir, 'states.db')}",
+    })
+
+    print(f"{'server':<10}{'route':<14}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for name in args.servers.split(","):
+        port = free_port()
+        proc = start(name, port, args, env)
+        try:
+            for path in ("/health", "/handle-call"):
+                histogram, errors = hammer(f"http://127.0.0.1:{port}", path, args.concurrency, args.duration)
+                s = histogram.summary()
+                print(f"{name:<10}{path:<14}{s['count'] / args.duration:>9.0f}{s['p50_ms']:>9.2f}"
+                      f"{s['p99_ms']:>9.2f}{errors:>8}")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Per-request cost of Twilio signature validation on the /sms webhook.
+
+Compares a bare route, the stock validator built per request, the cached
+fast validator, and rejecting an unsigned request.
+
+Run from the repo root: python -m benchmarks.bench_signature
+"""
+import argparse
+import logging
+import time
+
+from flask import Flask
+from twilio.request_validator import RequestValidator
+
+from utils.twilio_signature import SignatureVerifier, verify_signature
+
+TOKEN = "0123456789abcdef0123456789abcdef"
+URL = "http://localhost/sms"
+FORM = {
+    "MessageSid": "SM0123456789abcdef0123456789abcdef",
+    "AccountSid": "AC0123456789abcdef0123456789abcdef",
+    "From": "+15551112222",
+    "To": "+17786535845",
+    "Body": "My kitchen sink is leaking under the cabinet, what should I do?",
+    "NumMedia": "0",
+    "FromCity": "VANCOUVER",
+    "FromCountry": "CA",
+}
+
+
+class StockVerifier(SignatureVerifier):
+    """Builds a fresh RequestValidator for every request, as a naive middleware would."""
+
+    def validator(self, token):
+        return RequestValidator(token)
+
+
+def make_client(verifier):
+    app = Flask(__name__)
+    if verifier is not None:
+        app.before_request(verify_signature(verifier, ("sms",)))
+
+    @app.route("/sms", methods=["POST"])
+    def sms():
+        return ""
+    return app.test_client()
+
+
+def run(client, headers, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.post("/sms", data=FORM, headers=headers)
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    # Every rejection logs a warning; keep them out of the timings
+    logging.disable(logging.WARNING)
+
+    signed = {"X-Twilio-Signature": RequestValidator(TOKEN).compute_signature(URL, FORM)}
+    cases = (
+        ("no validation", make_client(None), signed),
+        ("stock per request", make_client(StockVerifier(lambda number: TOKEN)), signed),
+        ("cached fast", make_client(SignatureVerifier(lambda number: TOKEN)), signed),
+        ("unsigned rejected", make_client(SignatureVerifier(lambda number: TOKEN)), {}),
+    )
+    baseline = None
+    for label, client, headers in cases:
+        per_request = run(client, headers, args.requests)
+        baseline = baseline or per_request
+        print(f"{label:>18}: {per_request * 1e6:8.1f}us/request  overhead {(per_request - baseline) * 1e6:+7.1f}us")
+
+
+if __name__ == "__main__":
+    main()
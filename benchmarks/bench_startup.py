@@ -0,0 +1,47 @@
+"""Measure cold-start latency from `import main` to the first served request.
+
+Each run is a fresh interpreter, like a gunicorn worker boot or a Cloud Run
+cold start. Run from the repo root: python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = r"""
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+app = main.create_app(configure_logging=False)
+response = app.test_client().get("/")
+served = time.perf_counter()
+assert response.status_code == 200
+print(json.dumps({"import": imported - start, "first_request": served - start}))
+"""
+
+
+def run_once(env):
+    out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, env=env, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--probe", action="store_true", help="enable the background OpenAI health probe")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.probe:
+        env["OPENAI_STARTUP_PROBE"] = "1"
+    results = [run_once(env) for _ in range(args.runs)]
+    for key in ("import", "first_request"):
+        values = sorted(r[key] * 1000 for r in results)
+        print(f"{key:>13}: median={statistics.median(values):7.1f}ms  min={values[0]:7.1f}ms  max={values[-1]:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Replay synthetic missed-call and SMS conversations against the app.
+
+Each simulated customer calls a tenant, isn't answered, then texts their
+name, location and issue and asks `--chat-turns` questions. Customers are
+spread over `--tenants` businesses and run `--concurrency` at a time.
+Reports throughput, per-route tail latency, the outbound SMS and OpenAI
+work generated, and memory growth across `--rounds`.
+
+By default the app runs in-process through Flask's test client, with the
+fake Twilio and OpenAI clients (and their configurable latency) in place of
+the real APIs. With --url the same traffic goes over HTTP to a running
+server such as gunicorn, which must be configured with its own fakes or
+sandbox credentials; pass --auth-token if it validates signatures.
+
+Run from the repo root: python -m benchmarks.load_test
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from twilio.request_validator import RequestValidator
+
+from utils.stats import LatencyHistogram
+
+BUSINESS_TYPES = ("plumber", "electrician", "handyman", "hvac")
+NAMES = ("Sam", "Priya Patel", "Jordan", "Mei Chen", "Alex Smith", "Fatima", "Luis Garcia", "Olu")
+LOCATIONS = ("Kitsilano", "Burnaby", "North Van", "Surrey", "Richmond", "East Van", "Coquitlam")
+ISSUES = (
+    "water leaking under the kitchen sink",
+    "breaker keeps tripping when the dryer runs",
+    "furnace is blowing cold air",
+    "toilet won't stop running",
+    "outlet in the bathroom is dead",
+    "front door won't latch",
+)
+QUESTIONS = (
+    "What should I do right now?",
+    "Is it safe to keep using it?",
+    "Can I fix this myself?",
+    "How much will this cost roughly?",
+    "Should I turn off the main?",
+    "How long until someone can come?",
+    "Is this an emergency?",
+    "What tools do I need?",
+)
+
+
+class InProcessSender:
+    """Posts through the Flask test client, one client per thread."""
+
+    base_url = "http://localhost"
+
+    def __init__(self, app, auth_token):
+        self.app = app
+        self.validator = RequestValidator(auth_token) if auth_token else None
+        self._local = threading.local()
+
+    def post(self, path, form):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        headers = {}
+        if self.validator:
+            headers["X-Twilio-Signature"] = self.validator.compute_signature(self.base_url + path, form)
+        return client.post(path, data=form, headers=headers).status_code
+
+
+class HTTPSender(InProcessSender):
+    """Posts to a running server over keep-alive HTTP connections."""
+
+    def __init__(self, base_url, auth_token):
+        super().__init__(None, auth_token)
+        self.base_url = base_url.rstrip("/")
+
+    def post(self, path, form):
+        import requests
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        headers = {}
+        if self.validator:
+            headers["X-Twilio-Signature"] = self.validator.compute_signature(self.base_url + path, form)
+        return session.post(self.base_url + path, data=form, headers=headers, timeout=30).status_code
+
+
+def tenant_number(i):
+    return f"+1777{i:07d}"
+
+
+def customer_script(customer, tenants, chat_turns, rng):
+    """The webhooks one customer generates, in order."""
+    to = tenant_number(rng.randrange(tenants))
+    from_ = f"+1555{customer:07d}"
+    call_sid = f"CA{customer:032x}"
+    base = {"To": to, "From": from_}
+    script = [
+        ("/handle-call", {**base, "CallSid": call_sid, "CallStatus": "ringing"}),
+        ("/handle-no-answer", {**base, "CallSid": call_sid, "DialCallStatus": "no-answer"}),
+    ]
+    bodies = [rng.choice(NAMES), rng.choice(LOCATIONS), rng.choice(ISSUES)]
+    bodies += [rng.choice(QUESTIONS) for _ in range(chat_turns)]
+    for turn, body in enumerate(bodies):
+        script.append(("/sms", {**base, "Body": body, "MessageSid": f"SM{customer:024x}{turn:08x}"}))
+    return script
+
+
+def run_round(sender, first_customer, customers, args):
+    histograms = defaultdict(LatencyHistogram)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def play(customer):
+        rng = random.Random(customer)
+        for path, form in customer_script(customer, args.tenants, args.chat_turns, rng):
+            start = time.perf_counter()
+            status = sender.post(path, form)
+            elapsed = time.perf_counter() - start
+            with lock:
+                histograms[path].observe(elapsed)
+                if status >= 400:
+                    errors[path] += 1
+            if args.think_time:
+                time.sleep(rng.uniform(0, args.think_time))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(play, range(first_customer, first_customer + customers)))
+    return histograms, errors, time.perf_counter() - start
+
+
+def setup_in_process(args):
+    """Import the app against throwaway stores and fake Twilio/OpenAI clients."""
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    os.environ["TENANT_STORE"] = os.path.join(workdir, "tenants.json")
+    os.environ["STATE_STORE"] = "memory"
+    os.environ["TWILIO_AUTH_TOKEN"] = args.auth_token
+    os.environ.setdefault("TWILIO_ACCOUNT_SID", "AC" + "0" * 32)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+    os.environ["ADVICE_MODE"] = args.advice_mode
+
+    import main
+    import services.openai_service as openai_service
+    from services.fake_openai import FakeOpenAIClient
+    from services.fake_twilio import FakeTwilioClient
+
+    twilio = FakeTwilioClient(latency=args.twilio_latency)
+    openai = FakeOpenAIClient(latency=args.openai_latency, token_delay=args.token_delay)
+    main.outbound.client_for = lambda number: twilio
+    openai_service._client = openai
+    for i in range(args.tenants):
+        main.tenants.add(tenant_number(i), {
+            "business_name": f"Load Test {i}",
+            "business_type": BUSINESS_TYPES[i % len(BUSINESS_TYPES)],
+            "forward_to": f"+1666{i:07d}",
+        })
+    app = main.create_app(configure_logging=False)
+    return main, app, twilio, openai
+
+
+def wait_for_background_work(main, timeout=120):
+    # Webhooks return before advice is generated and texted; wait for the pipeline and outbound queue
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = main.advice_pipeline.stats()
+        if not stats["active"] and not stats["waiting"]:
+            break
+        time.sleep(0.05)
+    main.outbound.drain(max(0.0, deadline - time.monotonic()))
+
+
+def rss_mb():
+    # ru_maxrss is KB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def report(histograms, errors, elapsed):
+    total = sum(h.count for h in histograms.values())
+    print(f"  {total} requests in {elapsed:.2f}s ({total / elapsed:.1f} req/s)")
+    print(f"  {'route':<18}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}")
+    for path, h in sorted(histograms.items()):
+        s = h.summary()
+        print(f"  {path:<18}{s['count']:>7}{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}"
+              f"{s['max_ms']:>9.2f}{errors.get(path, 0):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=200, help="customers per round")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--chat-turns", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--think-time", type=float, default=0.0, help="max random pause between a customer's messages")
+    parser.add_argument("--openai-latency", type=float, default=0.2, help="fake OpenAI time to first token")
+    parser.add_argument("--token-delay", type=float, default=0.001)
+    parser.add_argument("--twilio-latency", type=float, default=0.02)
+    parser.add_argument("--advice-mode", choices=("background", "sync"), default="background")
+    parser.add_argument("--auth-token", default="load-test-token", help="Twilio auth token used to sign requests")
+    parser.add_argument("--url", help="send HTTP traffic to this running server instead of an in-process app")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report Python heap growth (slower)")
+    args = parser.parse_args()
+
+    if args.url:
+        main_module = twilio = openai = None
+        sender = HTTPSender(args.url, args.auth_token)
+    else:
+        main_module, app, twilio, openai = setup_in_process(args)
+        sender = InProcessSender(app, args.auth_token)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    baseline_rss = rss_mb()
+    baseline_heap = tracemalloc.get_traced_memory()[0] if args.tracemalloc else 0
+
+    for round_no in range(args.rounds):
+        histograms, errors, elapsed = run_round(sender, round_no * args.customers, args.customers, args)
+        print(f"round {round_no + 1}/{args.rounds}:")
+        report(histograms, errors, elapsed)
+        if main_module is not None:
+            wait_for_background_work(main_module)
+            store = main_module.customer_states
+            print(f"  sessions {len(store)} (~{getattr(store, 'bytes', 0) / 1e6:.1f}MB)  "
+                  f"sms sent {len(twilio.sent)}  openai requests {len(openai.requests)}  "
+                  f"openai max in flight {openai.max_in_flight}")
+        line = f"  rss +{rss_mb() - baseline_rss:.1f}MB"
+        if args.tracemalloc:
+            line += f"  heap +{(tracemalloc.get_traced_memory()[0] - baseline_heap) / 1e6:.1f}MB"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,7 @@
-# Routes package initialization
\ No newline at end of file
+# Routes package initialization
+from flask import current_app
+
+
+def services():
+    """The app's service container (see services.wiring), built per app by main.create_app."""
+    return current_app.extensions["services"]
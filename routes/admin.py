@@ -1,6 +1,9 @@
-from flask import Blueprint, request, render_template, redirect, url_for, session, flash
+from flask import Blueprint, request, render_template, redirect, url_for, session, flash, jsonify
+from routes import services
+from services.conversation import business_stats
 from utils.auth import admin_required, verify_admin_password
 from utils.error_handler import handle_errors
+from utils.stats import Stats
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,12 +19,36 @@ def login():
         flash('Invalid password')
     return render_template('admin/login.html')
 
+@admin_bp.route('/admin')
 @admin_bp.route('/admin/dashboard')
 @handle_errors
 @admin_required
 def dashboard():
-    stats_tracker = Stats()
-    return render_template('admin/dashboard.html', stats=stats_tracker.get_stats())
+    report = business_stats(services())
+    return render_template('admin/dashboard.html', report=report, stats=Stats().get_stats())
+
+@admin_bp.route('/admin/stats.json')
+@handle_errors
+@admin_required
+def stats_json():
+    return jsonify(business_stats(services()))
+
+@admin_bp.route('/admin/add_business', methods=['POST'])
+@handle_errors
+@admin_required
+def add_business():
+    data = request.form
+    try:
+        # Written to the tenant store; this worker swaps in a new snapshot now, the others on their next poll
+        services().tenants.add(data.get('twilio_number'), {
+            "forward_to": data.get('forward_to'),
+            "business_name": data.get('business_name'),
+            "business_type": data.get('business_type'),
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    flash('Business added successfully!')
+    return redirect(url_for('admin.dashboard'))
 
 @admin_bp.route('/admin/reset-stats', methods=['POST'])
 @handle_errors
@@ -34,4 +61,4 @@ def reset_stats():
 @admin_bp.route('/admin/logout')
 def logout():
     session.pop('is_admin', None)
-    return redirect(url_for('home'))
\ No newline at end of file
+    return redirect(url_for('webhooks.home'))
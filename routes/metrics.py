@@ -0,0 +1,21 @@
+from flask import Blueprint, Response, jsonify
+
+from config import Config
+from services.openai_service import openai_health
+from utils.stats import Stats
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(Stats().render_metrics(), mimetype="text/plain")
+
+@metrics_bp.route("/health", methods=["GET"])
+def health_check():
+    return jsonify({
+        "status": "healthy",
+        "version": "1.0.0",
+        "twilio_connected": bool(Config.TWILIO_ACCOUNT_SID and Config.TWILIO_AUTH_TOKEN),
+        "openai_connected": bool(Config.OPENAI_API_KEY),
+        "openai_probe": openai_health["status"]
+    })
@@ -0,0 +1,77 @@
+from flask import Blueprint, Response, request
+import logging
+
+from routes import services
+from services.conversation import handle_message, start_conversation
+from utils.idempotency import idempotent
+from utils.logging_config import PAYLOAD_LOGGER
+from utils.rate_limit import rate_limit
+
+logger = logging.getLogger(__name__)
+# Full webhook payloads; sampled at LOG_PAYLOAD_SAMPLE_RATE
+payload_logger = logging.getLogger(PAYLOAD_LOGGER)
+webhooks_bp = Blueprint('webhooks', __name__)
+
+# Endpoints Twilio calls; main.create_app rejects unsigned requests to them
+TWILIO_ENDPOINTS = ("webhooks.handle_call", "webhooks.handle_no_answer", "webhooks.handle_status", "webhooks.handle_sms")
+
+def twiml(body):
+    return Response(body, mimetype="text/xml")
+
+@webhooks_bp.route("/", methods=["GET"])
+def home():
+    return "Server is live!"
+
+@webhooks_bp.route("/handle-call", methods=["POST"])
+def handle_call():
+    # Greet and forward to the business owner; the TwiML only depends on the tenant
+    c = services()
+    tenant = c.tenants.resolve_or_default(request.form.get('To'))
+    return twiml(c.tenant_artifacts.get(tenant)["call_twiml"])
+
+@webhooks_bp.route("/handle-no-answer", methods=["POST"])
+@idempotent(seen=lambda: services().seen_webhooks)
+def handle_no_answer():
+    c = services()
+    dial_status = request.form.get("DialCallStatus")
+    from_number = request.form.get("From")
+    tenant = c.tenants.resolve_or_default(request.form.get("To"))
+    artifacts = c.tenant_artifacts.get(tenant)
+
+    response = artifacts["hangup_twiml"]
+    logger.info("Handling no answer", extra={"dial_status": dial_status, "from_number": from_number})
+    payload_logger.info("No-answer webhook payload", extra={"form": request.form.to_dict()})
+
+    call_status = request.form.get("CallStatus")
+    dial_duration = int(request.form.get("DialCallDuration", "0"))
+
+    if dial_status != "answered" or (call_status == "completed" and dial_duration < 10):
+        logger.info("Sending initial SMS", extra={"from_number": tenant["number"], "to_number": from_number})
+        response = artifacts["missed_call_twiml"]
+        # Queue initial SMS
+        try:
+            start_conversation(c, from_number, tenant)
+        except Exception as e:
+            logger.error("Error queueing SMS: %s", e, extra={"from_number": tenant["number"], "to_number": from_number})
+
+    return twiml(response)
+
+@webhooks_bp.route("/status", methods=["POST"])
+def handle_status():
+    return Response("", status=200)
+
+@webhooks_bp.route("/test", methods=["GET"])
+def test():
+    return "SMS webhook is working!"
+
+@webhooks_bp.route("/sms", methods=["POST"])
+# Rate limit first: a rejected message must not be recorded as seen, or Twilio's retry would be dropped
+@rate_limit(key="from", limiter=lambda: services().sms_limiter)
+@idempotent(seen=lambda: services().seen_webhooks)
+def handle_sms():
+    payload_logger.info("SMS webhook payload", extra={"form": request.form.to_dict(), "headers": dict(request.headers)})
+
+    c = services()
+    tenant = c.tenants.resolve_or_default(request.form.get("To"))
+    handle_message(c, request.form.get("From"), request.form.get("Body", "").strip(), tenant)
+    return Response("", status=200)
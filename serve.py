@@ -0,0 +1,151 @@
+"""Production entry point: the app under gunicorn with gthread workers.
+
+    python serve.py                  # sized from the container's CPU and memory
+    python serve.py --print-config   # show the settings without starting
+
+`python main.py` still runs Flask's development server for local work.
+Settings come from the environment (flags override):
+
+    PORT                    listen port (81)
+    WEB_CONCURRENCY         worker processes (default: from CPU and memory)
+    GUNICORN_THREADS        threads per worker (8)
+    GUNICORN_WORKER_CLASS   gthread (default) or gevent, if installed
+    GUNICORN_KEEPALIVE      seconds an idle keep-alive connection is held (75)
+    GUNICORN_TIMEOUT        seconds before a stuck worker is restarted (30)
+    GUNICORN_GRACEFUL_TIMEOUT  seconds a stopping worker gets to drain (30)
+    WORKER_MEMORY_MB        memory budget per worker when sizing (256)
+
+The app is imported once in the master and forked (preload), so workers
+boot fast and share read-only pages. Background threads, SQLite
+connections and HTTP pools restart per process on first use; the logging
+listener is restarted in `post_fork`. A stopping worker finishes running
+advice completions and drains its outbound SMS queue (see
+main.shutdown_app) before exiting.
+"""
+import argparse
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def cpu_count():
+    """CPUs this process may use, honouring a cgroup (container) CPU quota."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(int(quota) / int(period) + 0.5))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def memory_limit():
+    """Bytes available to the container, or None if unknown."""
+    try:
+        with open("/sys/fs/cgroup/memory.max") as f:
+            value = f.read().strip()
+        if value != "max":
+            return int(value)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def worker_count(cpus, memory=None, worker_memory_mb=256, shared_state=True):
+    """Gunicorn's 2 x CPUs + 1, capped by how many workers fit in memory.
+
+    Conversation state held in process memory (STATE_STORE=memory) isn't
+    shared between workers, so a customer's texts could land on a worker
+    that has never seen them; one worker with more threads is used then.
+    """
+    if not shared_state:
+        return 1
+    workers = 2 * cpus + 1
+    if memory:
+        workers = min(workers, memory // (worker_memory_mb * 1024 * 1024))
+    return max(1, workers)
+
+
+def gunicorn_options(args=None):
+    env = os.environ
+    shared_state = env.get("STATE_STORE", "memory") != "memory"
+    workers = getattr(args, "workers", None) or env.get("WEB_CONCURRENCY")
+    if not workers:
+        workers = worker_count(cpu_count(), memory_limit(), int(env.get("WORKER_MEMORY_MB", "256")), shared_state)
+    return {
+        "bind": getattr(args, "bind", None) or f"0.0.0.0:{env.get('PORT', '81')}",
+        "workers": int(workers),
+        # Webhooks mostly wait on SQLite and on handing work to background threads, so threads are cheap concurrency
+        "threads": int(getattr(args, "threads", None) or env.get("GUNICORN_THREADS", "8")),
+        "worker_class": env.get("GUNICORN_WORKER_CLASS", "gthread"),
+        # Outlive the front proxy's idle timeout so it never reuses a connection we just closed
+        "keepalive": int(env.get("GUNICORN_KEEPALIVE", "75")),
+        # Twilio gives up on a webhook after 15s
+        "timeout": int(env.get("GUNICORN_TIMEOUT", "30")),
+        "graceful_timeout": int(env.get("GUNICORN_GRACEFUL_TIMEOUT", "30")),
+        "preload_app": True,
+        "accesslog": None,
+        "post_fork": post_fork,
+        "worker_exit": worker_exit,
+    }
+
+
+def post_fork(server, worker):
+    # The master's logging listener thread doesn't exist in the child; without a new one records pile up unwritten
+    from utils.logging_config import setup_logging
+    setup_logging()
+
+
+def worker_exit(server, worker):
+    import main
+    # Leave a few seconds of the graceful timeout for the process to exit
+    if not main.shutdown_app(timeout=max(1.0, server.cfg.graceful_timeout - 5)):
+        logger.warning("Worker %s exited with undelivered SMS", worker.pid)
+
+
+def run(options):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            import main
+            return main.create_app(configure_logging=True)
+
+    Application().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bind", help="address to listen on, e.g. 0.0.0.0:8000")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--print-config", action="store_true", help="print the computed settings and exit")
+    args = parser.parse_args()
+
+    options = gunicorn_options(args)
+    if args.print_config:
+        for key, value in options.items():
+            if not callable(value):
+                print(f"{key} = {value}")
+        return
+    run(options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.forksafe import PerProcess
+from utils.sms_encoding import chars_per_segment, fit_segments, segment_count, to_gsm7
+from utils.stats import Stats
+
+logger = logging.getLogger(__name__)
+
+
+class _Cancelled(Exception):
+    """The customer's conversation ended while their answer was queued or streaming."""
+
+
+class AdviceJob:
+    __slots__ = ("business", "to", "from_", "messages", "footer", "on_complete", "segment_budget",
+                 "submitted_at", "context")
+
+    def __init__(self, business, to, from_, messages, footer, on_complete, segment_budget=None):
+        self.business = business
+        self.to = to
+        self.from_ = from_
+        self.messages = messages
+        self.footer = footer
+        self.on_complete = on_complete
+        self.segment_budget = segment_budget
+        self.submitted_at = time.monotonic()
+        # Run in the submitting request's context so log correlation IDs carry over
+        self.context = contextvars.copy_context()
+
+
+class AdvicePipeline:
+    """Runs GPT completions off the webhook thread and texts the answer as it streams in.
+
+    Each business may have at most `per_business` completions running at once;
+    extra jobs wait in that business's own queue so one busy tenant can't take
+    every worker. If a `gateway` is given, completions go through it (and its
+    global limits, retries and deadlines) instead of `client_factory()`.
+
+    Replies are rewritten to GSM-7 where possible and sent as messages of at
+    most `message_segments` segments each, cut at sentence ends (or words)
+    so no text breaks off mid-word. Given a `segment_budget`, replies
+    are cut at a sentence end once they would bill more than that many SMS
+    segments (footer included); the stream is then abandoned.
+
+    With `is_active(number)` given, a job whose customer has ended the
+    conversation (e.g. texted STOP) is dropped before it starts or at its
+    next send, so nothing arrives after the goodbye.
+    """
+
+    fallback = "I apologize, but I couldn't generate specific advice at the moment. Please try again."
+
+    def __init__(self, client_factory, outbound, model="gpt-4-turbo-preview", max_workers=8,
+                 per_business=2, max_queued=50, message_segments=2, completion_options=None, gateway=None,
+                 segment_budget=None, is_active=None):
+        self.client_factory = client_factory
+        self.is_active = is_active
+        self.gateway = gateway
+        self.outbound = outbound
+        self.model = model
+        self.max_workers = max_workers
+        self.per_business = per_business
+        self.max_queued = max_queued
+        self.message_segments = message_segments
+        self.segment_budget = segment_budget
+        self.completion_options = completion_options or {}
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._active = defaultdict(int)
+        self._waiting = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_started = PerProcess(self._start_executor)
+
+    def _start_executor(self, first):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="advice")
+
+    def _get_executor(self):
+        self._executor_started.ensure()
+        return self._executor
+
+    def submit(self, business, to, from_, messages, footer="", on_complete=None, segment_budget=None):
+        """Queue a completion; returns False if the business's queue is full."""
+        if segment_budget is None:
+            segment_budget = self.segment_budget
+        job = AdviceJob(business, to, from_, messages, footer, on_complete, segment_budget)
+        with self._lock:
+            if self._active[business] < self.per_business:
+                self._active[business] += 1
+                run_now = True
+            elif len(self._waiting[business]) < self.max_queued:
+                self._waiting[business].append(job)
+                run_now = False
+            else:
+                self.rejected += 1
+                self.outbound.send(to=to, body=self.fallback, from_=from_)
+                return False
+        if run_now:
+            self._get_executor().submit(job.context.run, self._run, job)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": {b: n for b, n in self._active.items() if n},
+                "waiting": {b: len(q) for b, q in self._waiting.items() if q},
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+    def drain(self, timeout=None):
+        """Wait for running and queued completions to finish; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not any(self._active.values()):
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def _run(self, job):
+        text = None
+        try:
+            text = self._stream(job)
+            with self._lock:
+                self.completed += 1
+        except _Cancelled:
+            Stats().increment("advice.cancelled")
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            logger.error("Advice completion for %s failed: %s", job.to, e)
+            if self._wanted(job.to):
+                self.outbound.send(to=job.to, body=self.fallback, from_=job.from_)
+        finally:
+            if job.on_complete is not None:
+                try:
+                    job.on_complete(text)
+                except Exception as e:
+                    logger.error("Advice completion callback failed: %s", e)
+            self._release(job.business)
+
+    def _release(self, business):
+        with self._lock:
+            waiting = self._waiting[business]
+            if waiting:
+                next_job = waiting.popleft()
+            else:
+                self._active[business] -= 1
+                if not self._active[business]:
+                    del self._active[business]
+                    del self._waiting[business]
+                return
+        self._get_executor().submit(next_job.context.run, self._run, next_job)
+
+    def _stream(self, job):
+        stats = Stats()
+        started = time.perf_counter()
+        stats.record_latency("advice.queue_wait", time.monotonic() - job.submitted_at)
+        if not self._wanted(job.to):
+            raise _Cancelled()
+        parts = []
+        buffer = ""
+        remaining = self._budget(job.segment_budget, job.footer)
+        if self.gateway is not None:
+            stream = self.gateway.complete(job.business, self.model, job.messages, stream=True, **self.completion_options)
+        else:
+            stream = self.client_factory().chat.completions.create(
+                model=self.model,
+                messages=job.messages,
+                stream=True,
+                **self.completion_options
+            )
+        # Nothing may run between opening the stream and this try, or its gateway slot could leak
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if not parts:
+                    stats.record_latency("openai.first_token", time.perf_counter() - started)
+                delta = to_gsm7(delta)
+                parts.append(delta)
+                buffer += delta
+                # Send full segments as soon as they are available
+                while segment_count(buffer) > self.message_segments and remaining != 0:
+                    segment, buffer = self._next_message(buffer)
+                    remaining = self._send_within(job.to, job.from_, segment, remaining)
+                if remaining == 0:
+                    stats.increment("advice.truncated")
+                    buffer = ""
+                    break
+        finally:
+            # Stop generating (and release the gateway slot) if the budget ran out early
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+        stats.record_latency("openai.completion", time.perf_counter() - started)
+        text = "".join(parts).strip() or "No response generated"
+        tail = buffer.strip() if parts else text
+        self._send_tail(job.to, job.from_, self._fit(tail, remaining), job.footer)
+        return text
+
+    def deliver(self, to, from_, text, footer="", segment_budget=None):
+        """Text an already available answer (e.g. from cache) segmented like a streamed one."""
+        if segment_budget is None:
+            segment_budget = self.segment_budget
+        remaining = self._budget(segment_budget, footer)
+        buffer = to_gsm7(text.strip())
+        try:
+            while segment_count(buffer) > self.message_segments and remaining != 0:
+                segment, buffer = self._next_message(buffer)
+                remaining = self._send_within(to, from_, segment, remaining)
+            self._send_tail(to, from_, self._fit(buffer, remaining), footer)
+        except _Cancelled:
+            Stats().increment("advice.cancelled")
+
+    def _next_message(self, text):
+        """Split off the longest prefix within `message_segments` segments, cut at a sentence end or word."""
+        segment = fit_segments(text, self.message_segments)
+        if not segment:
+            # One unbroken run longer than a message; nothing better than a hard cut
+            segment = text[:self.message_segments * chars_per_segment(text)]
+            while segment_count(segment) > self.message_segments:
+                segment = segment[:-1]
+        return segment, text[len(segment):].lstrip()
+
+    @staticmethod
+    def _budget(segment_budget, footer):
+        if segment_budget is None:
+            return None
+        return max(0, segment_budget - (segment_count(to_gsm7(footer)) if footer else 0))
+
+    @staticmethod
+    def _fit(text, remaining):
+        return text if remaining is None else fit_segments(text, remaining)
+
+    def _send_within(self, to, from_, segment, remaining):
+        """Send `segment` (trimmed to the budget left) and return the segments still available."""
+        if remaining is not None:
+            fitted = fit_segments(segment, remaining)
+            # Once anything is cut the rest of the reply would read out of context, so stop there
+            remaining = remaining - segment_count(fitted) if fitted == segment else 0
+            segment = fitted
+        if segment:
+            self._send(to, from_, segment)
+        return remaining
+
+    def _send_tail(self, to, from_, tail, footer):
+        if footer:
+            merged = f"{tail}\n\n{footer}" if tail else footer
+            # One message as long as that bills no more than two and stays within message_segments
+            if not tail or segment_count(merged) <= min(self.message_segments,
+                                                        segment_count(tail) + segment_count(footer)):
+                tail = merged
+            else:
+                if tail:
+                    self._send(to, from_, tail)
+                tail = footer
+        if tail:
+            self._send(to, from_, tail)
+
+    def _wanted(self, to):
+        return self.is_active is None or self.is_active(to)
+
+    def _send(self, to, from_, body):
+        if not self._wanted(to):
+            raise _Cancelled()
+        self.outbound.send(to=to, body=body, from_=from_)
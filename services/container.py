@@ -0,0 +1,62 @@
+
+import threading
+
+
+class Container:
+    """Named services, each built on first use.
+
+    `register(name, factory)` records how to build a service;
+    `factory(container)` runs the first time the service is asked for
+    (`container.outbound` or `container.get("outbound")`) and may ask for
+    others in turn. Creating the app therefore builds nothing: a worker
+    pays for a store, pool or client when a request first needs it.
+    `override()` puts a ready instance in place, e.g. a fake in tests.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._building = set()
+        self._lock = threading.RLock()
+
+    def register(self, name, factory):
+        self._factories[name] = factory
+        return factory
+
+    def override(self, name, instance):
+        with self._lock:
+            self._instances[name] = instance
+
+    def get(self, name):
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name in self._instances:
+                return self._instances[name]
+            if name not in self._factories:
+                raise KeyError(f"No service registered as {name!r}")
+            if name in self._building:
+                raise RuntimeError(f"Circular dependency while building {name!r}")
+            self._building.add(name)
+            try:
+                instance = self._factories[name](self)
+            finally:
+                self._building.discard(name)
+            self._instances[name] = instance
+            return instance
+
+    def built(self, name):
+        return name in self._instances
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self.get(name)
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __contains__(self, name):
+        return name in self._factories or name in self._instances
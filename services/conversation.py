@@ -0,0 +1,390 @@
+"""The missed-call to SMS conversation: intake stages, owner notifications and GPT advice.
+
+Every function takes the service container (see services.wiring) first, so
+the same code runs against the app's services or a test's fakes.
+"""
+import functools
+import logging
+import os
+
+from twilio.twiml.voice_response import VoiceResponse
+
+from config import Config
+from utils.conversation_flow import ConversationFlow, Intercept, Stage, Turn
+from utils.logging_config import PAYLOAD_LOGGER
+from utils.session import Session
+from utils.sms_encoding import fit_segments, segment_count, to_gsm7
+from utils.state_store import EXPIRED
+from utils.stats import Stats
+
+logger = logging.getLogger(__name__)
+# Full webhook payloads and GPT text; sampled at LOG_PAYLOAD_SAMPLE_RATE
+payload_logger = logging.getLogger(PAYLOAD_LOGGER)
+
+# Wording per business type for customer and owner messages
+TRADE_TERMS = {
+    "plumber": {"pro": "plumber", "service": "plumbing"},
+    "electrician": {"pro": "electrician", "service": "electrical"},
+    "handyman": {"pro": "handyman", "service": "repair"},
+    "hvac": {"pro": "technician", "service": "heating or cooling"},
+}
+
+def trade_terms(tenant):
+    return TRADE_TERMS.get(tenant["business_type"], {"pro": "specialist", "service": "service"})
+
+ADVICE_COMPLETION_OPTIONS = {
+    "max_tokens": 300,
+    "temperature": 0.7,
+    "presence_penalty": 0.6,
+    "frequency_penalty": 0.6,
+    "top_p": 1
+}
+
+ADVICE_FOOTER = "Need more help? Just ask! Or type STOP to end the conversation."
+
+# Most SMS segments one GPT answer (footer included) may bill; a tenant's "sms_segment_budget" overrides it
+SMS_SEGMENT_BUDGET = int(os.environ.get("SMS_SEGMENT_BUDGET", "6"))
+
+# How long a synchronous request waits on an identical in-flight question before asking GPT itself
+SHARED_ADVICE_WAIT = float(os.environ.get("ADVICE_SHARED_WAIT", "5"))
+
+# "background" runs chatting-stage completions on the advice pipeline, "sync" answers inline
+ADVICE_MODE = os.environ.get("ADVICE_MODE", "background")
+
+# Idle time before a conversation is dropped, by stage; unfinished intake goes stale much sooner than a chat
+SESSION_TTLS = {
+    "waiting_for_name": int(os.environ.get("SESSION_INTAKE_TTL", str(2 * 3600))),
+    "waiting_for_location": int(os.environ.get("SESSION_INTAKE_TTL", str(2 * 3600))),
+    "waiting_for_issue": int(os.environ.get("SESSION_INTAKE_TTL", str(2 * 3600))),
+    "chatting": int(os.environ.get("SESSION_CHAT_TTL", str(24 * 3600))),
+}
+
+def segment_budget(tenant):
+    return int(tenant.get("sms_segment_budget") or SMS_SEGMENT_BUDGET)
+
+# Everything in the system prompt that depends only on the tenant comes first, so requests
+# from one business share a byte-identical prefix the provider can prompt-cache
+SYSTEM_PROMPT_PREFIX = """You're a service professional assistant for {business_type} with 15 years of experience. Talk like a normal person - no corporate speak, just practical advice from experience. Keep it real and straight to the point.
+
+        Key points:
+        - Talk like you're chatting with a neighbor
+        - Give quick, practical tips they can actually use
+        - If it's dangerous, just tell them straight up
+        - Don't repeat yourself unless they ask
+        - Keep responses focused and helpful
+
+        For emergencies:
+        Just say "Whoa, hold up - you need to [safety action] right now. Call 911 if you can't get emergency services."
+
+        Remember: Our {pro} has their info and is checking the case. Just help them out while they wait.
+
+        Business Type: {business_type}"""
+
+def build_tenant_artifacts(tenant):
+    """Prompt prefix and TwiML for a tenant, rendered once per config change (see tenant_artifacts)."""
+    greeting = VoiceResponse()
+    greeting.say(f"Thank you for calling {tenant['business_name']}. Please hold while we connect you with one of our specialists.")
+    # Try to forward to the business owner
+    greeting.dial(timeout=15, action='/handle-no-answer').number(tenant["forward_to"])
+
+    missed = VoiceResponse()
+    missed.say(f"Sorry, we couldn't reach our {trade_terms(tenant)['pro']}. We'll send you a text message shortly to collect more information.")
+    missed.hangup()
+
+    hangup = VoiceResponse()
+    hangup.hangup()
+    return {
+        "system_prompt": SYSTEM_PROMPT_PREFIX.format(
+            business_type=tenant.get("business_type", "plumber"), pro=trade_terms(tenant)["pro"]),
+        "call_twiml": greeting.to_xml(xml_declaration=True).encode(),
+        "missed_call_twiml": missed.to_xml(xml_declaration=True).encode(),
+        "hangup_twiml": hangup.to_xml(xml_declaration=True).encode(),
+    }
+
+def build_advice_messages(c, message, state=None, personalize=True, tenant=None):
+    # Get business type from the tenant the customer contacted
+    business_config = tenant or c.tenants.default
+    system_prompt = c.tenant_artifacts.get(business_config)["system_prompt"]
+
+    # Build conversation history with enhanced context and capabilities
+    messages = [
+        {"role": "system", "content": f"""{system_prompt}
+
+        About the customer:
+        Name: {state.get('name', 'the customer') if state and personalize else 'the customer'}
+        Issue: {state.get('issue', 'unknown') if state else 'unknown'}"""},
+    ]
+
+    # Conversation history is token-budgeted: older turns are folded into a rolling summary,
+    # later and off this thread (see compact_history), since summarizing may call GPT
+    if state:
+        c.conversation_history.add_user(state, message, compact=False)
+        messages.extend(c.conversation_history.messages(state))
+    else:
+        messages.append({"role": "user", "content": message})
+
+    return messages + [{"role": "system", "content": "Keep responses clear and focused. Break up long explanations into digestible chunks."}]
+
+def claim_cached_advice(c, message, state, tenant=None):
+    """Claim the advice cache slot for a conversation's first question.
+
+    Returns (key, future, leader), or None when the question depends on
+    earlier turns and must not be shared between customers.
+    """
+    if not state or state.get("history", {}).get("turns"):
+        return None
+    business_type = (tenant or c.tenants.default).get('business_type', 'plumber')
+    return c.advice_cache.claim(business_type, "chatting", state.get("issue"), message)
+
+def get_gpt_advice(c, message, state=None, tenant=None):
+    claim = claim_cached_advice(c, message, state, tenant)
+    shared = None
+    if claim and not claim[2]:
+        shared, claim = claim[1], None
+
+    content = None
+    try:
+        if shared is not None:
+            # Someone already asked this; wait briefly for (or reuse) their answer
+            try:
+                content = shared.result(timeout=SHARED_ADVICE_WAIT)
+            except TimeoutError:
+                Stats().increment("advice.shared_timeout")
+            if content:
+                c.conversation_history.add_user(state, message)
+                c.conversation_history.add_assistant(state, content)
+                return content
+
+        payload_logger.info("GPT request", extra={"user_message": message})
+
+        if not Config.OPENAI_API_KEY:
+            raise ValueError("OpenAI API key is missing")
+
+        with Stats().timer("openai.completion"):
+            response = c.openai_gateway.complete(
+                (tenant or c.tenants.default)["number"],
+                "gpt-4-turbo-preview",
+                build_advice_messages(c, message, state, personalize=claim is None, tenant=tenant),
+                **ADVICE_COMPLETION_OPTIONS
+            )
+
+        # Access the response content correctly
+        if response.choices:
+            content = response.choices[0].message.content
+            payload_logger.info("GPT response", extra={"response": content})
+            if state is not None:
+                c.conversation_history.add_assistant(state, content)
+            return content
+        return "No response generated"
+    except Exception as e:
+        logger.error("GPT request failed: %s", e, extra={"api_key_present": bool(Config.OPENAI_API_KEY)})
+        return "I apologize, but I couldn't generate specific advice at the moment. Please try again."
+    finally:
+        if claim:
+            c.advice_cache.complete(claim[0], content)
+
+def record_advice(c, from_number):
+    """Completion callback that stores the assistant's reply in the customer's history, then compacts it."""
+    def on_complete(text):
+        if text:
+            states = c.customer_states
+            with states.lock(from_number):
+                state = states.get(from_number)
+                if state is not None:
+                    c.conversation_history.add_assistant(state, text, compact=False)
+                    states[from_number] = state
+        compact_history(c, from_number)
+    return on_complete
+
+def compact_history(c, from_number):
+    """Fold a customer's oldest turns into the summary without holding their state lock while summarizing."""
+    history, states = c.conversation_history, c.customer_states
+    with states.lock(from_number):
+        state = states.get(from_number)
+        turns = history.evictable(state) if state is not None else []
+    if not turns:
+        return
+    summary = history.summarize(state, turns)
+    with states.lock(from_number):
+        state = states.get(from_number)
+        # A turn that arrived meanwhile is fine; an ended or restarted conversation is left alone
+        if state is not None and history.fold(state, turns, summary):
+            states[from_number] = state
+
+def cache_advice(c, key, on_complete):
+    def complete(text):
+        c.advice_cache.complete(key, text)
+        on_complete(text)
+    return complete
+
+def send_shared_advice(c, from_number, text, tenant):
+    """Deliver an answer produced for an identical question from another customer."""
+    if not text:
+        c.outbound.send(to=from_number, body=c.advice_pipeline.fallback, from_=tenant["number"])
+        return
+    c.advice_pipeline.deliver(from_number, tenant["number"], text, footer=ADVICE_FOOTER,
+                              segment_budget=segment_budget(tenant))
+    record_advice(c, from_number)(text)
+
+def session_evicted(c, phone, state, reason):
+    """Eviction hook: drop the conversation from the counters and pass abandoned intake on to the owner.
+
+    Only conversations that went idle count as abandoned; one pushed out by the
+    store's size caps may still be active.
+    """
+    c.conversation_index.remove(phone)
+    if reason == EXPIRED and state.get("stage") in ("waiting_for_location", "waiting_for_issue") and state.get("name"):
+        tenant = c.tenants.resolve_or_default(state.get("business_number"))
+        c.lead_notifier.notify(
+            tenant["number"],
+            tenant["forward_to"],
+            f"Name: {state['name']}\nLocation: {state.get('location', 'Unknown')}\nPhone: {phone}\n(Stopped replying before describing the issue)",
+            service=trade_terms(tenant)["service"],
+            urgent=False
+        )
+
+def save_state(c, from_number, state):
+    """Store a customer's state and keep the per-business counters in step."""
+    business_number = state.setdefault("business_number", c.tenants.default["number"])
+    c.customer_states[from_number] = state
+    c.conversation_index.update(from_number, business_number, state.get("stage"))
+
+def end_conversation(c, from_number):
+    del c.customer_states[from_number]
+    c.conversation_index.remove(from_number)
+
+def start_conversation(c, from_number, tenant):
+    """Text a caller we missed and open their conversation at the first intake stage."""
+    c.outbound.send(
+        to=from_number,
+        body=f"Hi! This is {tenant['business_name']}. Could you please tell us your name?",
+        from_=tenant["number"]
+    )
+    save_state(c, from_number, Session(stage="waiting_for_name", business_number=tenant["number"]))
+
+def validate_name(text):
+    cleaned_name = text.strip()
+    if len(cleaned_name) < 2 or len(cleaned_name) > 30:
+        return None, "Please provide a valid name between 2 and 30 characters."
+    if not any(c.isalpha() for c in cleaned_name):
+        return None, "Please provide a name containing letters."
+    # Only use the first two words of the name to prevent long inappropriate phrases
+    return " ".join(cleaned_name.split()[:2]), None
+
+def notify_owner(c, state, turn):
+    try:
+        c.lead_notifier.notify(
+            turn.tenant["number"],
+            turn.tenant["forward_to"],
+            f"Name: {state['name']}\nLocation: {state.get('location', 'Unknown')}\nPhone: {turn.from_number}\nIssue: {state['issue']}",
+            service=trade_terms(turn.tenant)["service"]
+        )
+    except Exception as e:
+        logger.error("Error notifying business owner: %s", e)
+
+def stop_conversation(c, state, turn):
+    end_conversation(c, turn.from_number)
+
+def answer_question(c, state, message_body, turn):
+    from_number, tenant = turn.from_number, turn.tenant
+    if ADVICE_MODE != "background":
+        advice = get_gpt_advice(c, message_body, state, tenant)
+        advice = fit_segments(to_gsm7(advice), segment_budget(tenant) - segment_count(ADVICE_FOOTER))
+        turn.send(f"{advice}\n\n{ADVICE_FOOTER}")
+        return
+
+    claim = claim_cached_advice(c, message_body, state, tenant)
+    if claim and not claim[2]:
+        # Answer is cached or already being generated for an identical question
+        c.conversation_history.add_user(state, message_body, compact=False)
+        claim[1].add_done_callback(lambda future: send_shared_advice(c, from_number, future.result(), tenant))
+        return
+
+    on_complete = record_advice(c, from_number)
+    if claim:
+        on_complete = cache_advice(c, claim[0], on_complete)
+
+    # Answer from the advice pipeline; segments are texted as the completion streams in
+    queued = c.advice_pipeline.submit(
+        business=tenant["number"],
+        to=from_number,
+        from_=tenant["number"],
+        messages=build_advice_messages(c, message_body, state, personalize=claim is None, tenant=tenant),
+        footer=ADVICE_FOOTER,
+        on_complete=on_complete,
+        segment_budget=segment_budget(tenant)
+    )
+    if claim and not queued:
+        c.advice_cache.complete(claim[0], None)
+
+def build_sms_flow(c):
+    """The SMS conversation, one row per stage.
+
+    Keyword intercepts run first in every stage, so STOP/HELP never reach GPT.
+    """
+    return ConversationFlow(
+        stages=[
+            Stage("waiting_for_name", field="name", validate=validate_name, next="waiting_for_location",
+                  reply="Thanks! What area are you located in?"),
+            Stage("waiting_for_location", field="location", next="waiting_for_issue",
+                  reply="Thanks! Could you briefly describe your {service} issue?"),
+            Stage("waiting_for_issue", field="issue", next="chatting",
+                  reply="Thanks {name}, I understand you're having an issue with {issue}. "
+                        "Our {pro} will contact you soon.\n\n"
+                        "Would you like some help or advice while you wait?",
+                  effects=[functools.partial(notify_owner, c)]),
+            Stage("chatting", handler=functools.partial(answer_question, c)),
+        ],
+        intercepts=[
+            Intercept(["STOP", "END", "QUIT"], "Thanks for chatting! Our {pro} will be in touch soon.",
+                      effects=[functools.partial(stop_conversation, c)]),
+            Intercept(["HELP"], "You're texting {business_name}. Reply to continue, or text STOP to end the conversation."),
+        ],
+    )
+
+def process_sms(c, from_number, message_body, state, tenant):
+    logger.info("Handling SMS", extra={"from_number": from_number, "stage": state.get("stage")})
+    flow = c.sms_flow.compile(tenant["business_type"], trade_terms(tenant))
+    turn = Turn(from_number, tenant, lambda body: c.outbound.send(to=from_number, body=body, from_=tenant["number"]))
+    try:
+        flow.step(state, message_body, turn)
+    except Exception as e:
+        logger.exception("Error in SMS handling: %s", e)
+
+def handle_message(c, from_number, message_body, tenant):
+    """Run one inbound text through the customer's conversation."""
+    states = c.customer_states
+    # Serialize messages from the same customer so stage transitions don't race
+    with states.lock(from_number):
+        state = states.get(from_number)
+        if state is None:
+            state = Session(stage="waiting_for_name", business_number=tenant["number"])
+            save_state(c, from_number, state)
+        try:
+            process_sms(c, from_number, message_body, state, tenant)
+        finally:
+            # Persist the updated state unless the conversation was ended
+            if from_number in states:
+                save_state(c, from_number, state)
+
+def business_stats(c):
+    """Per-business conversation counts under "businesses", next to the counters of the shared services."""
+    # Read from the maintained index: O(businesses), independent of conversation count
+    businesses = {}
+    for number, config in c.tenants.items():
+        stages = c.conversation_index.stages(number)
+        businesses[number] = {
+            "business": config["business_name"],
+            "forward_to": config["forward_to"],
+            "active_chats": stages.get("chatting", 0),
+            "total_conversations": sum(stages.values()),
+            "stages": stages
+        }
+    return {
+        "businesses": businesses,
+        "advice_cache": c.advice_cache.stats(),
+        "openai_gateway": c.openai_gateway.stats(),
+        "lead_notifier": c.lead_notifier.stats(),
+        "tenant_artifacts": {"entries": len(c.tenant_artifacts), "builds": c.tenant_artifacts.builds},
+        "latency": Stats().get_stats()["latency"],
+    }
@@ -0,0 +1,79 @@
+
+import threading
+import time
+from types import SimpleNamespace
+
+DEFAULT_REPLY = (
+    "First, shut off the water at the main valve so it doesn't get worse. "
+    "Put a bucket under the leak and move anything valuable out of the way. "
+    "If the water is near outlets or the panel, stay clear and don't touch anything electrical. "
+    "Take a couple of photos for the plumber, it helps them bring the right parts. "
+    "Hang tight, they'll be in touch soon."
+)
+
+
+class _FakeCompletions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        owner = self._owner
+        with owner._lock:
+            owner.requests.append({"model": model, "messages": messages, "stream": stream, **kwargs})
+            owner.in_flight += 1
+            owner.max_in_flight = max(owner.max_in_flight, owner.in_flight)
+        try:
+            if owner.errors:
+                with owner._lock:
+                    error = owner.errors.pop(0) if owner.errors else None
+                if error is not None:
+                    raise error
+            time.sleep(owner.latency)
+            reply = owner.reply(messages) if callable(owner.reply) else owner.reply
+        except Exception:
+            owner._done()
+            raise
+        if stream:
+            return owner._stream(reply, model)
+        owner._done()
+        message = SimpleNamespace(role="assistant", content=reply)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=0, completion_tokens=len(reply.split())),
+        )
+
+
+class FakeOpenAIClient:
+    """Offline stand-in for openai.OpenAI with configurable latency.
+
+    `latency` is the time to first token and `token_delay` the time between
+    streamed tokens. Queue exceptions in `errors` to have the next calls raise them.
+    """
+
+    def __init__(self, reply=DEFAULT_REPLY, latency=0.0, token_delay=0.0):
+        self.reply = reply
+        self.latency = latency
+        self.token_delay = token_delay
+        self.errors = []
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+    def _done(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _stream(self, reply, model):
+        try:
+            words = reply.split(" ")
+            for i, word in enumerate(words):
+                if self.token_delay:
+                    time.sleep(self.token_delay)
+                text = word if i == 0 else " " + word
+                delta = SimpleNamespace(content=text, role="assistant")
+                yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)])
+        finally:
+            self._done()
@@ -0,0 +1,62 @@
+
+import itertools
+import threading
+import time
+
+from twilio.base.exceptions import TwilioRestException
+
+
+class FakeResource:
+    def __init__(self, sid, **fields):
+        self.sid = sid
+        self.__dict__.update(fields)
+
+
+class _FakeMessages:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, body=None, from_=None, to=None, **kwargs):
+        return self._owner._record("messages", "SM", body=body, from_=from_, to=to, **kwargs)
+
+
+class _FakeCalls:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, to=None, from_=None, **kwargs):
+        return self._owner._record("calls", "CA", to=to, from_=from_, **kwargs)
+
+
+class FakeTwilioClient:
+    """Offline stand-in for twilio.rest.Client for tests and benchmarks.
+
+    `latency` is added to every API call and the first `failures` calls raise
+    a 503 so retry paths can be exercised.
+    """
+
+    def __init__(self, latency=0.0, failures=0, failure_status=503):
+        self.latency = latency
+        self.failures = failures
+        self.failure_status = failure_status
+        self.messages = _FakeMessages(self)
+        self.calls = _FakeCalls(self)
+        self.sent = []
+        self.placed_calls = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _record(self, kind, prefix, **fields):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self.failures > 0:
+                self.failures -= 1
+                raise TwilioRestException(self.failure_status, f"https://api.twilio.com/fake/{kind}", "Fake failure")
+            resource = FakeResource(f"{prefix}{next(self._ids):032d}", **fields)
+            (self.sent if kind == "messages" else self.placed_calls).append(resource)
+        return resource
+
+    def messages_to(self, number):
+        with self._lock:
+            return [m.body for m in self.sent if m.to == number]
@@ -0,0 +1,163 @@
+
+import heapq
+import logging
+import re
+import threading
+import time
+
+from utils.forksafe import PerProcess
+from utils.sms_encoding import fit_segments, segment_count
+from utils.stats import Stats
+
+logger = logging.getLogger(__name__)
+
+# Leads mentioning any of these skip the digest and go out at once
+EMERGENCY_KEYWORDS = (
+    "emergency", "urgent", "flood", "flooding", "flooded", "burst", "gas", "smoke", "fire", "sparks",
+    "sparking", "shock", "sewage", "no heat", "water everywhere", "ceiling", "carbon monoxide",
+)
+_EMERGENCY = re.compile(r"\b(?:" + "|".join(re.escape(k) for k in EMERGENCY_KEYWORDS) + r")\b", re.IGNORECASE)
+
+
+def is_urgent(text):
+    return bool(text) and _EMERGENCY.search(text) is not None
+
+
+class _Batch:
+    __slots__ = ("service", "leads", "due")
+
+    def __init__(self, service, due):
+        self.service = service
+        self.leads = []
+        self.due = due
+
+
+class LeadNotifier:
+    """Coalesces new-lead texts to a business owner into digests.
+
+    Leads are buffered per (business number, owner number) and flushed
+    `window` seconds after the first one arrives or as soon as `max_batch`
+    are waiting, whichever comes first. A flush packs as many whole leads as
+    bill at most `max_segments` SMS segments into each message, counted in
+    the encoding the message will actually use. Urgent leads, and every lead when `window` is 0, are sent
+    immediately.
+    """
+
+    def __init__(self, outbound, window=30.0, max_batch=5, max_segments=4):
+        self.outbound = outbound
+        self.window = window
+        self.max_batch = max_batch
+        self.max_segments = max_segments
+        self.leads = 0
+        self.urgent = 0
+        self.messages = 0
+        self._batches = {}
+        self._due = []  # heap of (due, key)
+        self._cond = threading.Condition()
+        self._flusher = PerProcess(lambda first: threading.Thread(
+            target=self._run, name="lead-notifier", daemon=True).start())
+        self._closed = False
+        # Pending digests must go out before the queue they're sent through drains
+        outbound.add_shutdown_hook(self.shutdown)
+
+    def notify(self, from_, to, lead, service="service", urgent=None):
+        """Queue `lead` (the request details, without a heading) for the owner at `to`."""
+        if urgent is None:
+            urgent = is_urgent(lead)
+        with self._cond:
+            self.leads += 1
+            if urgent:
+                self.urgent += 1
+        if urgent or self.window <= 0 or self._closed:
+            prefix = "URGENT" if urgent else "New"
+            self._send(from_, to, f"{prefix} {service} request:\n{lead}")
+            return
+        self._flusher.ensure()
+        key = (from_, to)
+        ready = None
+        with self._cond:
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = self._batches[key] = _Batch(service, time.monotonic() + self.window)
+                heapq.heappush(self._due, (batch.due, key))
+                self._cond.notify()
+            batch.leads.append(lead)
+            if len(batch.leads) >= self.max_batch:
+                ready = self._batches.pop(key)
+            self._publish()
+        if ready is not None:
+            self._deliver(key, ready)
+
+    def _publish(self):
+        # Caller holds self._cond
+        Stats().set_gauge("notify.pending", sum(len(b.leads) for b in self._batches.values()))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._due or self._due[0][0] > time.monotonic()):
+                    self._cond.wait(self._due[0][0] - time.monotonic() if self._due else None)
+                if self._closed:
+                    return
+                due, key = heapq.heappop(self._due)
+                batch = self._batches.get(key)
+                # A batch flushed early by max_batch leaves its heap item behind
+                if batch is None or batch.due != due:
+                    continue
+                del self._batches[key]
+                self._publish()
+            try:
+                self._deliver(key, batch)
+            except Exception as e:
+                logger.error("Failed to send lead digest to %s: %s", key[1], e)
+
+    def _deliver(self, key, batch):
+        from_, to = key
+        for body in self.pack(batch.service, batch.leads):
+            self._send(from_, to, body)
+
+    def pack(self, service, leads):
+        """Group whole leads into as few messages of at most `max_segments` segments as possible."""
+        if len(leads) == 1:
+            return [fit_segments(f"New {service} request:\n{leads[0]}", self.max_segments)]
+        messages = []
+        body = ""
+        for i, lead in enumerate(leads, 1):
+            entry = f"{i}) {lead}"
+            # One accented name switches the whole message to UCS-2, so count the combined text
+            if body and segment_count(f"{body}\n\n{entry}") > self.max_segments:
+                messages.append(body)
+                body = ""
+            if not body:
+                body = f"{len(leads)} new {service} requests:\n\n{entry}" if not messages else entry
+            else:
+                body += "\n\n" + entry
+        messages.append(body)
+        # A single lead too long for a message on its own is trimmed rather than split
+        return [fit_segments(message, self.max_segments) for message in messages]
+
+    def _send(self, from_, to, body):
+        with self._cond:
+            self.messages += 1
+        self.outbound.send(to=to, body=body, from_=from_)
+
+    def flush(self):
+        """Send every pending digest now."""
+        with self._cond:
+            batches = list(self._batches.items())
+            self._batches.clear()
+            self._due.clear()
+            self._publish()
+        for key, batch in batches:
+            self._deliver(key, batch)
+
+    def stats(self):
+        with self._cond:
+            pending = sum(len(b.leads) for b in self._batches.values())
+        return {"leads": self.leads, "urgent": self.urgent, "messages": self.messages, "pending": pending}
+
+    def shutdown(self):
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,176 @@
+
+import atexit
+import logging
+import queue
+import random
+import threading
+import time
+import zlib
+
+from twilio.base.exceptions import TwilioRestException
+
+from utils.forksafe import PerProcess
+from utils.logging_config import correlation_id
+from utils.sms_encoding import is_gsm7, segment_count, to_gsm7
+from utils.stats import Stats
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class OutboundMessage:
+    __slots__ = ("to", "body", "from_", "attempts", "enqueued_at", "correlation_id")
+
+    def __init__(self, to, body, from_):
+        self.to = to
+        self.body = body
+        self.from_ = from_
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+        # Keep the webhook's SID so worker log lines can be tied back to it
+        self.correlation_id = correlation_id.get()
+
+
+def is_retryable(error):
+    # Twilio 4xx errors (bad number, unsubscribed recipient...) won't succeed on retry
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return True
+
+
+class OutboundQueue:
+    """Sends SMS from background workers so webhooks can return immediately.
+
+    Messages for the same destination always hash to the same worker, so a
+    customer receives them in the order they were enqueued. `client_for`, if
+    given, maps a sending number to the Twilio client for its account;
+    otherwise every message goes through `client`.
+    """
+
+    def __init__(self, client, workers=4, max_retries=3, backoff=0.5, max_backoff=8.0, client_for=None):
+        self.client = client
+        self.client_for = client_for
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self._queues = []
+        self._threads = []
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._workers = PerProcess(self._start_workers)
+        self._closed = False
+        self._shutdown_hooks = []
+
+    def add_shutdown_hook(self, hook):
+        """Run `hook()` at the start of shutdown, so producers can flush buffered messages into the queue."""
+        self._shutdown_hooks.append(hook)
+
+    def _ensure_started(self):
+        self._workers.ensure()
+
+    def _start_workers(self, first):
+        with self._cond:
+            self._queues = [queue.Queue() for _ in range(self.workers)]
+            self._threads = []
+            self._pending = 0
+            for i, q in enumerate(self._queues):
+                t = threading.Thread(target=self._run, args=(q,), name=f"outbound-sms-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        if first:
+            atexit.register(self.shutdown)
+
+    def send(self, to, body, from_):
+        # GSM-7 fits 160 characters per segment against 70 for UCS-2, so smart quotes and emoji are rewritten
+        msg = OutboundMessage(to, to_gsm7(body), from_)
+        if self.workers <= 0:
+            self._deliver(msg)
+            return msg
+        if self._closed:
+            raise RuntimeError("Outbound queue is shut down")
+        self._ensure_started()
+        with self._cond:
+            self._pending += 1
+        shard = zlib.crc32((to or "").encode()) % len(self._queues)
+        self._queues[shard].put(msg)
+        return msg
+
+    def pending(self):
+        with self._cond:
+            return self._pending
+
+    def _run(self, q):
+        while True:
+            msg = q.get()
+            if msg is _STOP:
+                return
+            try:
+                correlation_id.set(msg.correlation_id)
+                self._deliver(msg)
+            finally:
+                with self._cond:
+                    self._pending -= 1
+                    if self._pending == 0:
+                        self._cond.notify_all()
+
+    def _deliver(self, msg):
+        stats = Stats()
+        stats.record_latency("outbound.queue_wait", time.monotonic() - msg.enqueued_at)
+        client = self.client_for(msg.from_) if self.client_for else self.client
+        while True:
+            msg.attempts += 1
+            try:
+                with stats.timer("twilio.messages.create"):
+                    result = client.messages.create(body=msg.body, from_=msg.from_, to=msg.to)
+                with self._cond:
+                    self.sent += 1
+                stats.increment("sms.messages")
+                stats.increment("sms.segments", segment_count(msg.body))
+                if not is_gsm7(msg.body):
+                    stats.increment("sms.ucs2_messages")
+                logger.info("SMS sent to %s with SID %s", msg.to, getattr(result, "sid", None))
+                return result
+            except Exception as e:
+                if msg.attempts > self.max_retries or not is_retryable(e):
+                    with self._cond:
+                        self.failed += 1
+                    logger.error("Giving up on SMS to %s after %d attempts: %s", msg.to, msg.attempts, e)
+                    return None
+                with self._cond:
+                    self.retried += 1
+                delay = min(self.max_backoff, self.backoff * (2 ** (msg.attempts - 1)))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def drain(self, timeout=None):
+        """Block until every enqueued message has been delivered or given up on."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=10.0):
+        if self._closed:
+            return True
+        for hook in self._shutdown_hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.error("Outbound shutdown hook failed: %s", e)
+        drained = True
+        if self._workers.started():
+            drained = self.drain(timeout)
+            for q in self._queues:
+                q.put(_STOP)
+        self._closed = True
+        if not drained:
+            logger.warning("Outbound queue shut down with %d undelivered messages", self.pending())
+        return drained
@@ -0,0 +1,241 @@
+
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+
+from utils.stats import Stats
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayTimeout(Exception):
+    """The request's deadline passed before OpenAI could answer it."""
+
+
+def is_retryable(error):
+    # Rate limits and server-side failures are worth another try; bad requests are not
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in (
+        "APITimeoutError", "APIConnectionError")
+
+
+class _Ticket:
+    __slots__ = ("business", "tag", "granted")
+
+    def __init__(self, business, tag):
+        self.business = business
+        self.tag = tag
+        self.granted = False
+
+
+class _HeldStream:
+    """A streaming response that returns its gateway slot exactly once: when exhausted, closed or collected.
+
+    A generator's `finally` never runs if it is closed before its first
+    `next()`, which would leak the slot; this object has no such state.
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._iterator = iter(stream)
+        self._release = release
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        with self._lock:
+            release, self._release = self._release, None
+        if release is None:
+            return
+        try:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                close()
+        finally:
+            release()
+
+    def __del__(self):
+        self.close()
+
+
+class OpenAIGateway:
+    """The only path from the app to the OpenAI API.
+
+    At most `max_concurrency` requests are in flight overall and
+    `per_business` for any one business. Waiting requests are granted slots
+    in weighted-fair order: each gets a virtual finish tag of
+    max(now, business's last tag) + 1/weight, and the smallest tag goes
+    first, so a tenant with a backlog can't starve one that sends a single
+    question. Every request has an overall `deadline` (seconds) covering the
+    wait, each attempt and the backoff between retries; 429/5xx errors are
+    retried with jittered exponential backoff and finally tried once on
+    `fallback_model`.
+    """
+
+    def __init__(self, client_factory, max_concurrency=8, per_business=2, deadline=30.0,
+                 request_timeout=20.0, max_retries=2, backoff=0.5, max_backoff=8.0,
+                 fallback_model=None, weight_for=None):
+        self.client_factory = client_factory
+        self.max_concurrency = max_concurrency
+        self.per_business = per_business
+        self.deadline = deadline
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.fallback_model = fallback_model
+        self.weight_for = weight_for
+        self.retries = 0
+        self.fallbacks = 0
+        self.timeouts = 0
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._active = defaultdict(int)
+        self._waiting = defaultdict(deque)
+        self._queued = 0
+        self._finish = defaultdict(float)
+        self._vtime = 0.0
+
+    def _weight(self, business):
+        if self.weight_for is None:
+            return 1.0
+        try:
+            return max(float(self.weight_for(business)), 0.01)
+        except Exception:
+            return 1.0
+
+    def _publish(self):
+        # Caller holds self._cond
+        stats = Stats()
+        stats.set_gauge("openai.gateway_queued", self._queued)
+        stats.set_gauge("openai.gateway_in_flight", self._in_flight)
+
+    def _dispatch(self):
+        # Caller holds self._cond; grant free slots to the smallest eligible tags
+        granted = False
+        while self._in_flight < self.max_concurrency:
+            best = None
+            for business, waiting in self._waiting.items():
+                if waiting and self._active[business] < self.per_business:
+                    if best is None or waiting[0].tag < best.tag:
+                        best = waiting[0]
+            if best is None:
+                break
+            self._waiting[best.business].popleft()
+            self._queued -= 1
+            self._active[best.business] += 1
+            self._in_flight += 1
+            self._vtime = best.tag
+            best.granted = True
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _acquire(self, business, expires):
+        started = time.monotonic()
+        with self._cond:
+            tag = max(self._vtime, self._finish[business]) + 1.0 / self._weight(business)
+            self._finish[business] = tag
+            ticket = _Ticket(business, tag)
+            self._waiting[business].append(ticket)
+            self._queued += 1
+            self._dispatch()
+            while not ticket.granted:
+                remaining = expires - time.monotonic()
+                if remaining <= 0:
+                    self._waiting[business].remove(ticket)
+                    self._queued -= 1
+                    self.timeouts += 1
+                    self._publish()
+                    raise GatewayTimeout(f"Waited {time.monotonic() - started:.1f}s for an OpenAI slot")
+                self._cond.wait(remaining)
+            self._publish()
+        Stats().record_latency("openai.gateway_wait", time.monotonic() - started)
+
+    def _release(self, business):
+        with self._cond:
+            self._in_flight -= 1
+            self._active[business] -= 1
+            if not self._active[business] and not self._waiting[business]:
+                del self._active[business]
+                del self._waiting[business]
+            self._dispatch()
+            self._publish()
+
+    def complete(self, business, model, messages, stream=False, deadline=None, **options):
+        """Run a chat completion for `business`; with stream=True the slot is held until the stream is consumed."""
+        expires = time.monotonic() + (self.deadline if deadline is None else deadline)
+        self._acquire(business, expires)
+        try:
+            response = self._create(model, messages, stream, expires, options)
+            if stream:
+                return _HeldStream(response, lambda: self._release(business))
+        except BaseException:
+            self._release(business)
+            raise
+        self._release(business)
+        return response
+
+    def _create(self, model, messages, stream, expires, options):
+        models = [model] * (self.max_retries + 1)
+        if self.fallback_model and self.fallback_model != model:
+            models.append(self.fallback_model)
+        for attempt, current in enumerate(models):
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                with self._cond:
+                    self.timeouts += 1
+                raise GatewayTimeout("OpenAI request deadline exceeded")
+            if current != model:
+                with self._cond:
+                    self.fallbacks += 1
+                Stats().record_call("openai.fallback")
+                logger.warning("Falling back from %s to %s", model, current)
+            try:
+                return self.client_factory().chat.completions.create(
+                    model=current,
+                    messages=messages,
+                    stream=stream,
+                    timeout=min(self.request_timeout, remaining),
+                    **options
+                )
+            except Exception as e:
+                if attempt == len(models) - 1 or not is_retryable(e):
+                    Stats().record_error("openai")
+                    raise
+                with self._cond:
+                    self.retries += 1
+                Stats().record_call("openai.retry")
+                if models[attempt + 1] == current:
+                    delay = min(self.max_backoff, self.backoff * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                    if time.monotonic() + delay >= expires:
+                        with self._cond:
+                            self.timeouts += 1
+                        raise GatewayTimeout("OpenAI request deadline exceeded while backing off") from e
+                    logger.warning("OpenAI call failed (%s), retrying in %.2fs", e, delay)
+                    time.sleep(delay)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "active": {b: n for b, n in self._active.items() if n},
+                "waiting": {b: len(q) for b, q in self._waiting.items() if q},
+                "retries": self.retries,
+                "fallbacks": self.fallbacks,
+                "timeouts": self.timeouts,
+            }
@@ -1,18 +1,86 @@
 
-from openai import OpenAI
+import logging
+import os
+import threading
+import time
 from config import Config
+from services.openai_gateway import OpenAIGateway
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+_gateway = None
+
+def get_openai_client():
+    """Return the shared OpenAI client, creating it on first use.
+
+    The SDK import and client construction are deferred so importing the app
+    never pays for them (or for any network round trip).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=Config.OPENAI_API_KEY)
+    return _client
+
+def get_openai_gateway():
+    """Return the shared gateway every OpenAI call goes through (see services.openai_gateway)."""
+    global _gateway
+    if _gateway is None:
+        with _client_lock:
+            if _gateway is None:
+                _gateway = OpenAIGateway(
+                    get_openai_client,
+                    max_concurrency=int(os.environ.get("OPENAI_MAX_CONCURRENCY", "8")),
+                    per_business=int(os.environ.get("OPENAI_PER_BUSINESS", "2")),
+                    deadline=float(os.environ.get("OPENAI_DEADLINE", "30")),
+                    request_timeout=float(os.environ.get("OPENAI_REQUEST_TIMEOUT", "20")),
+                    max_retries=int(os.environ.get("OPENAI_MAX_RETRIES", "2")),
+                    fallback_model=os.environ.get("OPENAI_FALLBACK_MODEL", "gpt-3.5-turbo"),
+                )
+    return _gateway
+
+# Result of the optional startup probe, reported by /health
+openai_health = {"status": "unknown", "checked_at": None, "error": None}
+
+def probe_openai():
+    try:
+        get_openai_client().models.list()
+        openai_health.update(status="ok", error=None)
+    except Exception as e:
+        openai_health.update(status="error", error=str(e))
+        logger.warning("OpenAI health probe failed: %s", e)
+    openai_health["checked_at"] = time.time()
+
+def start_openai_health_probe():
+    """Check OpenAI connectivity in a background thread, off the request path."""
+    thread = threading.Thread(target=probe_openai, name="openai-health-probe", daemon=True)
+    thread.start()
+    return thread
 
 class OpenAIService:
-    def __init__(self):
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+    def __init__(self, gateway=None):
+        self._gateway = gateway
+
+    @property
+    def client(self):
+        return get_openai_client()
+
+    @property
+    def gateway(self):
+        return self._gateway or get_openai_gateway()
 
-    def generate_response(self, prompt):
+    def generate_response(self, prompt, business="default"):
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}]
+            response = self.gateway.complete(
+                business,
+                "gpt-3.5-turbo",
+                [{"role": "user", "content": prompt}]
             )
             return response.choices[0].message.content
         except Exception as e:
-            print(f"Error generating response: {str(e)}")
+            logger.error("Error generating response: %s", e)
             return None
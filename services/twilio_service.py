@@ -1,13 +1,69 @@
 
+import logging
+import os
+import threading
+
+from requests.adapters import HTTPAdapter
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+
+class TwilioClientPool:
+    """One Twilio Client per (account SID, auth token), shared by every thread.
+
+    Each client owns a requests Session whose adapter keeps up to
+    `pool_maxsize` keep-alive connections to api.twilio.com, so concurrent
+    sends for a tenant reuse warm TLS connections instead of handshaking.
+    Sessions are not shared across fork; a child process builds its own.
+    """
+
+    def __init__(self, pool_maxsize=None, timeout=None):
+        self.pool_maxsize = pool_maxsize or int(os.environ.get("TWILIO_POOL_SIZE", "16"))
+        self.timeout = timeout or float(os.environ.get("TWILIO_HTTP_TIMEOUT", "10"))
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _http_client(self):
+        http_client = TwilioHttpClient(pool_connections=True, timeout=self.timeout)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize, pool_block=False)
+        http_client.session.mount("https://", adapter)
+        return http_client
+
+    def get(self, account_sid, auth_token):
+        key = (account_sid, auth_token)
+        if self._pid == os.getpid():
+            client = self._clients.get(key)
+            if client is not None:
+                return client
+        with self._lock:
+            if self._pid != os.getpid():
+                self._clients = {}
+                self._pid = os.getpid()
+            client = self._clients.get(key)
+            if client is None:
+                client = Client(account_sid, auth_token, http_client=self._http_client())
+                self._clients[key] = client
+            return client
+
+    def __len__(self):
+        return len(self._clients)
+
+
+client_pool = TwilioClientPool()
+
+
+def get_twilio_client(account_sid=None, auth_token=None):
+    """Pooled client for the given credentials, defaulting to the app-wide ones."""
+    return client_pool.get(account_sid or Config.TWILIO_ACCOUNT_SID, auth_token or Config.TWILIO_AUTH_TOKEN)
+
+
 class TwilioService:
-    def __init__(self):
-        self.client = Client(
-            Config.TWILIO_ACCOUNT_SID,
-            Config.TWILIO_AUTH_TOKEN
-        )
+    def __init__(self, account_sid=None, auth_token=None):
+        self.client = get_twilio_client(account_sid, auth_token)
 
     def make_call(self, to_number, from_number):
         try:
@@ -18,5 +74,5 @@ class TwilioService:
             )
             return call.sid
         except Exception as e:
-            print(f"Call failed: {str(e)}")
+            logger.error("Call failed: %s", e)
             return None
@@ -0,0 +1,226 @@
+"""Which services the app has and how each is built; see services.container.
+
+Imports happen inside the factories, so `build_container()` is cheap and a
+worker only loads the SDKs, stores and pools its requests actually use.
+Settings come from the environment, as documented next to each service.
+"""
+import functools
+import logging
+import os
+
+from config import Config
+from services.container import Container
+
+logger = logging.getLogger(__name__)
+
+
+def tenants(c):
+    """Multi-business configuration: inbound number -> tenant, resolved in O(1) per request.
+
+    Persisted in TENANT_STORE (a JSON file path or sqlite:///path) so every
+    worker sees admin changes within TENANT_POLL_INTERVAL seconds. Without
+    TENANT_STORE nothing is written to disk: each process keeps its own
+    businesses in memory, seeded with the default one, which suits a single
+    development server only. Calls to unknown numbers are handled as
+    DEFAULT_TENANT's.
+    """
+    from utils.tenant_store import create_tenant_store
+    from utils.tenants import TenantRegistry
+
+    default_number = os.environ.get("DEFAULT_TENANT", "+17786535845")
+    seed = {
+        default_number: {
+            "forward_to": "+16044423722",
+            "business_name": "FlowRite Plumbing",
+            "business_type": "plumber",
+        }
+    }
+    # Shared credentials are merged into each tenant in memory, never written to the store
+    registry = TenantRegistry(
+        defaults={
+            "twilio_sid": Config.TWILIO_ACCOUNT_SID,
+            "twilio_token": Config.TWILIO_AUTH_TOKEN,
+            "openai_key": Config.OPENAI_API_KEY,
+        },
+        poll_interval=float(os.environ.get("TENANT_POLL_INTERVAL", "1.0")),
+        default_number=default_number
+    )
+    url = os.environ.get("TENANT_STORE")
+    if url:
+        # Load businesses from admin-configured storage, seeding it on first run
+        store = create_tenant_store(url)
+        if not store.load()[1]:
+            store.put(default_number, seed[default_number])
+        registry.attach(store)
+    else:
+        logger.warning("TENANT_STORE is not set; businesses added in the admin are kept in this process only")
+        registry.load(seed)
+
+    default = registry.default
+    if not all([Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN, default["number"], default["forward_to"]]):
+        logger.error("Missing required Twilio credentials", extra={
+            "account_sid": "Present" if Config.TWILIO_ACCOUNT_SID else "Missing",
+            "auth_token": "Present" if Config.TWILIO_AUTH_TOKEN else "Missing",
+            "phone_number": "Present" if default["number"] else "Missing",
+            "forward_number": "Present" if default["forward_to"] else "Missing"
+        })
+    return registry
+
+
+def tenant_artifacts(c):
+    from services.conversation import build_tenant_artifacts
+    from utils.tenant_artifacts import TenantArtifacts
+    return TenantArtifacts(c.tenants, build_tenant_artifacts)
+
+
+def twilio_client(c):
+    from services.twilio_service import get_twilio_client
+    return get_twilio_client(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN)
+
+
+def outbound(c):
+    """Outbound SMS are sent from background workers so webhooks return right away."""
+    from services.message_queue import OutboundQueue
+    from services.twilio_service import get_twilio_client
+
+    def client_for(number):
+        # Each tenant sends with its own account's credentials over a pooled keep-alive session
+        tenant = c.tenants.resolve_or_default(number)
+        return get_twilio_client(tenant["twilio_sid"], tenant["twilio_token"])
+
+    return OutboundQueue(
+        c.twilio_client,
+        client_for=client_for,
+        workers=int(os.environ.get("OUTBOUND_SMS_WORKERS", "4")),
+        max_retries=int(os.environ.get("OUTBOUND_SMS_RETRIES", "3")),
+    )
+
+
+def lead_notifier(c):
+    """New-lead texts to owners are batched into digests; leads with emergency keywords go out at once."""
+    from services.lead_notifier import LeadNotifier
+    return LeadNotifier(
+        c.outbound,
+        window=float(os.environ.get("LEAD_DIGEST_WINDOW", "30")),
+        max_batch=int(os.environ.get("LEAD_DIGEST_MAX", "5")),
+    )
+
+
+def conversation_history(c):
+    """HISTORY_SUMMARIZER=gpt summarizes evicted turns with gpt-3.5-turbo instead of extractively."""
+    from utils.history import ConversationHistory, gpt_summarizer
+    return ConversationHistory(
+        budget_tokens=int(os.environ.get("HISTORY_TOKEN_BUDGET", "1200")),
+        summarizer=gpt_summarizer(c.openai_gateway) if os.environ.get("HISTORY_SUMMARIZER") == "gpt" else None
+    )
+
+
+def openai_gateway(c):
+    from services.openai_service import get_openai_gateway
+    return get_openai_gateway()
+
+
+def advice_cache(c):
+    """First questions of a conversation are cached per business type and issue.
+
+    ADVICE_CACHE_TTL sets the lifetime in seconds; ADVICE_CACHE_TTLS overrides
+    it per business type, e.g. "electrician=3600,hvac=21600".
+    """
+    from utils.advice_cache import AdviceCache, parse_ttls
+    return AdviceCache(
+        default_ttl=int(os.environ.get("ADVICE_CACHE_TTL", str(6 * 3600))),
+        ttls=parse_ttls(os.environ.get("ADVICE_CACHE_TTLS", ""))
+    )
+
+
+def advice_pipeline(c):
+    from services.advice_pipeline import AdvicePipeline
+    from services.conversation import ADVICE_COMPLETION_OPTIONS
+    from services.openai_service import get_openai_client
+    return AdvicePipeline(
+        get_openai_client,
+        c.outbound,
+        model="gpt-4-turbo-preview",
+        max_workers=int(os.environ.get("ADVICE_WORKERS", "8")),
+        per_business=int(os.environ.get("ADVICE_PER_BUSINESS", "4")),
+        completion_options=ADVICE_COMPLETION_OPTIONS,
+        gateway=c.openai_gateway,
+        # A customer who texted STOP gets nothing more, even from an answer already streaming
+        is_active=lambda number: number in c.customer_states
+    )
+
+
+def conversation_index(c):
+    """Per-business conversation counts; read from the store itself when it is shared between workers."""
+    from utils.conversation_index import ConversationIndex, StoreConversationIndex
+    store = c.customer_states
+    if hasattr(store, "stage_counts"):
+        return StoreConversationIndex(store)
+    index = ConversationIndex()
+    default_number = c.tenants.default["number"]
+    index.rebuild(store.items(), lambda state: state.get("business_number", default_number))
+    return index
+
+
+def customer_states(c):
+    """Customer conversation states: STATE_STORE "memory" or "sqlite:///path/to/states.db" to share across workers.
+
+    The memory store keeps at most STATE_MAX_ENTRIES conversations and about STATE_MAX_BYTES of state.
+    """
+    from services.conversation import SESSION_TTLS, session_evicted
+    from utils.state_store import create_state_store
+    return create_state_store(
+        os.environ.get("STATE_STORE", "memory"),
+        on_evict=functools.partial(session_evicted, c),
+        stage_ttls=SESSION_TTLS,
+        max_entries=int(os.environ.get("STATE_MAX_ENTRIES", "10000")),
+        max_bytes=int(os.environ.get("STATE_MAX_BYTES", str(64 * 1024 * 1024)))
+    )
+
+
+def seen_webhooks(c):
+    """Twilio retries slow or failed webhooks; IDEMPOTENCY_STORE=sqlite:///... catches retries across workers."""
+    from utils.idempotency import create_seen_set
+    return create_seen_set(os.environ.get("IDEMPOTENCY_STORE"))
+
+
+def sms_limiter(c):
+    """Per-customer flood protection for the SMS webhook (RATE_LIMIT_STORE=sqlite:///... shares counters)."""
+    from utils.rate_limit import create_rate_limiter
+    return create_rate_limiter(
+        calls=int(os.environ.get("SMS_RATE_LIMIT", "20")),
+        per=60,
+        url=os.environ.get("RATE_LIMIT_STORE")
+    )
+
+
+def twilio_signatures(c):
+    """Without an auth token configured (local development) unsigned webhooks are allowed."""
+    from utils.twilio_signature import SignatureVerifier
+    return SignatureVerifier(
+        lambda number: c.tenants.resolve_or_default(number)["twilio_token"],
+        required=bool(Config.TWILIO_AUTH_TOKEN),
+        base_url=os.environ.get("PUBLIC_BASE_URL")
+    )
+
+
+def sms_flow(c):
+    from services.conversation import build_sms_flow
+    return build_sms_flow(c)
+
+
+FACTORIES = (
+    tenants, tenant_artifacts, twilio_client, outbound, lead_notifier, conversation_history, openai_gateway,
+    advice_cache, advice_pipeline, conversation_index, customer_states, seen_webhooks, sms_limiter,
+    twilio_signatures, sms_flow,
+)
+
+
+def build_container(**overrides):
+    """A container with every app service registered; keyword arguments replace services outright."""
+    container = Container()
+    for factory in FACTORIES:
+        container.register(factory.__name__, factory)
+    for name, instance in overrides.items():
+        container.override(name, instance)
+    return container
@@ -0,0 +1,63 @@
+
+import threading
+import time
+import unittest
+from utils.advice_cache import AdviceCache, normalize, parse_ttls
+
+class TestAdviceCache(unittest.TestCase):
+    def test_normalize_ignores_case_punctuation_and_filler(self):
+        self.assertEqual(normalize("My water heater is LEAKING!!"), normalize("water heater leaking"))
+        self.assertNotEqual(normalize("water heater leaking"), normalize("toilet won't stop running"))
+
+    def test_hit_after_completion(self):
+        cache = AdviceCache()
+        key, future, leader = cache.claim("plumber", "chatting", "leak", "what should I do?")
+        self.assertTrue(leader)
+        cache.complete(key, "Turn off the water.")
+        self.assertEqual(future.result(), "Turn off the water.")
+        key, future, leader = cache.claim("plumber", "chatting", "Leak", "What should I do")
+        self.assertFalse(leader)
+        self.assertEqual(future.result(), "Turn off the water.")
+        self.assertEqual(cache.stats()["hits"], 1)
+        # Different business type or issue is a different entry
+        self.assertTrue(cache.claim("electrician", "chatting", "leak", "what should I do?")[2])
+        self.assertTrue(cache.claim("plumber", "chatting", "clogged drain", "what should I do?")[2])
+
+    def test_single_flight(self):
+        cache = AdviceCache()
+        results = []
+        leaders = []
+
+        def ask():
+            key, future, leader = cache.claim("plumber", "chatting", "leak", "help")
+            leaders.append(leader)
+            results.append(future)
+
+        threads = [threading.Thread(target=ask) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(leaders.count(True), 1)
+        cache.complete(cache.key("plumber", "chatting", "leak", "help"), "answer")
+        self.assertEqual({f.result(timeout=1) for f in results}, {"answer"})
+        self.assertEqual(cache.stats()["shared_in_flight"], 9)
+
+    def test_failures_are_not_cached(self):
+        cache = AdviceCache()
+        key, future, leader = cache.claim("plumber", "chatting", "leak", "help")
+        cache.complete(key, None)
+        self.assertIsNone(future.result())
+        self.assertTrue(cache.claim("plumber", "chatting", "leak", "help")[2])
+
+    def test_ttl_per_business_type(self):
+        self.assertEqual(parse_ttls(" electrician=3600, hvac=60,"), {"electrician": 3600, "hvac": 60})
+        with self.assertRaises(ValueError):
+            parse_ttls("hvac")
+        cache = AdviceCache(default_ttl=60, ttls={"hvac": 0.05})
+        for business_type in ("plumber", "hvac"):
+            key, future, leader = cache.claim(business_type, "chatting", "leak", "help")
+            cache.complete(key, "answer")
+        time.sleep(0.1)
+        self.assertFalse(cache.claim("plumber", "chatting", "leak", "help")[2])
+        self.assertTrue(cache.claim("hvac", "chatting", "leak", "help")[2])
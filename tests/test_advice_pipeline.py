@@ -0,0 +1,103 @@
+
+import threading
+import unittest
+from services.advice_pipeline import AdvicePipeline
+from services.fake_openai import FakeOpenAIClient
+from services.fake_twilio import FakeTwilioClient
+from services.message_queue import OutboundQueue
+from services.openai_gateway import OpenAIGateway
+from utils.sms_encoding import segment_count
+
+class TestAdvicePipeline(unittest.TestCase):
+    def setUp(self):
+        self.twilio = FakeTwilioClient()
+        self.outbound = OutboundQueue(self.twilio, workers=2)
+
+    def tearDown(self):
+        self.outbound.shutdown()
+
+    def run_jobs(self, pipeline, count, business='+15550000000'):
+        done = threading.Semaphore(0)
+        for i in range(count):
+            pipeline.submit(business, f'+1555000{i:04d}', business,
+                            [{"role": "user", "content": "help"}],
+                            footer='Type STOP to end.', on_complete=lambda text: done.release())
+        for _ in range(count):
+            self.assertTrue(done.acquire(timeout=5))
+        self.assertTrue(self.outbound.drain(timeout=5))
+
+    def test_reply_split_into_segments_with_footer(self):
+        openai = FakeOpenAIClient()
+        pipeline = AdvicePipeline(lambda: openai, self.outbound, message_segments=1)
+        self.run_jobs(pipeline, 1)
+        segments = self.twilio.messages_to('+15550000000')
+        self.assertGreater(len(segments), 1)
+        self.assertTrue(all(len(s) <= 160 for s in segments))
+        self.assertTrue(segments[-1].endswith('Type STOP to end.'))
+        self.assertEqual(' '.join(segments[:-1] + [segments[-1].split('\n\n')[0]]), openai.reply)
+
+    def test_completions_go_through_gateway(self):
+        openai = FakeOpenAIClient(latency=0.02)
+        gateway = OpenAIGateway(lambda: openai, max_concurrency=1)
+        pipeline = AdvicePipeline(None, self.outbound, max_workers=4, per_business=4, gateway=gateway)
+        self.run_jobs(pipeline, 3)
+        self.assertEqual(openai.max_in_flight, 1)
+        self.assertEqual(len(openai.requests), 3)
+
+    def test_per_business_concurrency_cap(self):
+        openai = FakeOpenAIClient(latency=0.05)
+        pipeline = AdvicePipeline(lambda: openai, self.outbound, max_workers=8, per_business=2)
+        self.run_jobs(pipeline, 6)
+        self.assertEqual(openai.max_in_flight, 2)
+        self.assertEqual(pipeline.completed, 6)
+
+    def test_failure_sends_fallback(self):
+        openai = FakeOpenAIClient()
+        openai.errors.append(RuntimeError('boom'))
+        pipeline = AdvicePipeline(lambda: openai, self.outbound)
+        self.run_jobs(pipeline, 1)
+        self.assertEqual(self.twilio.messages_to('+15550000000'), [AdvicePipeline.fallback])
+
+    def test_segment_budget_trims_reply_and_keeps_footer(self):
+        openai = FakeOpenAIClient(reply="Turn off the water at the main valve under the sink. " * 20)
+        pipeline = AdvicePipeline(lambda: openai, self.outbound, message_segments=1, segment_budget=3)
+        self.run_jobs(pipeline, 1)
+        segments = self.twilio.messages_to('+15550000000')
+        self.assertLessEqual(sum(segment_count(s) for s in segments), 3)
+        self.assertTrue(segments[-1].endswith('Type STOP to end.'))
+        self.assertTrue(all(s.rstrip().endswith('.') for s in segments))
+
+    def test_messages_never_end_mid_word(self):
+        twilio = FakeTwilioClient()
+        pipeline = AdvicePipeline(None, OutboundQueue(twilio, workers=0))
+        for to, reply in (('+15550000001', FakeOpenAIClient().reply),
+                          ('+15550000002', "Coupez l'eau au robinet principal et ouvrez un robinet 水. " * 12),
+                          ('+15550000003', "Wrap the pipe {with} a towel [then] call us " * 15)):
+            pipeline.deliver(to, '+15550000000', reply, footer='Type STOP to end.')
+            messages = twilio.messages_to(to)
+            self.assertGreater(len(messages), 1)
+            self.assertTrue(all(segment_count(m) <= 2 for m in messages))
+            # Every cut fell on whitespace, so rejoining with spaces restores the reply
+            self.assertEqual(' '.join(messages[:-1] + [messages[-1].split('\n\n')[0]]), ' '.join(reply.split()))
+
+    def test_ended_conversation_gets_no_more_texts(self):
+        twilio = FakeTwilioClient()
+        openai = FakeOpenAIClient(reply="Turn off the water at the main valve under the sink. " * 20)
+        # The customer texts STOP right after the first part of the answer arrives
+        pipeline = AdvicePipeline(lambda: openai, OutboundQueue(twilio, workers=0),
+                                  is_active=lambda number: not twilio.messages_to(number))
+        done = threading.Event()
+        pipeline.submit('+15550000000', '+15550001111', '+15550000000', [], footer='Type STOP to end.',
+                        on_complete=lambda text: done.set())
+        self.assertTrue(done.wait(5))
+        self.assertEqual(len(twilio.messages_to('+15550001111')), 1)
+        pipeline.deliver('+15550001111', '+15550000000', "Cached answer.")
+        self.assertEqual(len(twilio.messages_to('+15550001111')), 1)
+        self.assertEqual(pipeline.completed, 0)
+
+    def test_reply_transliterated_to_gsm7(self):
+        openai = FakeOpenAIClient(reply="Don’t wait — shut the valve…")
+        pipeline = AdvicePipeline(lambda: openai, self.outbound)
+        self.run_jobs(pipeline, 1)
+        self.assertEqual(self.twilio.messages_to('+15550000000'),
+                         ["Don't wait - shut the valve...\n\nType STOP to end."])
@@ -0,0 +1,161 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from config import Config
+from main import create_app
+from services.container import Container
+from services import conversation
+from services.conversation import build_advice_messages, get_gpt_advice, record_advice, session_evicted
+from services.fake_openai import FakeOpenAIClient
+from services.openai_gateway import OpenAIGateway
+from services.fake_twilio import FakeTwilioClient
+from services.message_queue import OutboundQueue
+from services.wiring import build_container
+from utils.history import ConversationHistory
+from utils.session import Session
+from utils.state_store import EVICTED, EXPIRED
+
+class TestContainer(unittest.TestCase):
+    def test_builds_once_on_first_use(self):
+        container = Container()
+        calls = []
+        container.register('clock', lambda c: calls.append(1) or object())
+        container.register('user', lambda c: ('user', c.clock))
+        self.assertFalse(container.built('clock'))
+        self.assertIs(container.user[1], container.clock)
+        self.assertEqual(calls, [1])
+
+    def test_override_and_errors(self):
+        container = Container()
+        container.register('clock', lambda c: 'real')
+        container.override('clock', 'fake')
+        self.assertEqual(container.clock, 'fake')
+        container.register('loop', lambda c: c.loop)
+        with self.assertRaises(RuntimeError):
+            container.loop
+        with self.assertRaises(AttributeError):
+            container.missing
+
+class TestAppFactory(unittest.TestCase):
+    def setUp(self):
+        workdir = tempfile.mkdtemp()
+        env = mock.patch.dict(os.environ, {"TENANT_STORE": os.path.join(workdir, "tenants.json")})
+        env.start()
+        self.addCleanup(env.stop)
+        self.twilio = FakeTwilioClient()
+        self.outbound = OutboundQueue(self.twilio, workers=0)
+        self.services = build_container(outbound=self.outbound)
+        self.app = create_app(self.services)
+        self.client = self.app.test_client()
+
+    def test_creating_app_builds_no_services(self):
+        self.assertFalse(any(self.services.built(name) for name in ('tenants', 'customer_states', 'advice_pipeline')))
+        self.assertEqual(self.client.get('/').data.decode(), "Server is live!")
+        self.assertFalse(self.services.built('tenants'))
+
+    def test_creating_app_starts_no_threads_or_log_files(self):
+        workdir = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        self.addCleanup(os.chdir, cwd)
+        threads = threading.active_count()
+        create_app(build_container())
+        self.assertEqual(threading.active_count(), threads)
+        self.assertEqual(os.listdir(workdir), [])
+
+    def test_tenants_without_store_stay_in_memory(self):
+        workdir = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        self.addCleanup(os.chdir, cwd)
+        with mock.patch.dict(os.environ):
+            del os.environ["TENANT_STORE"]
+            tenants = build_container().tenants
+        self.assertEqual(tenants.default['business_name'], 'FlowRite Plumbing')
+        tenants.add('+12505550123', {'business_name': 'Fixit'})
+        self.assertIn('+12505550123', tenants)
+        self.assertEqual(os.listdir(workdir), [])
+
+    def test_missed_call_starts_conversation(self):
+        response = self.client.post('/handle-no-answer', data={
+            'To': '+17786535845', 'From': '+15551112222', 'CallSid': 'CA1', 'DialCallStatus': 'no-answer'})
+        self.assertEqual(response.mimetype, 'text/xml')
+        self.assertIn(b"couldn't reach our plumber", response.data)
+        self.assertEqual(self.services.customer_states.get('+15551112222')['stage'], 'waiting_for_name')
+        self.assertEqual(len(self.twilio.messages_to('+15551112222')), 1)
+
+    def test_admin_login_and_add_business(self):
+        self.assertEqual(self.client.get('/admin').status_code, 302)
+        with mock.patch.object(Config, 'ADMIN_PASSWORD', 'letmein'):
+            self.assertEqual(self.client.post('/admin/login', data={'password': 'wrong'}).status_code, 200)
+            self.client.post('/admin/login', data={'password': 'letmein'})
+        self.assertEqual(self.client.get('/admin').status_code, 200)
+        self.client.post('/admin/add_business', data={
+            'twilio_number': '+12505550123', 'forward_to': '+12505550199',
+            'business_name': 'Fixit', 'business_type': 'handyman'})
+        report = self.client.get('/admin/stats.json').get_json()
+        self.assertEqual(set(report['businesses']), {'+17786535845', '+12505550123'})
+        self.assertEqual(report['businesses']['+12505550123']['business'], 'Fixit')
+        self.assertIn('advice_cache', report)
+        self.assertIn(b'Fixit', self.client.get('/admin').data)
+        response = self.client.post('/admin/add_business', data={'twilio_number': '12', 'business_name': 'Typo'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rate_limited_message_is_processed_on_retry(self):
+        class FlakyLimiter:
+            allowed = iter([False, True])
+            def is_allowed(self, key):
+                return next(self.allowed)
+        self.services.override('sms_limiter', FlakyLimiter())
+        form = {'To': '+17786535845', 'From': '+15551112222', 'Body': 'Sam', 'MessageSid': 'SM1'}
+        self.assertEqual(self.client.post('/sms', data=form).status_code, 429)
+        self.assertEqual(self.client.post('/sms', data=form).status_code, 200)
+        self.assertEqual(self.services.customer_states.get('+15551112222')['stage'], 'waiting_for_location')
+
+    def test_history_compacted_after_advice_outside_state_lock(self):
+        phone, states = '+15551112222', self.services.customer_states
+        calls = []
+
+        def probe():
+            lock = states.lock(phone)
+            calls.append(lock.acquire(timeout=1))
+            lock.release()
+
+        def summarizer(summary, turns, max_tokens, business=None):
+            # Another thread can still take the customer's lock while this runs
+            thread = threading.Thread(target=probe)
+            thread.start()
+            thread.join()
+            return "summary"
+
+        self.services.override('conversation_history', ConversationHistory(budget_tokens=100, summarizer=summarizer))
+        states[phone] = state = Session(stage='chatting', business_number='+17786535845')
+        for i in range(10):
+            build_advice_messages(self.services, f"Question {i} about the leak under the sink", state)
+        states[phone] = state
+        self.assertEqual(calls, [])
+        record_advice(self.services, phone)("Turn off the water.")
+        self.assertEqual(calls, [True])
+        self.assertEqual(states.get(phone)['history']['summary'], "summary")
+
+    def test_only_expired_intake_is_reported_as_abandoned(self):
+        self.services.override('lead_notifier', mock.Mock())
+        state = Session(stage='waiting_for_issue', name='Sam', business_number='+17786535845')
+        session_evicted(self.services, '+15551112222', state, EVICTED)
+        self.services.lead_notifier.notify.assert_not_called()
+        session_evicted(self.services, '+15551112222', state, EXPIRED)
+        self.services.lead_notifier.notify.assert_called_once()
+
+    def test_stalled_shared_advice_falls_back_to_own_completion(self):
+        openai = FakeOpenAIClient(reply="Turn off the water.")
+        self.services.override('openai_gateway', OpenAIGateway(lambda: openai))
+        tenant = self.services.tenants.default
+        state = Session(stage='chatting', issue='leak', business_number=tenant['number'])
+        # Another request claimed the question and never finishes
+        conversation.claim_cached_advice(self.services, "what now?", state, tenant)
+        with mock.patch.object(Config, 'OPENAI_API_KEY', 'sk-test'), \
+                mock.patch.object(conversation, 'SHARED_ADVICE_WAIT', 0.05):
+            self.assertEqual(get_gpt_advice(self.services, "what now?", state, tenant), "Turn off the water.")
+        self.assertEqual(len(openai.requests), 1)
@@ -1,6 +1,7 @@
 
 import unittest
-from utils.cache import Cache
+from utils.cache import Cache, cached
+import threading
 import time
 
 class TestCache(unittest.TestCase):
@@ -21,3 +22,74 @@ class TestCache(unittest.TestCase):
         self.cache.set('key2', 'value2')
         self.cache.set('key3', 'value3')
         self.assertIsNone(self.cache.get('key1'))
+
+class TestCacheBehaviour(unittest.TestCase):
+    def test_per_entry_ttl(self):
+        cache = Cache(ttl=60)
+        cache.set('short', 'value', ttl=0.05)
+        cache.set('long', 'value')
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertEqual(cache.get('long'), 'value')
+
+    def test_cached_decorator_honours_ttl(self):
+        calls = []
+
+        @cached(ttl=0.05, cache=Cache())
+        def lookup(x, scale=1):
+            calls.append(x)
+            return x * scale
+
+        self.assertEqual(lookup(2, scale=3), 6)
+        self.assertEqual(lookup(2, scale=3), 6)
+        self.assertEqual(len(calls), 1)
+        time.sleep(0.1)
+        lookup(2, scale=3)
+        self.assertEqual(len(calls), 2)
+        # Unhashable arguments still work
+        self.assertEqual(lookup([1], scale=2), [1, 1])
+
+    def test_sweep_removes_expired_entries(self):
+        cache = Cache(ttl=0.05)
+        for i in range(10):
+            cache.set(i, i)
+        time.sleep(0.1)
+        self.assertEqual(cache.sweep(), 10)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['expirations'], 10)
+
+    def test_max_bytes(self):
+        cache = Cache(max_size=1000, max_bytes=2000, shards=1)
+        for i in range(100):
+            cache.set(i, 'x' * 100)
+        self.assertLessEqual(cache.stats()['bytes'], 2000)
+        self.assertGreater(cache.stats()['evictions'], 0)
+        self.assertEqual(cache.get(99), 'x' * 100)
+
+    def test_concurrent_access(self):
+        cache = Cache(max_size=512, ttl=60)
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(5000):
+                    key = (n * 7 + i) % 1000
+                    if cache.get(key) is None:
+                        cache.set(key, key)
+                    elif i % 10 == 0:
+                        cache.delete(key)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(cache), 512)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 8 * 5000)
+        for key in range(1000):
+            value = cache.get(key)
+            self.assertIn(value, (None, key))
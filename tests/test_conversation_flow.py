@@ -0,0 +1,58 @@
+
+import unittest
+from utils.conversation_flow import ConversationFlow, Intercept, Stage, Turn
+
+TENANT = {'number': '+17786535845', 'business_name': 'FlowRite Plumbing', 'business_type': 'plumber'}
+
+class TestConversationFlow(unittest.TestCase):
+    def setUp(self):
+        self.effects = []
+        self.questions = []
+        self.flow = ConversationFlow(
+            stages=[
+                Stage('waiting_for_name', field='name', next='waiting_for_issue',
+                      validate=lambda text: (text, None) if text.isalpha() else (None, 'Letters please.'),
+                      reply='Hi {name}, describe your {service} issue.'),
+                Stage('waiting_for_issue', field='issue', next='chatting',
+                      reply='Our {pro} will call about {issue}.',
+                      effects=[lambda state, turn: self.effects.append(state['issue'])]),
+                Stage('chatting', handler=lambda state, message, turn: self.questions.append(message)),
+            ],
+            intercepts=[
+                Intercept(['STOP'], 'Bye from {business_name}, our {pro} will call.',
+                          effects=[lambda state, turn: self.effects.append('ended')]),
+            ],
+        )
+
+    def run_messages(self, messages, terms=None):
+        sent = []
+        state = {}
+        flow = self.flow.compile('plumber', terms or {'pro': 'plumber', 'service': 'plumbing'})
+        for message in messages:
+            flow.step(state, message, Turn('+15551112222', TENANT, sent.append))
+        return state, sent
+
+    def test_stages_validate_store_and_reply(self):
+        state, sent = self.run_messages(['Bob1', 'Bob', 'leak', 'what now?'])
+        self.assertEqual(sent, ['Letters please.', 'Hi Bob, describe your plumbing issue.', 'Our plumber will call about leak.'])
+        self.assertEqual(state, {'name': 'Bob', 'issue': 'leak', 'stage': 'chatting'})
+        self.assertEqual(self.effects, ['leak'])
+        self.assertEqual(self.questions, ['what now?'])
+
+    def test_intercept_runs_before_stage_handler(self):
+        state, sent = self.run_messages(['Bob', 'leak', ' stop '])
+        self.assertEqual(sent[-1], 'Bye from FlowRite Plumbing, our plumber will call.')
+        self.assertEqual(self.questions, [])
+        self.assertEqual(self.effects, ['leak', 'ended'])
+
+    def test_compiled_once_per_business_type(self):
+        first = self.flow.compile('electrician', {'pro': 'electrician', 'service': 'electrical'})
+        self.assertIs(self.flow.compile('electrician', {}), first)
+        self.assertEqual(first.stages['waiting_for_issue'].reply, 'Our electrician will call about {issue}.')
+
+    def test_unknown_transition_rejected(self):
+        with self.assertRaises(ValueError):
+            ConversationFlow([Stage('a', next='missing')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+
+import unittest
+import os
+import tempfile
+from utils.conversation_index import ConversationIndex, StoreConversationIndex
+from utils.state_store import MemoryStateStore, SQLiteStateStore
+
+class TestConversationIndex(unittest.TestCase):
+    def test_counts_follow_transitions(self):
+        index = ConversationIndex()
+        index.update('+1', 'biz-a', 'waiting_for_name')
+        index.update('+2', 'biz-a', 'waiting_for_name')
+        index.update('+3', 'biz-b', 'waiting_for_name')
+        index.update('+1', 'biz-a', 'chatting')
+        index.update('+1', 'biz-a', 'chatting')
+        self.assertEqual(index.stages('biz-a'), {'waiting_for_name': 1, 'chatting': 1})
+        index.remove('+1')
+        index.remove('+1')
+        self.assertEqual(index.snapshot(), {'biz-a': {'waiting_for_name': 1}, 'biz-b': {'waiting_for_name': 1}})
+        self.assertEqual(index.stages('biz-c'), {})
+
+    def test_rebuild_from_store(self):
+        index = ConversationIndex()
+        states = [('+1', {'stage': 'chatting', 'business_number': 'biz-a'}),
+                  ('+2', {'stage': 'chatting', 'business_number': 'biz-a'})]
+        index.rebuild(states, lambda state: state['business_number'])
+        self.assertEqual(index.stages('biz-a'), {'chatting': 2})
+
+    def test_store_evictions_update_index(self):
+        index = ConversationIndex()
+        store = MemoryStateStore(max_entries=1, on_evict=lambda phone, state, reason: index.remove(phone))
+        for phone in ('+1', '+2'):
+            store[phone] = {'stage': 'chatting'}
+            index.update(phone, 'biz-a', 'chatting')
+        self.assertEqual(index.stages('biz-a'), {'chatting': 1})
+
+    def test_counts_read_from_shared_store(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'states.db')
+            worker_a, worker_b = SQLiteStateStore(path), SQLiteStateStore(path)
+            worker_a['+1'] = {'stage': 'chatting', 'business_number': 'biz-a'}
+            worker_a.flush()
+            index = StoreConversationIndex(worker_b)
+            self.assertEqual(index.stages('biz-a'), {'chatting': 1})
+            del worker_a['+1']
+            worker_a.flush()
+            self.assertEqual(index.stages('biz-a'), {})
+            self.assertEqual(len(index), 0)
+            worker_a.close()
+            worker_b.close()
@@ -26,3 +26,13 @@ class TestEndpoints(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         data = json.loads(response.data)
         self.assertIn("error", data)
+
+    def test_health_endpoint(self):
+        response = self.app.get('/health')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data["status"], "healthy")
+
+    def test_import_does_not_create_openai_client(self):
+        import services.openai_service as openai_service
+        self.assertIsNone(openai_service._client)
@@ -0,0 +1,60 @@
+
+import unittest
+from services.fake_openai import FakeOpenAIClient
+from services.openai_gateway import OpenAIGateway
+from utils.history import ConversationHistory, count_tokens, gpt_summarizer
+
+class TestConversationHistory(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def summarizer(summary, turns, max_tokens, business=None):
+            self.calls.append(len(turns))
+            return (summary + " | " if summary else "") + "; ".join(t["content"][:10] for t in turns)
+
+        self.history = ConversationHistory(budget_tokens=200, summary_tokens=50, summarizer=summarizer)
+
+    def test_stores_user_and_assistant_turns(self):
+        state = {}
+        self.history.add_user(state, "My toilet won't stop running")
+        self.history.add_assistant(state, "Check the flapper valve first.")
+        roles = [m["role"] for m in self.history.messages(state)]
+        self.assertEqual(roles, ["user", "assistant"])
+
+    def test_prompt_stays_within_budget(self):
+        state = {}
+        for i in range(200):
+            self.history.add_user(state, f"Question {i} " + "about the leak " * 5)
+            self.history.add_assistant(state, f"Answer {i} " + "turn the valve " * 8)
+            self.assertLessEqual(state["history"]["tokens"], 200)
+        self.assertTrue(self.history.messages(state)[0]["content"].startswith("Summary"))
+        # Summary is updated in batches of evicted turns, not on every turn
+        self.assertLess(len(self.calls), 200)
+        self.assertEqual(state["history"]["tokens"], sum(count_tokens(m["content"]) for m in self.history.messages(state)[1:]))
+
+    def test_migrates_old_history_format(self):
+        state = {"conversation_history": [{"role": "user", "content": "hello"}]}
+        self.assertEqual(self.history.messages(state), [{"role": "user", "content": "hello"}])
+        self.assertNotIn("conversation_history", state)
+
+    def test_gpt_summarizer_goes_through_gateway(self):
+        openai = FakeOpenAIClient(reply="Customer has a leak.")
+        gateway = OpenAIGateway(lambda: openai)
+        history = ConversationHistory(budget_tokens=50, summarizer=gpt_summarizer(gateway))
+        state = {"business_number": "+15550000000"}
+        for i in range(10):
+            history.add_user(state, f"Question {i} about the leak under the sink")
+        self.assertEqual(state["history"]["summary"], "Customer has a leak.")
+        self.assertEqual(openai.requests[0]["model"], "gpt-3.5-turbo")
+
+    def test_fold_skips_history_changed_since_evictable(self):
+        state = {}
+        for i in range(20):
+            self.history.add_user(state, f"Question {i} " + "about the leak " * 5, compact=False)
+        turns = self.history.evictable(state)
+        self.assertTrue(turns)
+        summary = self.history.summarize(state, turns)
+        self.assertTrue(self.history.fold(state, turns, summary))
+        self.assertEqual(self.history.evictable(state), [])
+        self.assertFalse(self.history.fold(state, turns, summary))
+        self.assertEqual(state["history"]["summary"], summary)
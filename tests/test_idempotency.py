@@ -0,0 +1,89 @@
+
+import os
+import tempfile
+import time
+import unittest
+from flask import Flask
+from utils.idempotency import SeenSet, SQLiteSeenSet, create_seen_set, idempotent
+
+class TestSeenSet(unittest.TestCase):
+    def test_first_seen_once(self):
+        seen = SeenSet()
+        self.assertTrue(seen.first_seen('SM1'))
+        self.assertFalse(seen.first_seen('SM1'))
+        seen.discard('SM1')
+        self.assertTrue(seen.first_seen('SM1'))
+
+    def test_bounded_and_expiring(self):
+        seen = SeenSet(max_entries=3, ttl=0.05)
+        for i in range(10):
+            seen.first_seen(f'SM{i}')
+        self.assertEqual(len(seen), 3)
+        time.sleep(0.06)
+        self.assertTrue(seen.first_seen('SM9'))
+        self.assertEqual(len(seen), 1)
+
+class TestSQLiteSeenSet(unittest.TestCase):
+    def test_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'seen.db')
+            a, b = SQLiteSeenSet(path), SQLiteSeenSet(path)
+            self.assertTrue(a.first_seen('SM1'))
+            self.assertFalse(b.first_seen('SM1'))
+            b.discard('SM1')
+            self.assertTrue(a.first_seen('SM1'))
+
+    def test_expired_keys_can_be_seen_again(self):
+        with tempfile.TemporaryDirectory() as d:
+            seen = create_seen_set('sqlite:///' + os.path.join(d, 'seen.db'), ttl=0.05)
+            self.assertTrue(seen.first_seen('SM1'))
+            time.sleep(0.06)
+            self.assertTrue(seen.first_seen('SM1'))
+
+class TestIdempotentDecorator(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        app = Flask(__name__)
+        seen = SeenSet()
+
+        @app.route('/sms', methods=['POST'])
+        @idempotent(seen=seen)
+        def sms():
+            self.calls.append(1)
+            if len(self.calls) == 1 and self.fail_first:
+                raise RuntimeError('boom')
+            return 'ok'
+
+        @app.route('/voice', methods=['POST'])
+        @idempotent(seen=seen)
+        def voice():
+            self.calls.append(2)
+            return 'ok'
+
+        self.fail_first = False
+        self.client = app.test_client()
+
+    def test_retry_short_circuits(self):
+        self.assertEqual(self.client.post('/sms', data={'MessageSid': 'SM1'}).data, b'ok')
+        retry = self.client.post('/sms', data={'MessageSid': 'SM1'})
+        self.assertEqual(retry.status_code, 200)
+        self.assertIn(b'<Response></Response>', retry.data)
+        self.assertEqual(self.calls, [1])
+
+    def test_same_call_sid_on_different_routes(self):
+        self.client.post('/sms', data={'CallSid': 'CA1'})
+        self.client.post('/voice', data={'CallSid': 'CA1'})
+        self.assertEqual(self.calls, [1, 2])
+
+    def test_failed_attempt_can_be_retried(self):
+        self.fail_first = True
+        self.assertEqual(self.client.post('/sms', data={'MessageSid': 'SM1'}).status_code, 500)
+        self.assertEqual(self.client.post('/sms', data={'MessageSid': 'SM1'}).data, b'ok')
+
+    def test_requests_without_sid_pass_through(self):
+        self.client.post('/sms', data={})
+        self.client.post('/sms', data={})
+        self.assertEqual(self.calls, [1, 1])
+
+if __name__ == '__main__':
+    unittest.main()
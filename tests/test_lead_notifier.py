@@ -0,0 +1,78 @@
+
+import time
+import unittest
+from services.fake_twilio import FakeTwilioClient
+from services.lead_notifier import LeadNotifier, is_urgent
+from services.message_queue import OutboundQueue
+from utils.sms_encoding import segment_count
+
+OWNER = '+16044423722'
+BUSINESS = '+17786535845'
+
+def lead(i, issue='dripping tap'):
+    return f'Name: Customer {i}\nLocation: Burnaby\nPhone: +1555000{i:04d}\nIssue: {issue}'
+
+class TestLeadNotifier(unittest.TestCase):
+    def setUp(self):
+        self.twilio = FakeTwilioClient()
+        self.outbound = OutboundQueue(self.twilio, workers=0)
+
+    def test_urgent_keywords(self):
+        self.assertTrue(is_urgent('Pipe BURST in the basement'))
+        self.assertTrue(is_urgent('I smell gas'))
+        self.assertFalse(is_urgent('dripping tap'))
+        self.assertFalse(is_urgent('gasket is worn'))
+
+    def test_leads_coalesced_after_window(self):
+        notifier = LeadNotifier(self.outbound, window=0.05, max_batch=10)
+        for i in range(3):
+            notifier.notify(BUSINESS, OWNER, lead(i), service='plumbing')
+        self.assertEqual(self.twilio.sent, [])
+        time.sleep(0.2)
+        messages = self.twilio.messages_to(OWNER)
+        self.assertEqual(len(messages), 1)
+        self.assertTrue(messages[0].startswith('3 new plumbing requests:'))
+        self.assertIn('3) Name: Customer 2', messages[0])
+        notifier.shutdown()
+
+    def test_size_threshold_flushes_immediately(self):
+        notifier = LeadNotifier(self.outbound, window=60, max_batch=2)
+        notifier.notify(BUSINESS, OWNER, lead(1), service='plumbing')
+        notifier.notify(BUSINESS, '+16045550000', lead(2), service='plumbing')
+        self.assertEqual(self.twilio.sent, [])
+        notifier.notify(BUSINESS, OWNER, lead(3), service='plumbing')
+        self.assertEqual(len(self.twilio.messages_to(OWNER)), 1)
+        self.assertEqual(notifier.stats()['pending'], 1)
+        notifier.shutdown()
+
+    def test_urgent_skips_digest(self):
+        notifier = LeadNotifier(self.outbound, window=60)
+        notifier.notify(BUSINESS, OWNER, lead(1, issue='pipe burst, water everywhere'), service='plumbing')
+        self.assertEqual(self.twilio.messages_to(OWNER)[0].split('\n')[0], 'URGENT plumbing request:')
+        notifier.shutdown()
+
+    def test_packs_whole_leads_into_segment_sized_messages(self):
+        notifier = LeadNotifier(self.outbound, max_segments=2)
+        leads = [lead(i) for i in range(5)]
+        messages = notifier.pack('plumbing', leads)
+        self.assertGreater(len(messages), 1)
+        self.assertTrue(all(segment_count(m) <= 2 for m in messages))
+        self.assertEqual(sum(m.count('Name:') for m in messages), 5)
+
+    def test_segment_limit_holds_for_ucs2_and_extension_characters(self):
+        notifier = LeadNotifier(self.outbound)
+        for name in ('Zoë Đặng', 'Sam {Jr} [West] ~ €'):
+            leads = [f"Name: {name}\nLocation: Vancouver\nPhone: +1555000{i:04d}\nIssue: " + "water everywhere " * 4
+                     for i in range(8)]
+            messages = notifier.pack('plumbing', leads)
+            self.assertTrue(all(segment_count(m) <= 4 for m in messages))
+            self.assertEqual(sum(m.count('Name:') for m in messages), 8)
+
+    def test_pending_digests_flushed_on_queue_shutdown(self):
+        notifier = LeadNotifier(self.outbound, window=60)
+        notifier.notify(BUSINESS, OWNER, lead(1), service='plumbing')
+        self.outbound.shutdown()
+        self.assertEqual(self.twilio.messages_to(OWNER), ['New plumbing request:\n' + lead(1)])
+
+if __name__ == '__main__':
+    unittest.main()
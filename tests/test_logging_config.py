@@ -0,0 +1,51 @@
+
+import json
+import logging
+import os
+import tempfile
+import unittest
+from utils.logging_config import (PAYLOAD_LOGGER, JsonFormatter, SamplingFilter, redact,
+                                  set_correlation_id, setup_logging, stop_logging)
+
+class TestLoggingConfig(unittest.TestCase):
+    def test_redact_phone_numbers(self):
+        self.assertEqual(redact("From +15551112222"), "From ***2222")
+        self.assertEqual(redact({"To": "(778) 653-5845"}), {"To": "***5845"})
+        sid = "SM0123456789abcdef0123456789abcdef"
+        self.assertEqual(redact(sid), sid)
+
+    def test_json_formatter(self):
+        record = logging.LogRecord("app", logging.INFO, __file__, 1, "SMS from %s", ("+15551112222",), None)
+        record.stage = "chatting"
+        record.correlation_id = "SM123"
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["message"], "SMS from ***2222")
+        self.assertEqual(entry["stage"], "chatting")
+        self.assertEqual(entry["correlation_id"], "SM123")
+
+    def test_sampling_only_applies_to_payload_logger(self):
+        never = SamplingFilter(0)
+        payload = logging.LogRecord(PAYLOAD_LOGGER, logging.INFO, __file__, 1, "payload", (), None)
+        normal = logging.LogRecord("main", logging.INFO, __file__, 1, "hello", (), None)
+        self.assertFalse(never.filter(payload))
+        self.assertTrue(never.filter(normal))
+
+    def test_records_written_by_listener(self):
+        root = logging.getLogger()
+        saved = root.handlers[:], root.level
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                setup_logging(log_dir=tmp, payload_sample_rate=0, console=False)
+                set_correlation_id("CA42")
+                logging.getLogger("main").info("Handling SMS", extra={"from_number": "+15551112222"})
+                logging.getLogger(PAYLOAD_LOGGER).info("dropped by sampling")
+                stop_logging()
+            finally:
+                set_correlation_id(None)
+                root.handlers[:] = saved[0]
+                root.setLevel(saved[1])
+            with open(os.path.join(tmp, "app.log")) as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]["correlation_id"], "CA42")
+        self.assertEqual(lines[0]["from_number"], "***2222")
@@ -0,0 +1,63 @@
+
+import unittest
+from services.fake_twilio import FakeTwilioClient
+from services.message_queue import OutboundQueue
+
+class TestOutboundQueue(unittest.TestCase):
+    def test_messages_delivered_in_order_per_destination(self):
+        client = FakeTwilioClient()
+        outbound = OutboundQueue(client, workers=4)
+        for i in range(20):
+            outbound.send(to='+15550000001', body=f'a{i}', from_='+15559999999')
+            outbound.send(to='+15550000002', body=f'b{i}', from_='+15559999999')
+        self.assertTrue(outbound.drain(timeout=5))
+        self.assertEqual(client.messages_to('+15550000001'), [f'a{i}' for i in range(20)])
+        self.assertEqual(client.messages_to('+15550000002'), [f'b{i}' for i in range(20)])
+        outbound.shutdown()
+
+    def test_sent_count_is_exact_across_workers(self):
+        client = FakeTwilioClient()
+        outbound = OutboundQueue(client, workers=8)
+        for i in range(2000):
+            outbound.send(to=f'+1555000{i % 50:04d}', body='hi', from_='+15559999999')
+        self.assertTrue(outbound.drain(timeout=10))
+        self.assertEqual(outbound.sent, 2000)
+        outbound.shutdown()
+
+    def test_retries_transient_failures(self):
+        client = FakeTwilioClient(failures=2)
+        outbound = OutboundQueue(client, workers=1, max_retries=3, backoff=0.01)
+        outbound.send(to='+15550000001', body='hello', from_='+15559999999')
+        self.assertTrue(outbound.drain(timeout=5))
+        self.assertEqual(client.messages_to('+15550000001'), ['hello'])
+        self.assertEqual(outbound.retried, 2)
+        outbound.shutdown()
+
+    def test_gives_up_on_client_errors(self):
+        client = FakeTwilioClient(failures=1, failure_status=400)
+        outbound = OutboundQueue(client, workers=1, max_retries=3, backoff=0.01)
+        outbound.send(to='+15550000001', body='hello', from_='+15559999999')
+        self.assertTrue(outbound.drain(timeout=5))
+        self.assertEqual(outbound.failed, 1)
+        self.assertEqual(client.sent, [])
+        outbound.shutdown()
+
+    def test_webhook_does_not_block_on_send(self):
+        client = FakeTwilioClient(latency=0.5)
+        outbound = OutboundQueue(client, workers=2)
+        outbound.send(to='+15550000001', body='hello', from_='+15559999999')
+        self.assertEqual(client.sent, [])
+        self.assertTrue(outbound.drain(timeout=5))
+        self.assertEqual(len(client.sent), 1)
+        outbound.shutdown()
+
+    def test_client_chosen_by_sending_number(self):
+        default, tenant = FakeTwilioClient(), FakeTwilioClient()
+        clients = {'+15558888888': tenant}
+        outbound = OutboundQueue(default, workers=2, client_for=lambda from_: clients.get(from_, default))
+        outbound.send(to='+15550000001', body='hello', from_='+15558888888')
+        outbound.send(to='+15550000001', body='hi', from_='+15559999999')
+        self.assertTrue(outbound.drain(timeout=5))
+        self.assertEqual(tenant.messages_to('+15550000001'), ['hello'])
+        self.assertEqual(default.messages_to('+15550000001'), ['hi'])
+        outbound.shutdown()
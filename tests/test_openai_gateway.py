@@ -0,0 +1,110 @@
+
+import threading
+import time
+import unittest
+from services.fake_openai import FakeOpenAIClient
+from services.openai_gateway import GatewayTimeout, OpenAIGateway
+from utils.stats import Stats
+
+class APIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+class TestOpenAIGateway(unittest.TestCase):
+    def test_limits_concurrency_globally_and_per_business(self):
+        client = FakeOpenAIClient(latency=0.05)
+        gateway = OpenAIGateway(lambda: client, max_concurrency=3, per_business=1)
+        threads = [threading.Thread(target=gateway.complete, args=(f'biz-{i % 2}', 'gpt', []))
+                   for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # Two businesses with one slot each never reach the global limit of three
+        self.assertEqual(client.max_in_flight, 2)
+        self.assertEqual(gateway.stats()['in_flight'], 0)
+
+    def test_fair_share_across_businesses(self):
+        client = FakeOpenAIClient(latency=0.02)
+        gateway = OpenAIGateway(lambda: client, max_concurrency=1, per_business=1)
+        order = []
+        lock = threading.Lock()
+
+        def ask(business):
+            gateway.complete(business, 'gpt', [])
+            with lock:
+                order.append(business)
+
+        # A busy tenant queues five requests before a quiet one sends a single question
+        threads = [threading.Thread(target=ask, args=('busy',)) for _ in range(5)]
+        threads[0].start()
+        time.sleep(0.005)
+        for t in threads[1:]:
+            t.start()
+        time.sleep(0.005)
+        quiet = threading.Thread(target=ask, args=('quiet',))
+        quiet.start()
+        for t in threads + [quiet]:
+            t.join()
+        self.assertLessEqual(order.index('quiet'), 2)
+
+    def test_retries_rate_limits_then_falls_back(self):
+        client = FakeOpenAIClient()
+        client.errors = [APIError(429), APIError(503), APIError(500)]
+        gateway = OpenAIGateway(lambda: client, max_retries=2, backoff=0.001, fallback_model='gpt-small')
+        response = gateway.complete('biz', 'gpt-big', [])
+        self.assertEqual(response.model, 'gpt-small')
+        self.assertEqual([r['model'] for r in client.requests], ['gpt-big'] * 3 + ['gpt-small'])
+        self.assertEqual(gateway.retries, 3)
+        self.assertEqual(gateway.fallbacks, 1)
+
+    def test_client_errors_are_not_retried(self):
+        client = FakeOpenAIClient()
+        client.errors = [APIError(400)]
+        gateway = OpenAIGateway(lambda: client, backoff=0.001, fallback_model='gpt-small')
+        with self.assertRaises(APIError):
+            gateway.complete('biz', 'gpt', [])
+        self.assertEqual(len(client.requests), 1)
+
+    def test_deadline_while_waiting(self):
+        client = FakeOpenAIClient(latency=0.3)
+        gateway = OpenAIGateway(lambda: client, max_concurrency=1)
+        t = threading.Thread(target=gateway.complete, args=('a', 'gpt', []))
+        t.start()
+        time.sleep(0.05)
+        with self.assertRaises(GatewayTimeout):
+            gateway.complete('b', 'gpt', [], deadline=0.05)
+        t.join()
+        self.assertEqual(gateway.stats()['queued'], 0)
+        self.assertEqual(gateway.timeouts, 1)
+
+    def test_passes_per_attempt_timeout(self):
+        client = FakeOpenAIClient()
+        gateway = OpenAIGateway(lambda: client, request_timeout=5, deadline=2)
+        gateway.complete('biz', 'gpt', [])
+        self.assertLessEqual(client.requests[0]['timeout'], 2)
+
+    def test_stream_holds_slot_until_consumed(self):
+        client = FakeOpenAIClient(reply='one two three')
+        gateway = OpenAIGateway(lambda: client, max_concurrency=1)
+        stream = gateway.complete('biz', 'gpt', [], stream=True)
+        self.assertEqual(gateway.stats()['in_flight'], 1)
+        text = ''.join(chunk.choices[0].delta.content for chunk in stream)
+        self.assertEqual(text, 'one two three')
+        self.assertEqual(gateway.stats()['in_flight'], 0)
+        self.assertEqual(Stats().get_stats()['gauges']['openai.gateway_in_flight'], 0)
+
+    def test_stream_closed_or_dropped_before_iterating_releases_slot(self):
+        client = FakeOpenAIClient(reply='one two three')
+        gateway = OpenAIGateway(lambda: client, max_concurrency=1)
+        stream = gateway.complete('biz', 'gpt', [], stream=True)
+        stream.close()
+        stream.close()
+        self.assertEqual(gateway.stats()['in_flight'], 0)
+        self.assertEqual(gateway.stats()['active'], {})
+        gateway.complete('biz', 'gpt', [], stream=True)
+        self.assertEqual(gateway.stats()['in_flight'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
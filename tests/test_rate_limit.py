@@ -0,0 +1,46 @@
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from utils.rate_limit import RateLimiter, SQLiteRateLimiter
+
+class TestRateLimiter(unittest.TestCase):
+    def test_limits_each_key_separately(self):
+        limiter = RateLimiter(calls=3, per=60)
+        self.assertEqual([limiter.is_allowed('a') for _ in range(4)], [True, True, True, False])
+        self.assertTrue(limiter.is_allowed('b'))
+
+    def test_previous_window_is_weighted(self):
+        limiter = RateLimiter(calls=10, per=60)
+        with mock.patch('utils.rate_limit.time.time', return_value=600.0):
+            for _ in range(10):
+                limiter.is_allowed('a')
+        # Halfway through the next window half of the previous calls still count
+        with mock.patch('utils.rate_limit.time.time', return_value=690.0):
+            results = [limiter.is_allowed('a') for _ in range(6)]
+        self.assertEqual(results, [True] * 5 + [False])
+
+    def test_memory_is_bounded(self):
+        limiter = RateLimiter(calls=5, per=60, max_keys=100)
+        for i in range(1000):
+            limiter.is_allowed(f'+1555{i:07d}')
+        self.assertEqual(len(limiter), 100)
+
+    def test_idle_keys_are_evicted(self):
+        limiter = RateLimiter(calls=5, per=1)
+        limiter.is_allowed('idle')
+        with mock.patch('utils.rate_limit.time.time', return_value=time.time() + 5):
+            limiter.is_allowed('active')
+        self.assertEqual(list(limiter.tokens), ['active'])
+
+    def test_sqlite_limiter_shared_between_workers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'limits.db')
+            worker_a = SQLiteRateLimiter(path, calls=3, per=60)
+            worker_b = SQLiteRateLimiter(path, calls=3, per=60)
+            self.assertTrue(worker_a.is_allowed('a'))
+            self.assertTrue(worker_b.is_allowed('a'))
+            self.assertTrue(worker_a.is_allowed('a'))
+            self.assertFalse(worker_b.is_allowed('a'))
@@ -0,0 +1,13 @@
+import unittest
+from serve import worker_count
+
+class TestWorkerCount(unittest.TestCase):
+    def test_cpu_bound(self):
+        self.assertEqual(worker_count(2, memory=8 * 1024 ** 3), 5)
+
+    def test_capped_by_memory(self):
+        self.assertEqual(worker_count(8, memory=1024 ** 3, worker_memory_mb=256), 4)
+        self.assertEqual(worker_count(4, memory=100 * 1024 ** 2), 1)
+
+    def test_single_worker_without_shared_state(self):
+        self.assertEqual(worker_count(8, memory=None, shared_state=False), 1)
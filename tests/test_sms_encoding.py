@@ -0,0 +1,32 @@
+import unittest
+from utils.sms_encoding import fit_segments, is_gsm7, segment_count, to_gsm7
+
+class TestSmsEncoding(unittest.TestCase):
+    def test_to_gsm7_rewrites_typography(self):
+        text = to_gsm7("Don’t touch it — call us “ASAP”… \U0001F6A8 Set it to 68°F, cafê")
+        self.assertEqual(text, "Don't touch it - call us \"ASAP\"... Set it to 68F, cafe")
+        self.assertTrue(is_gsm7(text))
+
+    def test_other_scripts_stay_ucs2(self):
+        self.assertFalse(is_gsm7(to_gsm7("水漏れ")))
+
+    def test_segment_boundaries(self):
+        self.assertEqual(segment_count(""), 0)
+        self.assertEqual(segment_count("a" * 160), 1)
+        self.assertEqual(segment_count("a" * 161), 2)
+        self.assertEqual(segment_count("a" * 306), 2)
+        self.assertEqual(segment_count("a" * 307), 3)
+        # Extension characters take two septets
+        self.assertEqual(segment_count("€" * 80), 1)
+        self.assertEqual(segment_count("€" * 81), 2)
+        self.assertEqual(segment_count("水" * 70), 1)
+        self.assertEqual(segment_count("水" * 71), 2)
+
+    def test_fit_segments_cuts_at_sentence_end(self):
+        text = ("Turn off the water at the main valve under the sink. " * 8).strip()
+        fitted = fit_segments(text, 2)
+        self.assertLessEqual(segment_count(fitted), 2)
+        self.assertTrue(fitted.endswith("sink."))
+        self.assertTrue(text.startswith(fitted))
+        self.assertEqual(fit_segments("Short.", 1), "Short.")
+        self.assertEqual(fit_segments("Short.", 0), "")
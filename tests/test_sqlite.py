@@ -0,0 +1,42 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from utils.forksafe import PerProcess
+from utils.sqlite import ThreadConnections, sqlite_path
+
+class TestThreadConnections(unittest.TestCase):
+    def test_one_connection_per_thread(self):
+        connections = ThreadConnections(os.path.join(tempfile.mkdtemp(), 'x.db'), pragmas=("synchronous=NORMAL",))
+        mine = connections.get()
+        self.assertIs(connections.get(), mine)
+        other = []
+        t = threading.Thread(target=lambda: other.append(connections.get()))
+        t.start()
+        t.join()
+        self.assertIsNot(other[0], mine)
+
+    def test_reopened_after_fork(self):
+        connections = ThreadConnections(':memory:')
+        before = connections.get()
+        with mock.patch('utils.sqlite.os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(connections.get(), before)
+
+    def test_sqlite_path(self):
+        self.assertEqual(sqlite_path('sqlite:///tmp/x.db'), 'tmp/x.db')
+        self.assertIsNone(sqlite_path('memory'))
+        self.assertIsNone(sqlite_path(None))
+
+class TestPerProcess(unittest.TestCase):
+    def test_starts_once_per_process(self):
+        starts = []
+        once = PerProcess(starts.append)
+        self.assertFalse(once.started())
+        once.ensure()
+        once.ensure()
+        self.assertEqual(starts, [True])
+        with mock.patch('utils.forksafe.os.getpid', return_value=os.getpid() + 1):
+            self.assertFalse(once.started())
+            once.ensure()
+        self.assertEqual(starts, [True, False])
@@ -0,0 +1,209 @@
+
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from utils.session import Session
+from utils.state_store import EVICTED, EXPIRED, MemoryStateStore, StateStore, SQLiteStateStore, create_state_store
+import time
+
+class TestMemoryStateStore(unittest.TestCase):
+    def test_lru_eviction(self):
+        store = MemoryStateStore(max_entries=2)
+        store['+1'] = {'stage': 'waiting_for_name'}
+        store['+2'] = {'stage': 'waiting_for_name'}
+        store.get('+1')
+        store['+3'] = {'stage': 'waiting_for_name'}
+        self.assertIn('+1', store)
+        self.assertNotIn('+2', store)
+        self.assertEqual(len(store), 2)
+
+    def test_ttl_expiry(self):
+        store = MemoryStateStore(ttl=0.1)
+        store['+1'] = {'stage': 'chatting'}
+        time.sleep(0.15)
+        self.assertIsNone(store.get('+1'))
+
+    def test_reaper_uses_stage_ttls(self):
+        evicted = []
+        store = MemoryStateStore(ttl=60, stage_ttls={'waiting_for_name': 0.05}, reap_interval=0.02,
+                                 on_evict=lambda phone, state, reason: evicted.append((phone, state['stage'], reason)))
+        store['+1'] = {'stage': 'waiting_for_name'}
+        store['+2'] = {'stage': 'chatting'}
+        time.sleep(0.2)
+        self.assertEqual(evicted, [('+1', 'waiting_for_name', EXPIRED)])
+        self.assertEqual(len(store), 1)
+        store.close()
+
+    def test_resave_extends_expiry(self):
+        store = MemoryStateStore(ttl=10, reap_interval=0)
+        store['+1'] = {'stage': 'chatting'}
+        now = time.monotonic()
+        store['+1'] = {'stage': 'chatting', 'name': 'Sam'}
+        self.assertEqual(store.reap(now + 5), 0)
+        self.assertEqual(store.reap(now + 11), 1)
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.bytes, 0)
+
+    def test_deleted_entries_are_not_reported(self):
+        evicted = []
+        store = MemoryStateStore(ttl=1, reap_interval=0, on_evict=lambda phone, state, reason: evicted.append(phone))
+        store['+1'] = {'stage': 'chatting'}
+        del store['+1']
+        store.reap(time.monotonic() + 2)
+        self.assertEqual(evicted, [])
+
+    def test_memory_cap_evicts_lru(self):
+        evicted = []
+        store = MemoryStateStore(max_bytes=3000, reap_interval=0, on_evict=lambda phone, state, reason: evicted.append(phone))
+        for i in range(20):
+            store[f'+{i}'] = {'stage': 'chatting', 'issue': 'x' * 500}
+        self.assertLessEqual(store.bytes, 3000)
+        self.assertEqual(evicted, [f'+{i}' for i in range(len(evicted))])
+        self.assertIn('+19', store)
+
+    def test_eviction_reason_passed_to_hook(self):
+        evicted = []
+        store = MemoryStateStore(max_entries=1, ttl=1, reap_interval=0,
+                                 on_evict=lambda phone, state, reason: evicted.append((phone, reason)))
+        store['+1'] = {'stage': 'waiting_for_issue'}
+        store['+2'] = {'stage': 'waiting_for_issue'}
+        store.reap(time.monotonic() + 2)
+        self.assertEqual(evicted, [('+1', EVICTED), ('+2', EXPIRED)])
+
+    def test_states_are_stored_as_sessions(self):
+        store = MemoryStateStore(reap_interval=0)
+        store['+1'] = {'stage': 'chatting', 'custom': 1}
+        state = store['+1']
+        self.assertIsInstance(state, Session)
+        self.assertEqual(dict(state), {'stage': 'chatting', 'custom': 1})
+
+class TestStateStore(unittest.TestCase):
+    def test_incomplete_backend_fails_on_creation(self):
+        class NoItems(StateStore):
+            def get(self, phone, default=None):
+                return default
+
+            def set(self, phone, state):
+                pass
+
+            def delete(self, phone):
+                pass
+
+        with self.assertRaises(TypeError):
+            NoItems()
+
+class TestSession(unittest.TestCase):
+    def test_mapping_interface(self):
+        state = Session(stage='waiting_for_name', business_number='+1')
+        self.assertNotIn('name', state)
+        self.assertEqual(state.get('name', 'the customer'), 'the customer')
+        state['name'] = 'Sam'
+        state.setdefault('history', {'turns': []})
+        state['extra_field'] = True
+        self.assertEqual(state.pop('extra_field'), True)
+        self.assertEqual(state.to_dict(), {'stage': 'waiting_for_name', 'business_number': '+1', 'name': 'Sam',
+                                           'history': {'turns': []}})
+        with self.assertRaises(KeyError):
+            state['issue']
+        self.assertFalse(hasattr(state, '__dict__'))
+
+class TestSQLiteStateStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'states.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_state_shared_between_workers(self):
+        worker_a = SQLiteStateStore(self.path)
+        worker_b = SQLiteStateStore(self.path)
+        self.assertIsNone(worker_b.get('+15550000001'))
+        worker_a['+15550000001'] = {'stage': 'waiting_for_location', 'name': 'Sam'}
+        worker_a.flush()
+        self.assertEqual(worker_b.get('+15550000001')['name'], 'Sam')
+        del worker_b['+15550000001']
+        worker_b.flush()
+        self.assertNotIn('+15550000001', worker_a)
+        worker_a.close()
+        worker_b.close()
+
+    def test_no_stale_reads_across_threads_and_workers(self):
+        worker_a = SQLiteStateStore(self.path)
+        worker_b = SQLiteStateStore(self.path)
+        phone = '+15550000001'
+        errors = []
+
+        def read(expected, thread):
+            got = worker_b.get(phone)['step']
+            if got != expected:
+                errors.append(f'step {expected} thread {thread} got {got}')
+
+        for step in range(20):
+            worker_a[phone] = {'stage': 'chatting', 'step': step}
+            worker_a.flush()
+            threads = [threading.Thread(target=read, args=(step, i)) for i in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            # Commits from unrelated rows must not hide the next change either
+            worker_b[f'+1555100{step:04d}'] = {'stage': 'waiting_for_name'}
+            worker_b.flush()
+        self.assertEqual(errors, [])
+        worker_a.close()
+        worker_b.close()
+
+    def test_writes_are_batched_in_background(self):
+        store = SQLiteStateStore(self.path, flush_interval=0.02)
+        other = SQLiteStateStore(self.path)
+        for i in range(10):
+            store[f'+1555000{i:04d}'] = {'stage': 'waiting_for_name'}
+        # Pending writes are visible locally before they are committed
+        self.assertIn('+15550000009', store)
+        time.sleep(0.2)
+        self.assertEqual(len(other), 10)
+        store.close()
+        other.close()
+
+    def test_stage_counts_shared_and_expired(self):
+        evicted = []
+        worker_a = SQLiteStateStore(self.path, stage_ttls={'waiting_for_name': 0.05}, purge_interval=0,
+                                    on_evict=lambda phone, state, reason: evicted.append((phone, reason)))
+        worker_b = SQLiteStateStore(self.path, stage_ttls={'waiting_for_name': 0.05}, purge_interval=3600)
+        worker_a['+1'] = {'stage': 'chatting', 'business_number': 'biz-a'}
+        worker_a['+2'] = {'stage': 'waiting_for_name', 'business_number': 'biz-a'}
+        worker_b['+3'] = {'stage': 'chatting', 'business_number': 'biz-b'}
+        worker_b.flush()
+        counts = {'biz-a': {'chatting': 1, 'waiting_for_name': 1}, 'biz-b': {'chatting': 1}}
+        self.assertEqual(worker_a.stage_counts(), counts)
+        self.assertEqual(worker_b.stage_counts('biz-b'), {'biz-b': {'chatting': 1}})
+        time.sleep(0.1)
+        self.assertEqual(worker_b.stage_counts('biz-a'), {'biz-a': {'chatting': 1}})
+        self.assertIsNone(worker_b.get('+2'))
+        worker_a.flush()
+        self.assertEqual(evicted, [('+2', EXPIRED)])
+        worker_a.close()
+        worker_b.close()
+
+    def test_old_files_are_migrated(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE customer_states (phone TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)")
+        conn.execute("INSERT INTO customer_states VALUES (?, ?, ?)",
+                     ('+1', '{"stage": "chatting", "business_number": "biz-a"}', time.time()))
+        conn.commit()
+        conn.close()
+        store = SQLiteStateStore(self.path)
+        self.assertEqual(store.get('+1')['stage'], 'chatting')
+        self.assertEqual(store.stage_counts(), {'biz-a': {'chatting': 1}})
+        store.close()
+
+    def test_create_state_store(self):
+        self.assertIsInstance(create_state_store('memory'), MemoryStateStore)
+        store = create_state_store(f'sqlite:///{self.path}')
+        self.assertIsInstance(store, SQLiteStateStore)
+        store.close()
+        with self.assertRaises(ValueError):
+            create_state_store('redis://localhost')
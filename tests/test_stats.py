@@ -0,0 +1,40 @@
+
+import unittest
+from utils.stats import LatencyHistogram, Stats
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        h = LatencyHistogram()
+        for _ in range(90):
+            h.observe(0.004)
+        for _ in range(10):
+            h.observe(0.4)
+        self.assertLessEqual(h.percentile(50), 0.005)
+        self.assertGreater(h.percentile(95), 0.25)
+        self.assertLessEqual(h.percentile(99), 0.4)
+        self.assertEqual(h.summary()["count"], 100)
+
+    def test_empty(self):
+        self.assertEqual(LatencyHistogram().percentile(99), 0.0)
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        Stats().reset()
+
+    def test_timer_and_metrics(self):
+        stats = Stats()
+        with stats.timer("twilio.messages.create"):
+            pass
+        stats.record_call("POST /sms")
+        text = stats.render_metrics()
+        self.assertIn('app_calls_total{endpoint="POST /sms"} 1', text)
+        self.assertIn('app_latency_seconds_count{name="twilio.messages.create"} 1', text)
+        self.assertIn('le="+Inf"', text)
+        self.assertEqual(stats.get_stats()["latency"]["twilio.messages.create"]["count"], 1)
+
+    def test_counters(self):
+        stats = Stats()
+        stats.increment("sms.segments", 3)
+        stats.increment("sms.segments")
+        self.assertEqual(stats.get_stats()["counters"]["sms.segments"], 4)
+        self.assertIn('app_counter_total{name="sms.segments"} 4', stats.render_metrics())
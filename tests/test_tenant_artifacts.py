@@ -0,0 +1,29 @@
+import unittest
+from utils.tenant_artifacts import TenantArtifacts
+from utils.tenants import TenantRegistry
+
+class TestTenantArtifacts(unittest.TestCase):
+    def setUp(self):
+        self.registry = TenantRegistry()
+        self.registry.load({'+17786535845': {'business_name': 'FlowRite', 'forward_to': '778-700-3025'}})
+        self.artifacts = TenantArtifacts(self.registry, lambda tenant: f"Thanks for calling {tenant['business_name']}")
+
+    def test_built_once_per_tenant(self):
+        tenant = self.registry.resolve('+17786535845')
+        self.assertEqual(self.artifacts.get(tenant), 'Thanks for calling FlowRite')
+        self.artifacts.get(tenant)
+        self.assertEqual(self.artifacts.builds, 1)
+        self.assertEqual(len(self.artifacts), 1)
+
+    def test_registry_change_invalidates(self):
+        self.artifacts.get(self.registry.resolve('+17786535845'))
+        self.registry.add('+17786535845', {'business_name': 'FlowRite Plumbing', 'forward_to': '778-700-3025'})
+        self.assertEqual(len(self.artifacts), 0)
+        self.assertEqual(self.artifacts.get(self.registry.resolve('+17786535845')), 'Thanks for calling FlowRite Plumbing')
+
+    def test_stale_build_is_not_served(self):
+        # An entry stored for an older tenant object (a build racing a swap) is rebuilt
+        old = self.registry.resolve('+17786535845')
+        self.registry.add('+17786535845', {'business_name': 'Renamed', 'forward_to': '778-700-3025'})
+        self.artifacts.get(old)
+        self.assertEqual(self.artifacts.get(self.registry.resolve('+17786535845')), 'Thanks for calling Renamed')
@@ -0,0 +1,143 @@
+
+import os
+import tempfile
+import threading
+import unittest
+from utils.tenant_store import JSONTenantStore, SQLiteTenantStore, create_tenant_store
+from utils.tenants import TenantRegistry, normalize_e164
+
+class TestNormalize(unittest.TestCase):
+    def test_formats(self):
+        self.assertEqual(normalize_e164('(778) 653-5845'), '+17786535845')
+        self.assertEqual(normalize_e164('17786535845'), '+17786535845')
+        self.assertEqual(normalize_e164('+44 20 7946 0958'), '+442079460958')
+        self.assertIsNone(normalize_e164(''))
+        self.assertIsNone(normalize_e164(None))
+
+class TestTenantRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = TenantRegistry()
+        self.registry.load({
+            '+17786535845': {'business_name': 'FlowRite', 'forward_to': '778-700-3025'},
+            '6045550100': {'business_name': 'Sparky', 'business_type': 'electrician', 'forward_to': '6045550199'},
+        })
+
+    def test_resolve_normalizes_once_at_load(self):
+        tenant = self.registry.resolve('+16045550100')
+        self.assertEqual(tenant['business_name'], 'Sparky')
+        self.assertEqual(tenant['forward_to'], '+16045550199')
+        self.assertIs(self.registry.resolve('(604) 555-0100'), tenant)
+        self.assertEqual(self.registry.resolve('+17786535845')['business_type'], 'plumber')
+
+    def test_unknown_number_falls_back_to_default(self):
+        self.assertIsNone(self.registry.resolve('+15550000000'))
+        self.assertIsNone(self.registry.resolve(None))
+        self.assertEqual(self.registry.resolve_or_default('+15550000000')['business_name'], 'FlowRite')
+
+    def test_explicit_default_number(self):
+        registry = TenantRegistry(default_number='(604) 555-0100')
+        registry.load({'+17786535845': {}, '+16045550100': {'business_name': 'Sparky'}})
+        self.assertEqual(registry.default['business_name'], 'Sparky')
+
+    def test_invalid_numbers_rejected(self):
+        for number in (None, '', 'abc', '12', '+0123456789'):
+            with self.assertRaises(ValueError):
+                self.registry.add(number, {'business_name': 'Bad'})
+        with self.assertRaises(ValueError):
+            self.registry.add('2505550123', {'forward_to': '555'})
+        self.assertEqual(len(self.registry), 2)
+
+    def test_tenants_are_read_only(self):
+        with self.assertRaises(TypeError):
+            self.registry.resolve('+17786535845')['forward_to'] = '+15550000000'
+
+    def test_add_swaps_snapshot(self):
+        before = self.registry.snapshot()
+        version = self.registry.version
+        changes = []
+        self.registry.on_change(lambda registry: changes.append(len(registry)))
+        self.registry.add('2505550123', {'business_name': 'Fixit', 'business_type': 'handyman'})
+        self.assertIn('+12505550123', self.registry)
+        self.assertNotIn('+12505550123', before)
+        self.assertEqual(self.registry.version, version + 1)
+        self.assertEqual(changes, [3])
+
+    def test_concurrent_adds_are_not_lost(self):
+        def add(i):
+            self.registry.add(f'+1250555{i:04d}', {'business_name': f'biz-{i}'})
+        threads = [threading.Thread(target=add, args=(i,)) for i in range(50)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.registry), 52)
+
+class TenantStoreTests:
+    def make_store(self, path):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.store = self.make_store(self.dir.name)
+
+    def test_put_bumps_version(self):
+        before = self.store.version()
+        self.store.put('+17786535845', {'business_name': 'FlowRite'})
+        self.assertNotEqual(self.store.version(), before)
+        version, businesses = self.store.load()
+        self.assertEqual(version, self.store.version())
+        self.assertEqual(businesses, {'+17786535845': {'business_name': 'FlowRite'}})
+
+    def test_other_worker_sees_change_after_poll(self):
+        self.store.put('+17786535845', {'business_name': 'FlowRite'})
+        worker_a = TenantRegistry(poll_interval=60)
+        worker_a.attach(self.store, defaults={'twilio_token': 'secret'})
+        worker_b = TenantRegistry(poll_interval=0)
+        worker_b.attach(self.make_store(self.dir.name))
+
+        worker_a.add('6045550100', {'business_name': 'Sparky', 'forward_to': '6045550199'})
+        self.assertEqual(worker_a.resolve('+16045550100')['twilio_token'], 'secret')
+        self.assertTrue(worker_b.refresh())
+        self.assertEqual(worker_b.resolve('+16045550100')['forward_to'], '+16045550199')
+        self.assertFalse(worker_b.refresh())
+
+        # Credentials are merged in memory only
+        self.assertNotIn('twilio_token', self.store.load()[1]['+16045550100'])
+
+    def test_default_survives_adding_a_lower_number(self):
+        self.store.put('+17786535845', {'business_name': 'FlowRite'})
+        registry = TenantRegistry()
+        registry.attach(self.store)
+        registry.add('+12045550100', {'business_name': 'Early'})
+        self.assertEqual(registry.default['business_name'], 'FlowRite')
+
+    def test_refresh_is_throttled(self):
+        registry = TenantRegistry(poll_interval=60)
+        registry.attach(self.store)
+        self.make_store(self.dir.name).put('+17786535845', {'business_name': 'FlowRite'})
+        self.assertFalse(registry.refresh())
+        self.assertTrue(registry.refresh(force=True))
+        self.assertEqual(len(registry), 1)
+
+class TestJSONTenantStore(TenantStoreTests, unittest.TestCase):
+    def make_store(self, path):
+        return JSONTenantStore(os.path.join(path, 'tenants.json'))
+
+    def test_missing_file_is_empty(self):
+        self.assertEqual(self.store.load(), (None, {}))
+
+class TestSQLiteTenantStore(TenantStoreTests, unittest.TestCase):
+    def make_store(self, path):
+        return SQLiteTenantStore(os.path.join(path, 'tenants.db'))
+
+class TestCreateTenantStore(unittest.TestCase):
+    def test_urls(self):
+        with tempfile.TemporaryDirectory() as d:
+            self.assertIsInstance(create_tenant_store(os.path.join(d, 't.json')), JSONTenantStore)
+            self.assertIsInstance(create_tenant_store('sqlite:///' + os.path.join(d, 't.db')), SQLiteTenantStore)
+        with self.assertRaises(ValueError):
+            create_tenant_store('redis://localhost')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+
+import threading
+import unittest
+from services.twilio_service import TwilioClientPool
+
+class TestTwilioClientPool(unittest.TestCase):
+    def test_one_client_per_account(self):
+        pool = TwilioClientPool(pool_maxsize=8, timeout=5)
+        a = pool.get('AC1', 'token-1')
+        self.assertIs(pool.get('AC1', 'token-1'), a)
+        self.assertIsNot(pool.get('AC2', 'token-2'), a)
+        self.assertEqual(len(pool), 2)
+
+    def test_clients_share_a_tuned_keep_alive_session(self):
+        pool = TwilioClientPool(pool_maxsize=8, timeout=5)
+        http_client = pool.get('AC1', 'token-1').http_client
+        self.assertIsNotNone(http_client.session)
+        self.assertEqual(http_client.timeout, 5)
+        self.assertEqual(http_client.session.get_adapter('https://api.twilio.com')._pool_maxsize, 8)
+
+    def test_concurrent_get_builds_one_client(self):
+        pool = TwilioClientPool()
+        seen = []
+        threads = [threading.Thread(target=lambda: seen.append(pool.get('AC1', 'token-1'))) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len({id(c) for c in seen}), 1)
+
+if __name__ == '__main__':
+    unittest.main()
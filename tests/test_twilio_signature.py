@@ -0,0 +1,72 @@
+
+import unittest
+from flask import Flask
+from twilio.request_validator import RequestValidator
+from utils.twilio_signature import FastRequestValidator, SignatureVerifier, verify_signature
+
+TOKENS = {'+17786535845': 'token-a', '+16045550100': 'token-b'}
+
+class TestSignatureVerifier(unittest.TestCase):
+    def make_client(self, required=True, base_url=None):
+        self.handled = []
+        app = Flask(__name__)
+        verifier = SignatureVerifier(lambda number: TOKENS.get(number, 'token-a'), required=required, base_url=base_url)
+        app.before_request(verify_signature(verifier, ('sms',)))
+
+        @app.route('/sms', methods=['POST'])
+        def sms():
+            self.handled.append(1)
+            return 'ok'
+
+        @app.route('/', methods=['GET'])
+        def home():
+            return 'home'
+        return app.test_client(), verifier
+
+    def post(self, client, form, token=None, url='http://localhost/sms', headers=None):
+        headers = dict(headers or {})
+        if token:
+            headers['X-Twilio-Signature'] = RequestValidator(token).compute_signature(url, form)
+        return client.post('/sms', data=form, headers=headers)
+
+    def test_valid_signature_per_tenant(self):
+        client, verifier = self.make_client()
+        form = {'To': '+16045550100', 'From': '+15551112222', 'Body': 'hi'}
+        self.assertEqual(self.post(client, form, token='token-b').status_code, 200)
+        self.assertEqual(self.post(client, form, token='token-a').status_code, 403)
+        self.assertEqual(self.handled, [1])
+        self.assertIs(verifier.validator('token-b'), verifier.validator('token-b'))
+
+    def test_missing_or_tampered_signature(self):
+        client, _ = self.make_client()
+        form = {'To': '+17786535845', 'Body': 'hi'}
+        self.assertEqual(self.post(client, form).status_code, 403)
+        headers = {'X-Twilio-Signature': RequestValidator('token-a').compute_signature('http://localhost/sms', form)}
+        self.assertEqual(client.post('/sms', data={**form, 'Body': 'changed'}, headers=headers).status_code, 403)
+        self.assertEqual(self.handled, [])
+        self.assertEqual(client.get('/').status_code, 200)
+
+    def test_public_url_behind_proxy(self):
+        client, _ = self.make_client()
+        form = {'To': '+17786535845'}
+        response = self.post(client, form, token='token-a', url='https://localhost/sms',
+                             headers={'X-Forwarded-Proto': 'https'})
+        self.assertEqual(response.status_code, 200)
+        client, _ = self.make_client(base_url='https://example.com/')
+        response = self.post(client, form, token='token-a', url='https://example.com/sms')
+        self.assertEqual(response.status_code, 200)
+
+    def test_unsigned_allowed_when_not_required(self):
+        client, _ = self.make_client(required=False)
+        self.assertEqual(self.post(client, {'To': '+17786535845'}).status_code, 200)
+
+    def test_fast_validator_matches_stock(self):
+        params = {'To': '+17786535845', 'Body': 'hi'}
+        for url in ('https://example.com/sms', 'https://example.com:443/sms'):
+            signature = RequestValidator('t').compute_signature(url, params)
+            for check in ('https://example.com/sms', 'https://example.com:443/sms'):
+                self.assertEqual(FastRequestValidator('t').validate(check, params, signature),
+                                 RequestValidator('t').validate(check, params, signature))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+from utils.cache import Cache
+
+STOPWORDS = frozenset("""
+a an and are as at be but can could do does for from have help hi hello how i i'm im is it
+it's its just me my of on or our please so some that the there this to what whats with you your
+""".split())
+
+_word = re.compile(r"[a-z0-9']+")
+
+
+def normalize(text):
+    """Reduce a question to its sorted content words so trivial rephrasings share a key."""
+    words = {w.strip("'") for w in _word.findall((text or "").lower())}
+    words = {w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+             for w in words if w and w not in STOPWORDS}
+    return " ".join(sorted(words))
+
+
+def parse_ttls(spec):
+    """Parse "plumber=3600,hvac=21600" into {business_type: seconds}."""
+    ttls = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        business_type, sep, seconds = item.partition("=")
+        if not sep:
+            raise ValueError(f"Expected business_type=seconds, got {item.strip()!r}")
+        ttls[business_type.strip()] = int(seconds)
+    return ttls
+
+
+class AdviceCache:
+    """Caches GPT advice keyed on business type, stage, issue and question.
+
+    Only context-free questions (the first one of a conversation) should be
+    cached. Concurrent identical questions share one in-flight completion:
+    the first caller to `claim()` a key becomes the leader and must call
+    `complete()`; everyone else gets the leader's future.
+    """
+
+    def __init__(self, default_ttl=6 * 3600, ttls=None, max_size=5000):
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.miss_seconds = 0.0
+        self._cache = Cache(max_size=max_size, ttl=default_ttl)
+        self._inflight = {}
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def key(self, business_type, stage, issue, question):
+        raw = f"{business_type}|{stage}|{normalize(issue)}|{normalize(question)}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def claim(self, business_type, stage, issue, question):
+        """Return (key, future, leader)."""
+        key = self.key(business_type, stage, issue, question)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self.hits += 1
+                future = Future()
+                future.set_result(cached)
+                return key, future, False
+            future = self._inflight.get(key)
+            if future is not None:
+                self.shared += 1
+                return key, future, False
+            self.misses += 1
+            future = Future()
+            self._inflight[key] = future
+            self._started[key] = (business_type, time.monotonic())
+        return key, future, True
+
+    def complete(self, key, text):
+        """Leader callback: store the answer (None on failure) and wake any waiters."""
+        with self._lock:
+            future = self._inflight.pop(key, None)
+            business_type, started = self._started.pop(key, (None, time.monotonic()))
+            if text:
+                self.miss_seconds += time.monotonic() - started
+                self._cache.set(key, text, ttl=self.ttls.get(business_type, self.default_ttl))
+        if future is not None:
+            future.set_result(text)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared + self.misses
+            avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "shared_in_flight": self.shared,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.shared) / lookups, 3) if lookups else 0.0,
+                "avg_completion_seconds": round(avg_miss, 3),
+                "estimated_seconds_saved": round((self.hits + self.shared) * avg_miss, 1),
+                "in_flight": len(self._inflight),
+            }
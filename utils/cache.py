@@ -1,42 +1,166 @@
 
 from functools import wraps
+import sys
+import threading
 import time
 from collections import OrderedDict
 
+_MISSING = object()
+
+
+def _sizeof(key, value):
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+class _Shard:
+    __slots__ = ("lock", "entries", "bytes", "hits", "misses", "evictions", "expirations")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (value, expires_at, size)
+        self.bytes = 0
+        # Counters live on the shard so they are updated under the lock we already hold
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
 class Cache:
-    def __init__(self, max_size=1000, ttl=300):  # 5 minutes TTL
+    """Thread-safe LRU cache with per-entry TTL.
+
+    Keys are spread over independently locked shards, each an LRU of at most
+    max_size / shards entries (small caches use a single shard so LRU order is
+    exact). Expired entries are dropped when read and by a sweep of one shard
+    every `sweep_interval` seconds, piggybacked on writes.
+    """
+
+    def __init__(self, max_size=1000, ttl=300, max_bytes=None, shards=None, sweep_interval=60):  # 5 minutes TTL
         self.max_size = max_size
         self.ttl = ttl
-        self.cache = OrderedDict()
-        
-    def get(self, key):
-        if key in self.cache:
-            value, timestamp = self.cache[key]
-            if time.time() - timestamp <= self.ttl:
-                self.cache.move_to_end(key)
-                return value
-            else:
-                del self.cache[key]
-        return None
-        
-    def set(self, key, value):
-        self.cache[key] = (value, time.time())
-        self.cache.move_to_end(key)
-        if len(self.cache) > self.max_size:
-            self.cache.popitem(last=False)
+        self.max_bytes = max_bytes
+        if shards is None:
+            shards = min(16, max(1, max_size // 256))
+        self._shards = [_Shard() for _ in range(shards)]
+        self._shard_max_size = max(1, max_size // shards)
+        self._shard_max_bytes = max_bytes // shards if max_bytes else None
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._sweep_shard = 0
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def get(self, key, default=None):
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                shard.misses += 1
+                return default
+            if entry[1] <= time.monotonic():
+                del shard.entries[key]
+                shard.bytes -= entry[2]
+                shard.expirations += 1
+                shard.misses += 1
+                return default
+            shard.entries.move_to_end(key)
+            shard.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        now = time.monotonic()
+        size = _sizeof(key, value) if self.max_bytes else 0
+        shard = self._shard(key)
+        with shard.lock:
+            old = shard.entries.pop(key, None)
+            if old is not None:
+                shard.bytes -= old[2]
+            shard.entries[key] = (value, now + (self.ttl if ttl is None else ttl), size)
+            shard.bytes += size
+            while shard.entries and (
+                len(shard.entries) > self._shard_max_size
+                or (self._shard_max_bytes and shard.bytes > self._shard_max_bytes)
+            ):
+                _, (_, _, old_size) = shard.entries.popitem(last=False)
+                shard.bytes -= old_size
+                shard.evictions += 1
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self._sweep_one()
+
+    def delete(self, key):
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.pop(key, None)
+            if entry is not None:
+                shard.bytes -= entry[2]
+        return entry is not None
+
+    def _sweep_one(self):
+        index = self._sweep_shard
+        self._sweep_shard = (index + 1) % len(self._shards)
+        return self._sweep_shard_entries(self._shards[index])
+
+    def _sweep_shard_entries(self, shard):
+        now = time.monotonic()
+        with shard.lock:
+            expired = [key for key, entry in shard.entries.items() if entry[1] <= now]
+            for key in expired:
+                shard.bytes -= shard.entries.pop(key)[2]
+            shard.expirations += len(expired)
+        return len(expired)
+
+    def sweep(self):
+        """Drop every expired entry now; returns how many were removed."""
+        return sum(self._sweep_shard_entries(shard) for shard in self._shards)
+
+    def clear(self):
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.bytes = 0
+
+    def __len__(self):
+        return sum(len(shard.entries) for shard in self._shards)
+
+    def stats(self):
+        totals = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        for shard in self._shards:
+            with shard.lock:
+                for name in totals:
+                    totals[name] += getattr(shard, name)
+        lookups = totals["hits"] + totals["misses"]
+        return {
+            "size": len(self),
+            "bytes": sum(shard.bytes for shard in self._shards) if self.max_bytes else None,
+            **totals,
+            "hit_rate": round(totals["hits"] / lookups, 3) if lookups else 0.0,
+        }
 
 cache = Cache()
 
-def cached(ttl=None):
+
+def make_key(f, args, kwargs):
+    key = (f.__module__, f.__qualname__, args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        # Unhashable arguments (lists, dicts) fall back to their repr
+        key = (f.__module__, f.__qualname__, repr(args), repr(sorted(kwargs.items())))
+    return key
+
+
+def cached(ttl=None, cache=cache):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            key = f"{f.__name__}:{str(args)}:{str(kwargs)}"
-            result = cache.get(key)
-            if result is not None:
+            key = make_key(f, args, kwargs)
+            result = cache.get(key, _MISSING)
+            if result is not _MISSING:
                 return result
             result = f(*args, **kwargs)
-            cache.set(key, result)
+            cache.set(key, result, ttl=ttl)
             return result
         return decorated_function
     return decorator
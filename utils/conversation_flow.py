@@ -0,0 +1,134 @@
+
+import threading
+from collections import ChainMap
+
+
+class _KeepMissing(dict):
+    # Leaves per-conversation fields such as {name} in place for the second formatting pass
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def _precompile(template, terms):
+    return template.format_map(_KeepMissing(terms)) if template else template
+
+
+class Stage:
+    """One step of the SMS conversation.
+
+    The customer's message is checked by `validate(text)`, which returns
+    `(value, error_reply)`. A valid value is stored under `field` and the
+    conversation moves to `next`; then `reply` is texted back and each
+    `effects` callable runs as `effect(state, turn)`. A stage with a
+    `handler` (e.g. the GPT chat) takes the message itself, as
+    `handler(state, message, turn)`, and does its own replying.
+    Templates may use trade terms ({pro}, {service}), state fields and tenant fields.
+    """
+
+    __slots__ = ("name", "field", "validate", "next", "reply", "effects", "handler")
+
+    def __init__(self, name, field=None, validate=None, next=None, reply=None, effects=(), handler=None):
+        self.name = name
+        self.field = field
+        self.validate = validate
+        self.next = next
+        self.reply = reply
+        self.effects = tuple(effects)
+        self.handler = handler
+
+    def compile(self, terms):
+        return Stage(self.name, self.field, self.validate, self.next,
+                     _precompile(self.reply, terms), self.effects, self.handler)
+
+
+class Intercept:
+    """A keyword (STOP, HELP...) answered in any stage before the stage itself runs."""
+
+    __slots__ = ("keywords", "reply", "effects")
+
+    def __init__(self, keywords, reply, effects=()):
+        self.keywords = tuple(k.upper() for k in keywords)
+        self.reply = reply
+        self.effects = tuple(effects)
+
+    def compile(self, terms):
+        return Intercept(self.keywords, _precompile(self.reply, terms), self.effects)
+
+
+class Turn:
+    """What a stage needs to know about the message being handled."""
+
+    __slots__ = ("from_number", "tenant", "send")
+
+    def __init__(self, from_number, tenant, send):
+        self.from_number = from_number
+        self.tenant = tenant
+        self.send = send
+
+
+class CompiledFlow:
+    """A flow with one business type's wording baked in; dispatch is a dict lookup."""
+
+    def __init__(self, stages, intercepts, initial):
+        self.stages = stages
+        self.intercepts = intercepts
+        self.initial = initial
+
+    def step(self, state, message, turn):
+        intercept = self.intercepts.get(message.strip().upper())
+        if intercept is not None:
+            turn.send(intercept.reply.format_map(ChainMap(state, turn.tenant)))
+            for effect in intercept.effects:
+                effect(state, turn)
+            return
+
+        stage = self.stages[state.get("stage") or self.initial]
+        if stage.handler is not None:
+            stage.handler(state, message, turn)
+            return
+
+        value, error = stage.validate(message) if stage.validate else (message.strip(), None)
+        if error:
+            turn.send(error)
+            return
+        if stage.field:
+            state[stage.field] = value
+        if stage.next:
+            state["stage"] = stage.next
+        if stage.reply:
+            turn.send(stage.reply.format_map(ChainMap(state, turn.tenant)))
+        for effect in stage.effects:
+            effect(state, turn)
+
+
+class ConversationFlow:
+    """Declarative stage table, compiled once per business type on first use."""
+
+    def __init__(self, stages, intercepts=(), initial=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.intercepts = list(intercepts)
+        self.initial = initial or stages[0].name
+        self._compiled = {}
+        self._lock = threading.Lock()
+        for stage in stages:
+            if stage.next and stage.next not in self.stages:
+                raise ValueError(f"Stage {stage.name!r} moves to unknown stage {stage.next!r}")
+
+    def compile(self, key, terms):
+        flow = self._compiled.get(key)
+        if flow is None:
+            with self._lock:
+                flow = self._compiled.get(key)
+                if flow is None:
+                    intercepts = {}
+                    for intercept in self.intercepts:
+                        compiled = intercept.compile(terms)
+                        for keyword in compiled.keywords:
+                            intercepts[keyword] = compiled
+                    flow = CompiledFlow(
+                        {name: stage.compile(terms) for name, stage in self.stages.items()},
+                        intercepts,
+                        self.initial,
+                    )
+                    self._compiled[key] = flow
+        return flow
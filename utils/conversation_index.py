@@ -0,0 +1,89 @@
+
+import threading
+from collections import Counter, defaultdict
+
+class ConversationIndex:
+    """Open-conversation counters per business and stage.
+
+    Updated on every state transition so reads are O(businesses) instead of a
+    scan over all conversations. Counts are per process, which matches the
+    memory state store; with a shared store use StoreConversationIndex.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._members = {}  # phone -> (business, stage)
+        self._counts = defaultdict(Counter)  # business -> stage -> open conversations
+
+    def update(self, phone, business, stage):
+        with self._lock:
+            old = self._members.get(phone)
+            if old == (business, stage):
+                return
+            if old is not None:
+                self._decrement(*old)
+            self._members[phone] = (business, stage)
+            self._counts[business][stage] += 1
+
+    def remove(self, phone):
+        with self._lock:
+            old = self._members.pop(phone, None)
+            if old is not None:
+                self._decrement(*old)
+
+    def _decrement(self, business, stage):
+        counts = self._counts[business]
+        counts[stage] -= 1
+        if counts[stage] <= 0:
+            del counts[stage]
+            if not counts:
+                del self._counts[business]
+
+    def rebuild(self, items, business_of):
+        with self._lock:
+            self._members.clear()
+            self._counts.clear()
+        for phone, state in items:
+            self.update(phone, business_of(state), state.get("stage"))
+
+    def stages(self, business):
+        with self._lock:
+            return dict(self._counts.get(business, {}))
+
+    def snapshot(self):
+        with self._lock:
+            return {business: dict(counts) for business, counts in self._counts.items()}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._members)
+
+
+class StoreConversationIndex:
+    """The same counters read from a state store shared by every worker.
+
+    The store's indexed business and stage columns are the source of truth
+    (see SQLiteStateStore.stage_counts), so all workers agree and expired or
+    purged conversations drop out without any bookkeeping here.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def update(self, phone, business, stage):
+        pass
+
+    def remove(self, phone):
+        pass
+
+    def rebuild(self, items, business_of):
+        pass
+
+    def stages(self, business):
+        return self.store.stage_counts(business).get(business, {})
+
+    def snapshot(self):
+        return self.store.stage_counts()
+
+    def __len__(self):
+        return sum(sum(counts.values()) for counts in self.snapshot().values())
@@ -2,7 +2,6 @@ from flask import jsonify
 from functools import wraps
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def handle_errors(f):
@@ -0,0 +1,32 @@
+
+import os
+import threading
+
+
+class PerProcess:
+    """Calls `start(first)` once in every process that calls `ensure()`.
+
+    Threads and executors don't survive fork, so services start theirs
+    lazily through this in whichever process first needs them (a gunicorn
+    worker rather than the preloading master). `first` is True only in the
+    first process to start, e.g. to register an atexit hook once.
+    """
+
+    def __init__(self, start):
+        self._start = start
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            first = self._pid is None
+            self._start(first)
+            self._pid = os.getpid()
+
+    def started(self):
+        """True once `start` has run in this process."""
+        return self._pid == os.getpid()
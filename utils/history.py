@@ -0,0 +1,162 @@
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+_encoding = None
+
+
+def count_tokens(text):
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    # Roughly 4 characters per token for English text
+    return len(text) // 4 + 1
+
+
+def extractive_summarizer(summary, turns, max_tokens, business=None):
+    """Append one short line per evicted turn, dropping the oldest lines to fit."""
+    lines = summary.split("\n") if summary else []
+    for turn in turns:
+        speaker = "Customer" if turn["role"] == "user" else "Assistant"
+        content = " ".join(turn["content"].split())
+        if len(content) > 160:
+            content = content[:157] + "..."
+        lines.append(f"{speaker}: {content}")
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def gpt_summarizer(gateway, model="gpt-3.5-turbo"):
+    """Summarizer that asks a cheap model to fold evicted turns into the running summary.
+
+    Requests go through the OpenAI gateway under the conversation's business,
+    so they share its concurrency limits, retries and deadlines.
+    """
+    def summarize(summary, turns, max_tokens, business=None):
+        transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+        try:
+            response = gateway.complete(
+                business,
+                model,
+                [
+                    {"role": "system", "content": "Update the running summary of a customer service chat. "
+                                                  "Keep names, symptoms, safety issues and advice already given. Be terse."},
+                    {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"},
+                ],
+                max_tokens=max_tokens,
+                temperature=0,
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.warning("Summarization failed, falling back to extractive summary: %s", e)
+            return extractive_summarizer(summary, turns, max_tokens)
+    return summarize
+
+
+class ConversationHistory:
+    """Keeps a conversation's prompt history within a token budget.
+
+    History lives in state["history"] as plain JSON so any state store can
+    persist it. Recent turns are kept verbatim; once they exceed
+    `budget_tokens` the oldest turns are folded into a rolling summary, which
+    is only updated with the evicted turns rather than rebuilt every time.
+
+    Summarizing can mean a GPT request, so callers on a latency-sensitive path
+    append with `compact=False` and compact later through `evictable()`,
+    `summarize()` and `fold()`, holding their state lock only around the first
+    and last of those.
+    """
+
+    def __init__(self, budget_tokens=1200, summary_tokens=250, max_turn_tokens=400, summarizer=None):
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.max_turn_tokens = max_turn_tokens
+        self.summarizer = summarizer or extractive_summarizer
+
+    def _history(self, state):
+        history = state.get("history")
+        if history is None:
+            history = {"summary": "", "turns": [], "tokens": 0}
+            # Carry over conversations stored in the old format
+            for turn in state.pop("conversation_history", []):
+                self._append(history, turn["role"], turn["content"])
+            state["history"] = history
+        return history
+
+    def _append(self, history, role, content):
+        tokens = count_tokens(content)
+        if tokens > self.max_turn_tokens:
+            content = content[:self.max_turn_tokens * 4]
+            tokens = count_tokens(content)
+        history["turns"].append({"role": role, "content": content, "tokens": tokens})
+        history["tokens"] += tokens
+
+    def add_user(self, state, content, compact=True):
+        history = self._history(state)
+        self._append(history, "user", content)
+        if compact:
+            self.compact(state)
+
+    def add_assistant(self, state, content, compact=True):
+        history = self._history(state)
+        self._append(history, "assistant", content)
+        if compact:
+            self.compact(state)
+
+    def compact(self, state):
+        turns = self.evictable(state)
+        if turns:
+            self.fold(state, turns, self.summarize(state, turns))
+
+    def evictable(self, state):
+        """Oldest turns to fold into the summary, or [] while the history is within budget."""
+        history = self._history(state)
+        if history["tokens"] <= self.budget_tokens:
+            return []
+        # Evict down to 3/4 of the budget so summarization runs every few turns, not every turn
+        target = self.budget_tokens * 3 // 4
+        turns = history["turns"]
+        tokens = history["tokens"]
+        count = 0
+        while count < len(turns) - 1 and tokens > target:
+            tokens -= turns[count]["tokens"]
+            count += 1
+        return turns[:count]
+
+    def summarize(self, state, turns):
+        """The running summary extended with `turns`; may be slow (GPT), and only reads `state`."""
+        history = self._history(state)
+        return self.summarizer(history["summary"], turns, self.summary_tokens, business=state.get("business_number"))
+
+    def fold(self, state, turns, summary):
+        """Replace `turns` with `summary`; returns False if the history changed underneath since `evictable()`."""
+        history = self._history(state)
+        if history["turns"][:len(turns)] != turns:
+            return False
+        del history["turns"][:len(turns)]
+        history["tokens"] -= sum(turn["tokens"] for turn in turns)
+        history["summary"] = summary
+        return True
+
+    def messages(self, state):
+        history = self._history(state)
+        messages = []
+        if history["summary"]:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{history['summary']}"})
+        messages.extend({"role": t["role"], "content": t["content"]} for t in history["turns"])
+        return messages
+
+    def prompt_tokens(self, state):
+        history = self._history(state)
+        return history["tokens"] + count_tokens(history["summary"])
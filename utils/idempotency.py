@@ -0,0 +1,124 @@
+from flask import request, Response
+from functools import wraps
+import threading
+import time
+from collections import OrderedDict
+
+from utils.sqlite import ThreadConnections, sqlite_path
+from utils.stats import Stats
+
+class SeenSet:
+    """Bounded set of recently processed webhook IDs with a TTL.
+
+    `first_seen(key)` atomically records the key and reports whether it was
+    new. Keys are kept in insertion order, so expired ones and the overflow
+    beyond `max_entries` are dropped from the front in O(1) each.
+    """
+
+    def __init__(self, max_entries=100000, ttl=24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._seen = OrderedDict()  # key -> expires_at
+        self._lock = threading.Lock()
+
+    def first_seen(self, key):
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            if key in self._seen:
+                return False
+            self._seen[key] = now + self.ttl
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            self._seen.pop(key, None)
+
+    def _evict(self, now):
+        seen = self._seen
+        while seen:
+            key, expires_at = next(iter(seen.items()))
+            if len(seen) >= self.max_entries or expires_at <= now:
+                seen.popitem(last=False)
+            else:
+                break
+
+    def __len__(self):
+        return len(self._seen)
+
+class SQLiteSeenSet:
+    """Same contract backed by a SQLite file, so a retry landing on another worker is still caught."""
+
+    def __init__(self, path, ttl=24 * 3600, purge_interval=60):
+        self.path = path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._connect = ThreadConnections(path, pragmas=("synchronous=NORMAL",), isolation_level=None).get
+        self._last_purge = 0.0
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS seen_webhooks (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_expires ON seen_webhooks(expires_at)")
+
+    def first_seen(self, key):
+        now = time.time()
+        conn = self._connect()
+        if now - self._last_purge > self.purge_interval:
+            self._last_purge = now
+            conn.execute("DELETE FROM seen_webhooks WHERE expires_at <= ?", (now,))
+        # A single statement is atomic: only one worker's insert can win
+        cursor = conn.execute(
+            "INSERT INTO seen_webhooks (key, expires_at) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at WHERE seen_webhooks.expires_at <= ?",
+            (key, now + self.ttl, now)
+        )
+        return cursor.rowcount == 1
+
+    def discard(self, key):
+        self._connect().execute("DELETE FROM seen_webhooks WHERE key = ?", (key,))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM seen_webhooks").fetchone()[0]
+
+def create_seen_set(url=None, ttl=24 * 3600):
+    """In-process seen-set, or one shared by every worker for a sqlite:/// URL."""
+    path = sqlite_path(url)
+    if path:
+        return SQLiteSeenSet(path, ttl=ttl)
+    return SeenSet(ttl=ttl)
+
+seen_webhooks = SeenSet()
+
+def webhook_id():
+    sid = request.form.get("MessageSid") or request.form.get("CallSid")
+    # One call hits several voice webhooks with the same CallSid, so scope it by route
+    return f"{request.path}:{sid}" if sid else None
+
+def idempotent(f=None, seen=seen_webhooks):
+    """Answer Twilio retries of an already handled webhook with an empty TwiML response.
+
+    The ID is recorded before the handler runs, so a retry that arrives while
+    the first attempt is still working is dropped too; if the handler raises,
+    the ID is forgotten so Twilio's retry can do the work. `seen` may be a
+    zero-argument callable returning the set, to build it on first use.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = webhook_id()
+            if key is None:
+                return f(*args, **kwargs)
+            store = seen() if callable(seen) else seen
+            if not store.first_seen(key):
+                Stats().record_call("webhook.duplicate")
+                return Response('<?xml version="1.0" encoding="UTF-8"?><Response></Response>', mimetype="text/xml")
+            try:
+                return f(*args, **kwargs)
+            except Exception:
+                store.discard(key)
+                raise
+        return decorated_function
+
+    if f is not None:
+        return decorator(f)
+    return decorator
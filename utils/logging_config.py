@@ -1,37 +1,183 @@
 
+import atexit
+import contextvars
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import re
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Set per request (Twilio CallSid/MessageSid) and copied onto every log record
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+
+# Full request payloads go to this logger and are sampled
+PAYLOAD_LOGGER = "app.payload"
+
+# North American / E.164-looking numbers not embedded in a longer token (so SIDs are left alone)
+_PHONE = re.compile(r"(?<![\w+])\+?(?:\d{1,3}[\s.-]?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?(\d{4})(?!\w)")
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "correlation_id"}
+
+_listener = None
+
+
+def set_correlation_id(value):
+    return correlation_id.set(value)
+
+
+def redact(value):
+    """Mask phone numbers, keeping the last four digits for support lookups."""
+    if isinstance(value, str):
+        return _PHONE.sub(lambda m: "***" + m.group(1), value)
+    if isinstance(value, dict):
+        return {k: redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+class CorrelationFilter(logging.Filter):
+    # Attached to the QueueHandler so it runs on the caller's thread, where the context var is set
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only `rate` of the records from the payload logger; everything else passes."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.name == PAYLOAD_LOGGER or record.name.startswith(PAYLOAD_LOGGER + "."):
+            return self.rate >= 1 or random.random() < self.rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with phone numbers redacted."""
+
+    def __init__(self, redact_pii=True):
+        super().__init__()
+        self.redact_pii = redact_pii
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "correlation_id", None):
+            entry["correlation_id"] = record.correlation_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if self.redact_pii:
+            entry = {k: v if k in ("ts", "level", "logger") else redact(v) for k, v in entry.items()}
+        return json.dumps(entry, default=str)
+
+
+class RedactingFormatter(logging.Formatter):
+    def format(self, record):
+        return redact(super().format(record))
+
+
+class _PassThroughQueueHandler(QueueHandler):
+    # The default prepare() runs the handler's formatter on the calling thread; only merge
+    # args here and leave JSON formatting and redaction to the listener
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_text = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(log_format=None, payload_sample_rate=None, log_dir=None, console=True):
+    """Configure root logging: JSON lines written by a background QueueListener.
+
+    Request threads only enqueue records; formatting, redaction and file or
+    stdout I/O happen on the listener thread. Defaults come from LOG_FORMAT
+    (json|text), LOG_PAYLOAD_SAMPLE_RATE and LOG_DIR.
+    """
+    global _listener
+    log_format = log_format or os.environ.get("LOG_FORMAT", "json")
+    if payload_sample_rate is None:
+        payload_sample_rate = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+    log_dir = log_dir or os.environ.get("LOG_DIR", "logs")
 
-def setup_logging():
     # Create logs directory if it doesn't exist
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
 
     # Configure logging
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
+    if log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = RedactingFormatter('%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s')
+
     # File handler for all logs
     file_handler = RotatingFileHandler(
-        'logs/app.log', 
+        os.path.join(log_dir, 'app.log'),
         maxBytes=10000000,  # 10MB
         backupCount=5
     )
     file_handler.setFormatter(formatter)
-    
+
     # Error file handler
     error_handler = RotatingFileHandler(
-        'logs/error.log',
+        os.path.join(log_dir, 'error.log'),
         maxBytes=10000000,
         backupCount=5
     )
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(formatter)
 
-    # Root logger configuration
+    handlers = [file_handler, error_handler]
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    stop_logging()
+    log_queue = queue.SimpleQueue()
+    queue_handler = _PassThroughQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(payload_sample_rate))
+    queue_handler.addFilter(CorrelationFilter())
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    # Root logger configuration (replaces handlers such as logging.basicConfig's)
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(error_handler)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        try:
+            listener.stop()
+        except Exception:
+            # The listener thread doesn't exist in a forked child
+            pass
@@ -1,31 +1,139 @@
 from flask import request, jsonify
 from functools import wraps
+import threading
 import time
-from collections import defaultdict
+from collections import OrderedDict
+
+from utils.sqlite import ThreadConnections, sqlite_path
 
 class RateLimiter:
-    def __init__(self, calls=100, per=60):
+    """Sliding-window counter: `calls` per `per` seconds for each key.
+
+    Each key stores three numbers (current window, previous and current
+    counts) and the previous window is weighted by how much of it still
+    overlaps the sliding window. Keys idle for two windows, or beyond
+    `max_keys`, are evicted in LRU order, so memory stays bounded.
+    """
+
+    def __init__(self, calls=100, per=60, max_keys=100000):
         self.calls = calls  # Number of calls allowed
         self.per = per     # Time period in seconds
-        self.tokens = defaultdict(list)  # Store timestamps for each IP
+        self.max_keys = max_keys
+        self.tokens = OrderedDict()  # key -> [window, previous count, current count]
+        self._lock = threading.Lock()
 
-    def is_allowed(self, ip):
+    def is_allowed(self, key):
         now = time.time()
-        self.tokens[ip] = [t for t in self.tokens[ip] if t > now - self.per]
-        
-        if len(self.tokens[ip]) >= self.calls:
-            return False
-            
-        self.tokens[ip].append(now)
-        return True
+        window = int(now // self.per)
+        with self._lock:
+            entry = self.tokens.get(key)
+            if entry is None:
+                entry = self.tokens[key] = [window, 0, 0]
+            else:
+                self.tokens.move_to_end(key)
+                if entry[0] != window:
+                    # Roll over: the old current window becomes the previous one if adjacent
+                    entry[1] = entry[2] if entry[0] == window - 1 else 0
+                    entry[2] = 0
+                    entry[0] = window
+            self._evict(window)
+
+            overlap = 1 - (now % self.per) / self.per
+            if entry[1] * overlap + entry[2] >= self.calls:
+                return False
+            entry[2] += 1
+            return True
+
+    def _evict(self, window):
+        # Oldest-touched keys sit at the front; stop at the first one still active
+        tokens = self.tokens
+        while tokens:
+            key, entry = next(iter(tokens.items()))
+            if len(tokens) > self.max_keys or entry[0] < window - 1:
+                tokens.popitem(last=False)
+            else:
+                break
+
+    def __len__(self):
+        return len(self.tokens)
+
+class SQLiteRateLimiter:
+    """Same algorithm with counters in a SQLite file shared by every worker on the host."""
+
+    def __init__(self, path, calls=100, per=60):
+        self.path = path
+        self.calls = calls
+        self.per = per
+        self._connect = ThreadConnections(path, pragmas=("synchronous=NORMAL",), isolation_level=None).get
+        self._last_purge = 0
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, window INTEGER NOT NULL, prev INTEGER NOT NULL, curr INTEGER NOT NULL)"
+        )
+
+    def is_allowed(self, key):
+        now = time.time()
+        window = int(now // self.per)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT window, prev, curr FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            prev = curr = 0
+            if row is not None:
+                if row[0] == window:
+                    prev, curr = row[1], row[2]
+                elif row[0] == window - 1:
+                    prev = row[2]
+            overlap = 1 - (now % self.per) / self.per
+            allowed = prev * overlap + curr < self.calls
+            if allowed:
+                conn.execute(
+                    "INSERT INTO rate_limits (key, window, prev, curr) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET window = excluded.window, prev = excluded.prev, curr = excluded.curr",
+                    (key, window, prev, curr + 1)
+                )
+            if window != self._last_purge:
+                conn.execute("DELETE FROM rate_limits WHERE window < ?", (window - 1,))
+                self._last_purge = window
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+def create_rate_limiter(calls, per, url=None):
+    """Per-process limiter, or counters shared by every worker for a sqlite:/// URL."""
+    path = sqlite_path(url)
+    if path:
+        return SQLiteRateLimiter(path, calls=calls, per=per)
+    return RateLimiter(calls=calls, per=per)
 
 limiter = RateLimiter()
 
-def rate_limit(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        ip = request.remote_addr
-        if not limiter.is_allowed(ip):
-            return jsonify({"error": "Rate limit exceeded"}), 429
-        return f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+KEY_FUNCS = {
+    "ip": lambda: request.remote_addr,
+    # Twilio webhooks: the customer's number, or the business number they texted/called
+    "from": lambda: "from:" + (request.form.get("From") or request.remote_addr or ""),
+    "business": lambda: "business:" + (request.form.get("To") or ""),
+}
+
+def rate_limit(f=None, key="ip", limiter=limiter):
+    """Use as @rate_limit or @rate_limit(key="from", limiter=...).
+
+    `key` may also be a callable; so may `limiter` (returning the limiter, to build it on first use).
+    """
+    key_func = key if callable(key) else KEY_FUNCS[key]
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not (limiter() if callable(limiter) else limiter).is_allowed(key_func()):
+                return jsonify({"error": "Rate limit exceeded"}), 429
+            return f(*args, **kwargs)
+        return decorated_function
+
+    if f is not None:
+        return decorator(f)
+    return decorator
@@ -0,0 +1,87 @@
+
+from collections.abc import MutableMapping
+
+_UNSET = object()
+
+
+class Session(MutableMapping):
+    """A customer's conversation state.
+
+    Behaves like the dict it replaces (`state["name"]`, `state.get(...)`,
+    `setdefault`...) so handlers and stores don't care, but the known fields
+    live in slots, about half the memory of an equivalent dict.
+    Anything else goes into a lazily created `extra` dict.
+    """
+
+    FIELDS = ("stage", "business_number", "name", "location", "issue", "history")
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self, data=None, **fields):
+        for field in self.FIELDS:
+            setattr(self, field, _UNSET)
+        self.extra = None
+        if data:
+            self.update(data)
+        if fields:
+            self.update(fields)
+
+    @classmethod
+    def from_dict(cls, data):
+        return data if isinstance(data, cls) else cls(data)
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __getitem__(self, key):
+        if key in Session.FIELDS:
+            value = getattr(self, key)
+            if value is _UNSET:
+                raise KeyError(key)
+            return value
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if key in Session.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in Session.FIELDS:
+            if getattr(self, key) is _UNSET:
+                raise KeyError(key)
+            setattr(self, key, _UNSET)
+        else:
+            if self.extra is None:
+                raise KeyError(key)
+            del self.extra[key]
+
+    def __iter__(self):
+        for field in Session.FIELDS:
+            if getattr(self, field) is not _UNSET:
+                yield field
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Session({self.to_dict()!r})"
+
+
+def approx_size(state):
+    """Rough bytes held by a state; cheap enough to compute on every write."""
+    size = 200
+    for key, value in state.items():
+        if isinstance(value, str):
+            size += len(value) + 50
+    history = state.get("history")
+    if history:
+        size += len(history.get("summary") or "")
+        size += sum(len(turn["content"]) + 150 for turn in history.get("turns", ()))
+    return size
@@ -0,0 +1,115 @@
+
+import re
+import unicodedata
+
+# GSM 03.38 default alphabet (ESC excluded) and the extension table, whose characters cost two septets
+GSM7_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENDED = frozenset("\f^{}\\[~]|€")
+GSM7 = GSM7_BASIC | GSM7_EXTENDED
+
+GSM7_SINGLE, GSM7_MULTI = 160, 153
+UCS2_SINGLE, UCS2_MULTI = 70, 67
+
+# Typography models like to emit, mapped to GSM-7 equivalents that read the same
+TRANSLITERATIONS = {
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'", "´": "'", "`": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"', "″": '"', "«": '"', "»": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "―": "-", "−": "-",
+    "…": "...", "•": "-", "·": "-", "▪": "-", "●": "-",
+    "\u00a0": " ", "\u2002": " ", "\u2003": " ", "\u2009": " ", "\u200a": " ", "\u202f": " ",
+    "\u200b": "", "\u200c": "", "\u200d": "", "\u2060": "", "\ufeff": "",
+    "½": "1/2", "¼": "1/4", "¾": "3/4", "×": "x", "÷": "/",
+    "≈": "~", "≤": "<=", "≥": ">=", "→": "->", "←": "<-",
+    "™": "TM", "©": "(c)", "®": "(R)", "°": " degrees",
+}
+_DEGREES = re.compile("°([FC])\\b")
+
+_SENTENCE_END = re.compile(r"[.!?] |\n")
+
+
+def _drop(char):
+    # Emoji, pictographs and formatting marks carry no meaning an SMS reader would miss
+    category = unicodedata.category(char)
+    return category in ("So", "Sk", "Cf", "Cs", "Mn", "Me") or 0xFE00 <= ord(char) <= 0xFE0F
+
+
+def to_gsm7(text):
+    """Rewrite `text` into GSM-7 where that loses nothing a reader needs.
+
+    Smart quotes, dashes, ellipses and odd spaces are mapped, accents outside
+    the GSM alphabet are stripped and emoji dropped. Letters from other
+    scripts are left alone (the message then stays UCS-2).
+    """
+    if all(c in GSM7 for c in text):
+        return text
+    text = _DEGREES.sub(r"\1", text)
+    out = []
+    for char in text:
+        if char in GSM7:
+            out.append(char)
+        elif char in TRANSLITERATIONS:
+            out.append(TRANSLITERATIONS[char])
+        else:
+            decomposed = "".join(c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c))
+            if decomposed and all(c in GSM7 for c in decomposed):
+                out.append(decomposed)
+            elif not _drop(char):
+                out.append(char)
+    return re.sub(r"  +", " ", "".join(out))
+
+
+def is_gsm7(text):
+    return all(c in GSM7 for c in text)
+
+
+def _pack(units, single, multi):
+    # Greedy fill: a two-unit character (GSM escape pair, UTF-16 surrogate pair) is never split
+    total = sum(units)
+    if total <= single:
+        return 1 if total else 0
+    segments, used = 1, 0
+    for n in units:
+        if used + n > multi:
+            segments += 1
+            used = 0
+        used += n
+    return segments
+
+
+def segment_count(text):
+    """Exact number of billed SMS segments for `text`."""
+    if is_gsm7(text):
+        return _pack([2 if c in GSM7_EXTENDED else 1 for c in text], GSM7_SINGLE, GSM7_MULTI)
+    return _pack([2 if ord(c) > 0xFFFF else 1 for c in text], UCS2_SINGLE, UCS2_MULTI)
+
+
+def chars_per_segment(text):
+    """Characters one segment of a multi-part message holds in `text`'s encoding."""
+    return GSM7_MULTI if is_gsm7(text) else UCS2_MULTI
+
+
+def fit_segments(text, budget):
+    """Longest prefix of `text` within `budget` segments, cut at a sentence end where possible."""
+    if budget <= 0:
+        return ""
+    if segment_count(text) <= budget:
+        return text
+    # Upper bound in characters; then walk back to a boundary that actually fits
+    limit = min(len(text), budget * chars_per_segment(text))
+    for match in reversed(list(_SENTENCE_END.finditer(text, 0, limit))):
+        if match.end() <= limit // 3:
+            break
+        candidate = text[:match.end()].rstrip()
+        if segment_count(candidate) <= budget:
+            return candidate
+    cut = limit
+    while cut > 0:
+        space = text.rfind(" ", 0, cut)
+        cut = space if space > 0 else cut - 1
+        candidate = text[:cut].rstrip()
+        if segment_count(candidate) <= budget:
+            return candidate
+    return ""
@@ -0,0 +1,40 @@
+
+import os
+import sqlite3
+import threading
+
+
+def sqlite_path(url):
+    """The file path in a "sqlite:///path" store URL, or None for any other URL."""
+    if url and url.startswith("sqlite:///"):
+        return url[len("sqlite:///"):]
+    return None
+
+
+def connect(path, pragmas=(), **kwargs):
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=False, **kwargs)
+    for pragma in pragmas:
+        conn.execute(f"PRAGMA {pragma}")
+    return conn
+
+
+class ThreadConnections:
+    """One SQLite connection per thread, reopened in a forked child.
+
+    Connections are never shared between threads (they would serialize) or
+    carried across fork (the child must not touch the parent's file locks).
+    Extra keyword arguments go to `sqlite3.connect`.
+    """
+
+    def __init__(self, path, pragmas=(), **kwargs):
+        self.path = path
+        self.pragmas = pragmas
+        self.kwargs = kwargs
+        self._local = threading.local()
+
+    def get(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = connect(self.path, self.pragmas, **self.kwargs)
+            local.pid = os.getpid()
+        return local.conn
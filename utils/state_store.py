@@ -0,0 +1,456 @@
+
+import atexit
+import heapq
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from utils.forksafe import PerProcess
+from utils.session import Session, approx_size
+from utils.sqlite import ThreadConnections, connect, sqlite_path
+
+logger = logging.getLogger(__name__)
+
+_DELETED = object()
+
+# Reasons passed to `on_evict`
+EXPIRED = "expired"  # idle past its TTL
+EVICTED = "evicted"  # pushed out by max_entries or max_bytes
+
+
+class StateStore(ABC):
+    """Conversation state keyed by customer phone number.
+
+    Callers hold `lock(phone)` around a read-modify-write and call `set()` when
+    done; backends are free to hand out cached objects from `get()`.
+    """
+
+    lock_stripes = 64
+
+    def __init__(self):
+        self._locks = [threading.RLock() for _ in range(self.lock_stripes)]
+
+    def lock(self, phone):
+        # Striped locks keep memory fixed no matter how many customers we see
+        return self._locks[zlib.crc32((phone or "").encode()) % len(self._locks)]
+
+    @abstractmethod
+    def get(self, phone, default=None):
+        ...
+
+    @abstractmethod
+    def set(self, phone, state):
+        ...
+
+    @abstractmethod
+    def delete(self, phone):
+        ...
+
+    @abstractmethod
+    def items(self):
+        ...
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __contains__(self, phone):
+        return self.get(phone) is not None
+
+    def __getitem__(self, phone):
+        state = self.get(phone)
+        if state is None:
+            raise KeyError(phone)
+        return state
+
+    def __setitem__(self, phone, state):
+        self.set(phone, state)
+
+    def __delitem__(self, phone):
+        self.delete(phone)
+
+    def __len__(self):
+        return sum(1 for _ in self.items())
+
+
+class MemoryStateStore(StateStore):
+    """Per-process store with idle TTLs, LRU eviction and a background reaper.
+
+    Each entry's idle TTL depends on its stage (`stage_ttls`, falling back to
+    `ttl`). Expiry times go into a heap that a reaper thread pops every
+    `reap_interval` seconds, so expiring costs O(expired * log n) rather than
+    a scan of every session. Beyond `max_entries` entries or `max_bytes`
+    (estimated) the least recently used entries are evicted.
+
+    `on_evict(phone, state, reason)` is called, outside the store's lock, for
+    every entry dropped by the TTL (reason EXPIRED) or the LRU (EVICTED), not
+    for `delete()`.
+    """
+
+    def __init__(self, max_entries=10000, ttl=24 * 3600, on_evict=None, stage_ttls=None,
+                 max_bytes=None, reap_interval=1.0):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stage_ttls = stage_ttls or {}
+        self.max_bytes = max_bytes
+        self.reap_interval = reap_interval
+        self.on_evict = on_evict
+        self.bytes = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # phone -> [state, expires_at, size]
+        self._expiry = []  # heap of (expires_at, phone); stale items are skipped when popped
+        self._data_lock = threading.Lock()
+        self._reaper = PerProcess(lambda first: threading.Thread(
+            target=self._run_reaper, name="state-reaper", daemon=True).start())
+        self._stop = threading.Event()
+
+    def ttl_for(self, state):
+        return self.stage_ttls.get(state.get("stage"), self.ttl)
+
+    def get(self, phone, default=None):
+        with self._data_lock:
+            entry = self._data.get(phone)
+            if entry is None:
+                return default
+            if entry[1] >= time.monotonic():
+                self._data.move_to_end(phone)
+                return entry[0]
+            self._pop(phone)
+        self._evicted([(phone, entry[0])], EXPIRED)
+        return default
+
+    def set(self, phone, state):
+        if self.reap_interval:
+            self._reaper.ensure()
+        state = Session.from_dict(state)
+        size = approx_size(state)
+        expires_at = time.monotonic() + self.ttl_for(state)
+        evicted = []
+        with self._data_lock:
+            old = self._data.get(phone)
+            if old is not None:
+                self.bytes -= old[2]
+            self._data[phone] = [state, expires_at, size]
+            self._data.move_to_end(phone)
+            self.bytes += size
+            heapq.heappush(self._expiry, (expires_at, phone))
+            if len(self._expiry) > 2 * len(self._data) + 1024:
+                # Mostly stale items from re-saved sessions; rebuild from the live entries
+                self._expiry = [(entry[1], p) for p, entry in self._data.items()]
+                heapq.heapify(self._expiry)
+            while self._data and (len(self._data) > self.max_entries
+                                  or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                old_phone = next(iter(self._data))
+                evicted.append((old_phone, self._pop(old_phone)[0]))
+        self._evicted(evicted, EVICTED)
+
+    def _pop(self, phone):
+        # Caller holds self._data_lock
+        entry = self._data.pop(phone)
+        self.bytes -= entry[2]
+        return entry
+
+    def reap(self, now=None):
+        """Evict expired entries; returns how many were dropped."""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._data_lock:
+            heap = self._expiry
+            while heap and heap[0][0] <= now:
+                expires_at, phone = heapq.heappop(heap)
+                entry = self._data.get(phone)
+                # Skip items left behind by a later save (or a delete) of the same phone
+                if entry is not None and entry[1] == expires_at:
+                    expired.append((phone, self._pop(phone)[0]))
+        self._evicted(expired, EXPIRED)
+        return len(expired)
+
+    def _run_reaper(self):
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.reap()
+            except Exception as e:
+                logger.error("Session reaper failed: %s", e)
+
+    def _evicted(self, entries, reason):
+        self.evictions += len(entries)
+        if self.on_evict is not None:
+            for phone, state in entries:
+                try:
+                    self.on_evict(phone, state, reason)
+                except Exception as e:
+                    logger.error("State eviction hook failed for %s: %s", phone, e)
+
+    def delete(self, phone):
+        with self._data_lock:
+            if phone in self._data:
+                self._pop(phone)
+
+    def items(self):
+        now = time.monotonic()
+        with self._data_lock:
+            return [(phone, entry[0]) for phone, entry in self._data.items() if entry[1] >= now]
+
+    def close(self):
+        self._stop.set()
+
+    def __len__(self):
+        with self._data_lock:
+            return len(self._data)
+
+
+class SQLiteStateStore(StateStore):
+    """Store shared by every worker on the host through a WAL-mode SQLite file.
+
+    Reads are served from a local cache that is dropped whenever another
+    connection commits. That is tracked with PRAGMA data_version, which never
+    touches disk but only means something within one connection, so every
+    cached read goes through a single reader connection per process. Writes
+    are buffered and committed in batches by a background thread every
+    `flush_interval` seconds or once `batch_size` writes are pending.
+
+    `lock(phone)` only serializes threads of this process. Writes reach other
+    workers up to `flush_interval` later, so two workers handling the same
+    customer at once can still interleave; Twilio delivers one customer's
+    texts in order, seconds apart, which keeps this rare.
+
+    Each row's expiry follows its stage (`stage_ttls`, falling back to `ttl`)
+    and its business and stage are stored as indexed columns, so
+    `stage_counts()` gives every worker the same per-business counts. Expired
+    rows are purged every `purge_interval` seconds by whichever worker gets
+    there first, and `on_evict(phone, state, EXPIRED)` runs in that worker only.
+    """
+
+    def __init__(self, path, ttl=24 * 3600, flush_interval=0.05, batch_size=100, cache_size=10000,
+                 stage_ttls=None, on_evict=None, purge_interval=60):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.stage_ttls = stage_ttls or {}
+        self.on_evict = on_evict
+        self.purge_interval = purge_interval
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._connect = ThreadConnections(path, pragmas=("synchronous=NORMAL",)).get
+        self._cache = OrderedDict()
+        self._dirty = {}
+        self._flushing = {}  # batch being committed, still visible to get()
+        self._reader = PerProcess(self._open_reader)
+        self._read_conn = None
+        self._data_version = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._writer = PerProcess(self._start_writer)
+        self._closed = False
+        self._last_purge = 0.0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS customer_states ("
+                "phone TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL, "
+                "business_number TEXT, stage TEXT, expires_at REAL)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(customer_states)")}
+            if "expires_at" not in columns:
+                # Files written before expiry and counts moved into columns
+                for column in ("business_number TEXT", "stage TEXT", "expires_at REAL"):
+                    conn.execute(f"ALTER TABLE customer_states ADD COLUMN {column}")
+                conn.execute(
+                    "UPDATE customer_states SET business_number = json_extract(data, '$.business_number'), "
+                    "stage = json_extract(data, '$.stage'), expires_at = updated_at + ?",
+                    (ttl,)
+                )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_states_expires ON customer_states(expires_at)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_states_business_stage "
+                "ON customer_states(business_number, stage, expires_at)"
+            )
+
+    def ttl_for(self, state):
+        return self.stage_ttls.get(state.get("stage"), self.ttl)
+
+    def _open_reader(self, first):
+        self._read_conn = connect(self.path, ("synchronous=NORMAL",))
+        self._data_version = None
+
+    def _check_version(self, conn):
+        # Caller holds self._lock; `conn` is always the reader, the only connection data_version is compared on
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._cache.clear()
+            self._data_version = version
+
+    def get(self, phone, default=None):
+        with self._lock:
+            state = self._dirty.get(phone, self._flushing.get(phone))
+            if state is _DELETED:
+                return default
+            if state is not None:
+                return state
+            self._reader.ensure()
+            conn = self._read_conn
+            self._check_version(conn)
+            if phone in self._cache:
+                self._cache.move_to_end(phone)
+                state = self._cache[phone]
+                return default if state is None else state
+            row = conn.execute(
+                "SELECT data FROM customer_states WHERE phone = ? AND expires_at > ?",
+                (phone, time.time())
+            ).fetchone()
+            state = Session(json.loads(row[0])) if row else None
+            # Negative entries are cached too so repeated misses stay local
+            self._cache[phone] = state
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return default if state is None else state
+
+    def set(self, phone, state):
+        self._write(phone, state)
+
+    def delete(self, phone):
+        self._write(phone, _DELETED)
+
+    def _write(self, phone, value):
+        self._writer.ensure()
+        with self._lock:
+            self._dirty[phone] = value
+            self._cache.pop(phone, None)
+            pending = len(self._dirty)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def items(self):
+        self.flush()
+        rows = self._connect().execute(
+            "SELECT phone, data FROM customer_states WHERE expires_at > ?", (time.time(),)
+        ).fetchall()
+        return [(phone, Session(json.loads(data))) for phone, data in rows]
+
+    def __len__(self):
+        self.flush()
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM customer_states WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+    def stage_counts(self, business=None):
+        """{business_number: {stage: live conversations}}, optionally for one business only."""
+        self.flush()
+        sql = "SELECT business_number, stage, COUNT(*) FROM customer_states WHERE expires_at > ?"
+        params = [time.time()]
+        if business is not None:
+            sql += " AND business_number = ?"
+            params.append(business)
+        counts = {}
+        for business_number, stage, count in self._connect().execute(sql + " GROUP BY business_number, stage", params):
+            counts.setdefault(business_number, {})[stage] = count
+        return counts
+
+    def _start_writer(self, first):
+        if first:
+            atexit.register(self.close)
+        threading.Thread(target=self._run_writer, name="state-store-writer", daemon=True).start()
+
+    def _run_writer(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error("State store flush failed: %s", e)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._dirty = self._dirty, {}
+                # Readers keep seeing the batch until it is committed, not the rows it replaces
+                self._flushing = batch
+            if batch:
+                try:
+                    self._commit(batch)
+                except sqlite3.Error:
+                    # Put the batch back unless newer writes replaced it meanwhile
+                    with self._lock:
+                        for phone, state in batch.items():
+                            self._dirty.setdefault(phone, state)
+                    raise
+                finally:
+                    with self._lock:
+                        self._flushing = {}
+            expired = self._purge()
+        self._evicted(expired)
+
+    def _commit(self, batch):
+        now = time.time()
+        upserts = [
+            (phone, json.dumps(dict(state)), now, state.get("business_number"), state.get("stage"),
+             now + self.ttl_for(state))
+            for phone, state in batch.items() if state is not _DELETED
+        ]
+        deletes = [(phone,) for phone, state in batch.items() if state is _DELETED]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO customer_states (phone, data, updated_at, business_number, stage, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(phone) DO UPDATE SET data = excluded.data, "
+                "updated_at = excluded.updated_at, business_number = excluded.business_number, "
+                "stage = excluded.stage, expires_at = excluded.expires_at",
+                upserts
+            )
+            conn.executemany("DELETE FROM customer_states WHERE phone = ?", deletes)
+
+    def _purge(self):
+        # Caller holds self._flush_lock
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return []
+        self._last_purge = now
+        with self._connect() as conn:
+            # RETURNING hands each expired row to exactly one worker
+            rows = conn.execute(
+                "DELETE FROM customer_states WHERE expires_at <= ? RETURNING phone, data", (now,)
+            ).fetchall()
+        with self._lock:
+            # A customer who wrote again since is still active; their new state is about to be saved
+            return [(phone, Session(json.loads(data))) for phone, data in rows if phone not in self._dirty]
+
+    def _evicted(self, entries):
+        if self.on_evict is None:
+            return
+        for phone, state in entries:
+            try:
+                self.on_evict(phone, state, EXPIRED)
+            except Exception as e:
+                logger.error("State eviction hook failed for %s: %s", phone, e)
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._wakeup.set()
+
+
+def create_state_store(url=None, on_evict=None, stage_ttls=None, max_entries=10000, max_bytes=None):
+    """"memory" (the default) keeps states in this process; a sqlite:/// URL shares them between workers.
+
+    `max_entries` and `max_bytes` only apply to the memory store.
+    """
+    url = url or "memory"
+    if url == "memory":
+        return MemoryStateStore(max_entries=max_entries, on_evict=on_evict, stage_ttls=stage_ttls,
+                                max_bytes=max_bytes)
+    path = sqlite_path(url)
+    if path:
+        return SQLiteStateStore(path, stage_ttls=stage_ttls, on_evict=on_evict)
+    raise ValueError(f"Unsupported state store: {url}")
@@ -1,6 +1,54 @@
 from datetime import datetime, timedelta
 from collections import defaultdict
+from bisect import bisect_left
+from contextlib import contextmanager
 import threading
+import time
+
+# Upper bounds in seconds; the last bucket catches everything slower
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+class LatencyHistogram:
+    """Fixed-bucket histogram: constant memory and O(log buckets) per observation."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, pct):
+        """Estimate by linear interpolation inside the bucket holding the pct-th observation."""
+        if not self.count:
+            return 0.0
+        rank = self.count * pct / 100.0
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = LATENCY_BUCKETS[i - 1] if i else 0.0
+                upper = min(LATENCY_BUCKETS[i], self.max)
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p95_ms": round(self.percentile(95) * 1000, 2),
+            "p99_ms": round(self.percentile(99) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+        }
 
 class Stats:
     _instance = None
@@ -17,6 +65,9 @@ class Stats:
     def _init(self):
         self.calls = defaultdict(int)
         self.errors = defaultdict(int)
+        self.latencies = defaultdict(LatencyHistogram)
+        self.gauges = {}
+        self.counters = defaultdict(int)
         self.last_reset = datetime.now()
 
     def record_call(self, endpoint):
@@ -27,16 +78,73 @@ class Stats:
         with self._lock:
             self.errors[endpoint] += 1
 
+    def record_latency(self, name, seconds):
+        with self._lock:
+            self.latencies[name].observe(seconds)
+
+    def increment(self, name, n=1):
+        """Add `n` to a named counter, e.g. SMS segments billed."""
+        with self._lock:
+            self.counters[name] += n
+
+    def set_gauge(self, name, value):
+        """Record the current value of a level, e.g. a queue depth."""
+        with self._lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def timer(self, name):
+        """Time a block, e.g. an external API call, into the `name` histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_latency(name, time.perf_counter() - start)
+
     def get_stats(self):
         with self._lock:
             return {
                 'calls': dict(self.calls),
                 'errors': dict(self.errors),
+                'latency': {name: h.summary() for name, h in sorted(self.latencies.items())},
+                'gauges': dict(sorted(self.gauges.items())),
+                'counters': dict(sorted(self.counters.items())),
                 'uptime': str(datetime.now() - self.last_reset)
             }
 
+    def render_metrics(self):
+        """Prometheus text exposition of the counters and latency histograms."""
+        lines = [
+            "# TYPE app_calls_total counter",
+            "# TYPE app_errors_total counter",
+            "# TYPE app_latency_seconds histogram",
+            "# TYPE app_gauge gauge",
+            "# TYPE app_counter_total counter",
+        ]
+        with self._lock:
+            for endpoint, n in sorted(self.calls.items()):
+                lines.append(f'app_calls_total{{endpoint="{endpoint}"}} {n}')
+            for endpoint, n in sorted(self.errors.items()):
+                lines.append(f'app_errors_total{{endpoint="{endpoint}"}} {n}')
+            for name, h in sorted(self.latencies.items()):
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS, h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'app_latency_seconds_bucket{{name="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'app_latency_seconds_sum{{name="{name}"}} {h.sum:.6f}')
+                lines.append(f'app_latency_seconds_count{{name="{name}"}} {h.count}')
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f'app_gauge{{name="{name}"}} {value}')
+            for name, n in sorted(self.counters.items()):
+                lines.append(f'app_counter_total{{name="{name}"}} {n}')
+        return "\n".join(lines) + "\n"
+
     def reset(self):
         with self._lock:
             self.calls.clear()
             self.errors.clear()
-            self.last_reset = datetime.now()
\ No newline at end of file
+            self.latencies.clear()
+            self.gauges.clear()
+            self.counters.clear()
+            self.last_reset = datetime.now()
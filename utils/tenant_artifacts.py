@@ -0,0 +1,37 @@
+
+import threading
+
+
+class TenantArtifacts:
+    """Per-tenant values derived only from tenant config, built once and reused.
+
+    `build(tenant)` returns whatever the caller wants precomputed (rendered
+    prompt prefixes, TwiML bytes...). Entries are dropped whenever the
+    registry swaps its snapshot, and each entry remembers the tenant mapping
+    it was built from, so a build racing a swap is never served afterwards:
+    registry tenants are immutable, so a different object means new config.
+    """
+
+    def __init__(self, registry, build):
+        self.build = build
+        self.builds = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        registry.on_change(self.clear)
+
+    def get(self, tenant):
+        entry = self._entries.get(tenant["number"])
+        if entry is not None and entry[0] is tenant:
+            return entry[1]
+        artifacts = self.build(tenant)
+        with self._lock:
+            self.builds += 1
+            self._entries[tenant["number"]] = (tenant, artifacts)
+        return artifacts
+
+    def clear(self, registry=None):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
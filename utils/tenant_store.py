@@ -0,0 +1,121 @@
+
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+from utils.sqlite import ThreadConnections, sqlite_path
+
+
+class JSONTenantStore:
+    """Business configs in a JSON file shared by every worker on the host.
+
+    Writers take an exclusive flock on a sidecar lock file, write a temp file
+    and `os.replace` it into place, so readers always see a whole document.
+    `version()` is a single stat() call, cheap enough to poll every second.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock_path = path + ".lock"
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def version(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # A replaced file gets a new inode even if mtime granularity hides the change
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def load(self):
+        """Return (version token, {number: config})."""
+        token = self.version()
+        if token is None:
+            return None, {}
+        with open(self.path) as f:
+            data = json.load(f)
+        return token, data.get("businesses", {})
+
+    @contextmanager
+    def _exclusive(self):
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def put(self, number, config):
+        with self._exclusive():
+            data = {"version": 0, "businesses": {}}
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    data = json.load(f)
+            data["businesses"][number] = config
+            data["version"] = data.get("version", 0) + 1
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f, indent=2, sort_keys=True)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+
+class SQLiteTenantStore:
+    """Business configs in SQLite with a version counter bumped on every write."""
+
+    def __init__(self, path):
+        self.path = path
+        self._connect = ThreadConnections(path, isolation_level=None).get
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS businesses (number TEXT PRIMARY KEY, config TEXT NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS tenant_version (id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO tenant_version (id, version) VALUES (0, 0)")
+
+    def version(self):
+        return self._connect().execute("SELECT version FROM tenant_version WHERE id = 0").fetchone()[0]
+
+    def load(self):
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            version = conn.execute("SELECT version FROM tenant_version WHERE id = 0").fetchone()[0]
+            rows = conn.execute("SELECT number, config FROM businesses").fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return version, {number: json.loads(config) for number, config in rows}
+
+    def put(self, number, config):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO businesses (number, config) VALUES (?, ?) "
+                "ON CONFLICT(number) DO UPDATE SET config = excluded.config",
+                (number, json.dumps(config))
+            )
+            conn.execute("UPDATE tenant_version SET version = version + 1 WHERE id = 0")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def create_tenant_store(url):
+    """A SQLite store for a sqlite:/// URL, otherwise a JSON file at that path."""
+    path = sqlite_path(url)
+    if path:
+        return SQLiteTenantStore(path)
+    if url.endswith(".json"):
+        return JSONTenantStore(url)
+    raise ValueError(f"Unsupported tenant store: {url}")
@@ -0,0 +1,182 @@
+
+import logging
+import re
+import threading
+import time
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+_E164 = re.compile(r"\+[1-9]\d{7,14}")
+
+
+def normalize_e164(number, default_country="1"):
+    """Normalize a phone number to E.164; 10-digit numbers are taken as North American."""
+    if not number:
+        return None
+    number = number.strip()
+    digits = "".join(c for c in number if c.isdigit())
+    if not digits:
+        return None
+    if number.startswith("+"):
+        return "+" + digits
+    if len(digits) == 10:
+        return "+" + default_country + digits
+    return "+" + digits
+
+
+def valid_e164(number):
+    """Normalize `number`, raising ValueError unless it is a plausible E.164 number."""
+    normalized = normalize_e164(number)
+    if normalized is None or not _E164.fullmatch(normalized):
+        raise ValueError(f"Invalid phone number: {number!r}")
+    return normalized
+
+
+def make_tenant(number, config, defaults=None):
+    tenant = {**(defaults or {}), **config}
+    tenant["number"] = normalize_e164(number)
+    tenant["forward_to"] = normalize_e164(config.get("forward_to"))
+    tenant.setdefault("business_type", "plumber")
+    return MappingProxyType(tenant)
+
+
+class TenantRegistry:
+    """Business numbers -> tenant config, held in an immutable snapshot.
+
+    Numbers are normalized once when tenants are loaded. Writers build a new
+    snapshot and swap the reference, so `resolve()` is a lock-free O(1) dict
+    lookup that never observes a half-applied change.
+
+    When attached to a store (see utils.tenant_store), `add()` writes through
+    to it and `refresh()` polls the store's version at most once every
+    `poll_interval` seconds, so changes made by other workers arrive within
+    that interval. `defaults` (shared credentials) are merged into each
+    tenant and never persisted.
+
+    Unknown numbers fall back to the `default_number` tenant. Without one,
+    the first tenant ever loaded is pinned as the default, so adding another
+    business never changes it.
+    """
+
+    def __init__(self, store=None, defaults=None, poll_interval=1.0, default_number=None):
+        self._snapshot = MappingProxyType({})
+        self._default = None
+        self.default_number = normalize_e164(default_number)
+        self.version = 0
+        self._write_lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._listeners = []
+        self.store = store
+        self.defaults = dict(defaults or {})
+        self.poll_interval = poll_interval
+        self._store_version = None
+        self._next_poll = 0.0
+
+    def attach(self, store, defaults=None, poll_interval=None, default_number=None):
+        self.store = store
+        if defaults is not None:
+            self.defaults = dict(defaults)
+        if default_number is not None:
+            self.default_number = normalize_e164(default_number)
+        if poll_interval is not None:
+            self.poll_interval = poll_interval
+        self.refresh(force=True)
+
+    def load(self, businesses):
+        tenants = {}
+        for number, config in businesses.items():
+            tenant = make_tenant(number, config, self.defaults)
+            tenants[tenant["number"]] = tenant
+        self._swap(tenants)
+
+    def refresh(self, force=False):
+        """Reload from the store if its version moved; returns True if the snapshot changed.
+
+        Between polls this costs one clock read, so it can run on every request.
+        """
+        if self.store is None:
+            return False
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return False
+        # One thread polls while the rest keep serving from the current snapshot
+        if not self._poll_lock.acquire(blocking=force):
+            return False
+        try:
+            self._next_poll = now + self.poll_interval
+            try:
+                if not force and self.store.version() == self._store_version:
+                    return False
+                version, businesses = self.store.load()
+            except Exception as e:
+                logger.error("Failed to reload tenants, keeping current snapshot: %s", e)
+                return False
+            self.load(businesses)
+            self._store_version = version
+            return True
+        finally:
+            self._poll_lock.release()
+
+    def add(self, number, config):
+        """Add or replace a business; raises ValueError for an invalid number."""
+        number = valid_e164(number)
+        if config.get("forward_to"):
+            valid_e164(config["forward_to"])
+        if self.store is not None:
+            self.store.put(number, dict(config))
+            self.refresh(force=True)
+            return self.resolve(number)
+        tenant = make_tenant(number, config, self.defaults)
+        with self._write_lock:
+            tenants = dict(self._snapshot)
+            tenants[tenant["number"]] = tenant
+            self._swap(tenants, locked=True)
+        return tenant
+
+    def _swap(self, tenants, locked=False):
+        if not locked:
+            with self._write_lock:
+                return self._swap(tenants, locked=True)
+        if self.default_number is None:
+            self.default_number = next(iter(tenants), None)
+        self._default = tenants.get(self.default_number)
+        if self._default is None and tenants:
+            logger.warning("Default tenant %s is not configured; falling back to another business", self.default_number)
+            self._default = next(iter(tenants.values()))
+        self._snapshot = MappingProxyType(tenants)
+        self.version += 1
+        for listener in self._listeners:
+            listener(self)
+
+    def on_change(self, listener):
+        """Call `listener(registry)` after every snapshot swap."""
+        self._listeners.append(listener)
+
+    def resolve(self, number):
+        """Tenant for an inbound To number, or None if it isn't one of ours."""
+        snapshot = self._snapshot
+        tenant = snapshot.get(number)
+        if tenant is None and number:
+            # Twilio sends E.164 already; only odd formats pay for normalization
+            tenant = snapshot.get(normalize_e164(number))
+        return tenant
+
+    def resolve_or_default(self, number):
+        return self.resolve(number) or self._default
+
+    @property
+    def default(self):
+        return self._default
+
+    def snapshot(self):
+        return self._snapshot
+
+    def items(self):
+        return self._snapshot.items()
+
+    def __contains__(self, number):
+        return self.resolve(number) is not None
+
+    def __len__(self):
+        return len(self._snapshot)